@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+"""
+Sheetwise - headless batch command line
+
+Analyzes many source folders in parallel without opening any window, writes
+results.txt/html/pdf for each one and prints a JSON summary. Must not import
+tkinter or ttkbootstrap, so it runs on servers and from cron.
+
+One analysis can also be spread across machines: each node writes the
+partial analysis of the files it holds, and a coordinator merges them into
+the final reports.
+
+Usage:
+    python src/cli.py analyze data/2024-* --output-dir reports --workers 4
+    python src/cli.py partial /data/node1 --output node1.npz
+    python src/cli.py merge node*.npz --output-dir reports --protocol P-1
+"""
+
+import argparse
+import glob
+import json
+import logging
+import multiprocessing.util
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional
+
+# Add parent directory to path to allow relative imports
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+from src.models.database import DatabaseManager, Execution, User
+from src.utils.analysis_pipeline import AnalysisPipeline
+from src.utils.checkpoints import AggregateCheckpointStore
+from src.utils.disk_cache import AnalysisResultCache, ParsedFileCache, PdfArtifactCache
+from src.utils.file_processor import DataProcessor, FileValidator
+from src.utils.partials import AnalysisPartial
+from src.utils.pdf_renderer import PDF_BACKENDS, close_pdf_renderers
+from src.utils.progress import ProgressTracker
+
+# Exit codes
+EXIT_OK = 0
+EXIT_FAILURES = 1
+EXIT_USAGE = 2
+
+
+def expand_folders(patterns: List[str]) -> List[str]:
+    """Expand folder paths and glob patterns into existing folders, in order and without duplicates"""
+    folders = []
+    seen = set()
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        for path in matches:
+            path = os.path.abspath(path)
+            if os.path.isdir(path) and path not in seen:
+                seen.add(path)
+                folders.append(path)
+    return folders
+
+
+def plan_tasks(folders: List[str], args: argparse.Namespace) -> List[Dict[str, Any]]:
+    """Build the analysis of each folder; results go to the folder itself or to a subfolder of --output-dir"""
+    tasks = []
+    used_names = set()
+    for folder in folders:
+        name = os.path.basename(folder) or 'root'
+        if args.output_dir:
+            unique_name = name
+            suffix = 2
+            while unique_name in used_names:
+                unique_name = f"{name}_{suffix}"
+                suffix += 1
+            used_names.add(unique_name)
+            output_folder = os.path.join(os.path.abspath(args.output_dir), unique_name)
+        else:
+            output_folder = folder
+        tasks.append({
+            'analysis_data': {
+                'protocolo': args.protocol or name,
+                'setor': args.department,
+                'pasta_origem': folder,
+                'arquivo_resultado': output_folder
+            },
+            'options': {
+                'approximate': args.approximate,
+                'chunk_size': args.chunk_size,
+                'use_cache': not args.no_cache,
+                'pdf_backend': args.pdf_backend,
+                # Folders already run in parallel; share the cores among them
+                'partition_workers': max(1, (os.cpu_count() or 1) // min(args.workers, len(folders)))
+            }
+        })
+    return tasks
+
+
+def _init_folder_worker():
+    """Process pool initializer: stop the worker's wkhtmltopdf workers when it exits"""
+    # Pool workers skip atexit handlers but run multiprocessing finalizers
+    multiprocessing.util.Finalize(None, close_pdf_renderers, exitpriority=10)
+
+
+def _analyze_folder(task: Dict[str, Any]) -> Dict[str, Any]:
+    """Process pool worker: run the pipeline on one folder and return a JSON-ready result"""
+    analysis_data = task['analysis_data']
+    options = task['options']
+    started = time.perf_counter()
+
+    try:
+        os.makedirs(analysis_data['arquivo_resultado'], exist_ok=True)
+        data_processor = DataProcessor(
+            chunk_size=options['chunk_size'],
+            cache=ParsedFileCache() if options['use_cache'] else None,
+            checkpoints=AggregateCheckpointStore() if options['use_cache'] else None,
+            result_cache=AnalysisResultCache() if options['use_cache'] else None,
+            pdf_cache=PdfArtifactCache() if options['use_cache'] else None,
+            partition_workers=options['partition_workers'],
+            approximate=options['approximate'],
+            pdf_backend=options['pdf_backend']
+        )
+        # Executions are recorded by the parent process, not by the workers
+        result = AnalysisPipeline(data_processor, execution_model=None).execute(analysis_data)
+    except Exception as e:
+        result = {'success': False, 'cancelled': False, 'error_message': f"Error during analysis: {str(e)}",
+                  'files': [], 'artifacts': [], 'processing_results': {}, 'stages': []}
+
+    statistics = result.get('processing_results', {}).get('statistics', {})
+    return {
+        'folder': analysis_data['pasta_origem'],
+        'protocol': analysis_data['protocolo'],
+        'department': analysis_data['setor'],
+        'output_folder': analysis_data['arquivo_resultado'],
+        'success': result['success'],
+        'cancelled': result['cancelled'],
+        'error_message': result['error_message'],
+        'files': result['files'],
+        'artifacts': result['artifacts'],
+        'statistics': _json_statistics(statistics),
+        'stages': result['stages'],
+        'elapsed_seconds': round(time.perf_counter() - started, 3)
+    }
+
+
+def _json_scalar(value):
+    """Convert NumPy scalars to plain Python values"""
+    return value.item() if hasattr(value, 'item') else value
+
+
+def _json_statistics(statistics: Dict[str, Any]) -> Dict[str, Any]:
+    """Scalar statistics, ready for JSON"""
+    return {key: _json_scalar(value) for key, value in statistics.items() if not isinstance(value, dict)}
+
+
+def record_execution(execution_model: Execution, user_id: int, summary: Dict[str, Any]) -> int:
+    """Record a finished folder, with its stage measurements, as an execution of user_id"""
+    fields = AnalysisPipeline.execution_fields({
+        'success': summary['success'],
+        'cancelled': summary['cancelled'],
+        'error_message': summary['error_message'],
+        'files': summary['files'],
+        'artifacts': summary.get('artifacts'),
+        'processing_results': {'statistics': summary['statistics']}
+    })
+    execution_id = execution_model.create_execution(
+        user_id=user_id,
+        protocol=summary['protocol'],
+        department=summary['department'],
+        source_folder_path=summary['folder'],
+        result_file_path=summary['output_folder'],
+        **fields
+    )
+    execution_model.record_stages(execution_id, summary.get('stages', []))
+    return execution_id
+
+
+def _open_execution_model(args: argparse.Namespace):
+    """
+    Execution model and user id to record runs with, when --email is given
+
+    Returns:
+        Tuple (execution_model, user_id), both None without --email
+
+    Raises:
+        LookupError: If the user is not registered
+    """
+    if not args.email:
+        return None, None
+    db_manager = DatabaseManager(args.database)
+    user = User(db_manager).find_user_by_email(args.email)
+    if not user:
+        raise LookupError(f"User not found: {args.email}")
+    return Execution(db_manager), user['id']
+
+
+def run_analyze(args: argparse.Namespace) -> int:
+    """Handle the analyze command"""
+    folders = expand_folders(args.folders)
+    if not folders:
+        print(json.dumps({'error': "No source folders matched"}), file=sys.stdout)
+        return EXIT_USAGE
+
+    try:
+        execution_model, user_id = _open_execution_model(args)
+    except LookupError as e:
+        print(json.dumps({'error': str(e)}), file=sys.stdout)
+        return EXIT_USAGE
+
+    tasks = plan_tasks(folders, args)
+    results = []
+    started = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_folder_worker) as executor:
+        futures = [executor.submit(_analyze_folder, task) for task in tasks]
+        for future in as_completed(futures):
+            summary = future.result()
+            if execution_model is not None:
+                summary['execution_id'] = record_execution(execution_model, user_id, summary)
+            logging.getLogger(__name__).info(
+                f"{summary['folder']}: {'ok' if summary['success'] else summary['error_message']}"
+            )
+            results.append(summary)
+
+    # Report in the order the folders were given
+    order = {folder: index for index, folder in enumerate(folders)}
+    results.sort(key=lambda summary: order[summary['folder']])
+
+    failed = sum(1 for summary in results if not summary['success'])
+    report = {
+        'folders': len(results),
+        'completed': len(results) - failed,
+        'failed': failed,
+        'elapsed_seconds': round(time.perf_counter() - started, 3),
+        'results': results
+    }
+    print(json.dumps(report, indent=2 if args.pretty else None, ensure_ascii=False))
+    return EXIT_FAILURES if failed else EXIT_OK
+
+
+def run_partial(args: argparse.Namespace) -> int:
+    """Handle the partial command: compute this node's partial analysis"""
+    folder = os.path.abspath(args.folder)
+    if not os.path.isdir(folder):
+        print(json.dumps({'error': f"Not a folder: {args.folder}"}), file=sys.stdout)
+        return EXIT_USAGE
+
+    started = time.perf_counter()
+    data_processor = DataProcessor(
+        chunk_size=args.chunk_size,
+        cache=None if args.no_cache else ParsedFileCache(),
+        checkpoints=None if args.no_cache else AggregateCheckpointStore()
+    )
+    try:
+        partial = data_processor.compute_partial(FileValidator().find_files(folder))
+        partial.save(args.output)
+    except Exception as e:
+        print(json.dumps({'folder': folder, 'success': False, 'error_message': str(e)}), file=sys.stdout)
+        return EXIT_FAILURES
+
+    report = {
+        'folder': folder,
+        'success': True,
+        'partial': os.path.abspath(args.output),
+        'size_bytes': os.path.getsize(args.output),
+        'total_vendas': _json_scalar(partial.aggregate.totals()['total_vendas']),
+        'total_clientes': partial.clientes_rows,
+        'total_enderecos': partial.enderecos_rows,
+        'elapsed_seconds': round(time.perf_counter() - started, 3)
+    }
+    print(json.dumps(report, indent=2 if args.pretty else None, ensure_ascii=False))
+    return EXIT_OK
+
+
+def run_merge(args: argparse.Namespace) -> int:
+    """Handle the merge command: merge node partials and write the final reports"""
+    try:
+        execution_model, user_id = _open_execution_model(args)
+    except LookupError as e:
+        print(json.dumps({'error': str(e)}), file=sys.stdout)
+        return EXIT_USAGE
+
+    started = time.perf_counter()
+    paths = [os.path.abspath(path) for path in args.partials]
+    output_folder = os.path.abspath(args.output_dir)
+    analysis_data = {
+        'protocolo': args.protocol,
+        'setor': args.department,
+        'pasta_origem': ', '.join(paths),
+        'arquivo_resultado': output_folder
+    }
+    data_processor = DataProcessor(pdf_backend=args.pdf_backend)
+    progress = ProgressTracker()
+    summary = {
+        'partials': paths,
+        'protocol': args.protocol,
+        'department': args.department,
+        'output_folder': output_folder,
+        'success': False,
+        'cancelled': False,
+        'error_message': '',
+        'files': [],
+        'artifacts': [],
+        'statistics': {}
+    }
+
+    try:
+        partials = [AnalysisPartial.load(path) for path in paths]
+        progress.set_stage('aggregating')
+        processing_results = data_processor.merge_partials(partials)
+        if processing_results['success']:
+            os.makedirs(output_folder, exist_ok=True)
+            pipeline = AnalysisPipeline(data_processor, execution_model)
+            summary['artifacts'] = pipeline.write_reports(processing_results, analysis_data, progress)
+            summary['files'] = [artifact['name'] for artifact in summary['artifacts']]
+            summary['statistics'] = _json_statistics(processing_results['statistics'])
+            summary['success'] = True
+        else:
+            summary['error_message'] = f"Processing error: {processing_results['error_message']}"
+    except Exception as e:
+        summary['error_message'] = f"Error merging partials: {str(e)}"
+    progress.finish()
+    summary['stages'] = progress.stage_timings()
+
+    if execution_model is not None:
+        summary['execution_id'] = record_execution(execution_model, user_id, dict(summary, folder=analysis_data['pasta_origem']))
+    summary['elapsed_seconds'] = round(time.perf_counter() - started, 3)
+    print(json.dumps(summary, indent=2 if args.pretty else None, ensure_ascii=False))
+    return EXIT_OK if summary['success'] else EXIT_FAILURES
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Command line definition"""
+    parser = argparse.ArgumentParser(prog='sheetwise-batch', description="Sheetwise headless batch analysis")
+    parser.add_argument('-v', '--verbose', action='store_true', help="Log progress to stderr")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    analyze = subparsers.add_parser('analyze', help="Analyze source folders and write their reports")
+    analyze.add_argument('folders', nargs='+', help="Source folders or glob patterns")
+    analyze.add_argument('-o', '--output-dir',
+                         help="Write each folder's reports to a subfolder of this directory "
+                              "(default: into the source folder)")
+    analyze.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 1,
+                         help="Number of worker processes (default: CPU count)")
+    analyze.add_argument('--protocol', help="Protocol recorded for every folder (default: folder name)")
+    analyze.add_argument('--department', default='batch', help="Department recorded for every folder")
+    analyze.add_argument('--email', help="Record the runs as executions of this registered user")
+    analyze.add_argument('--database', default="database/sheetwise.db", help="SQLite database used with --email")
+    analyze.add_argument('--approximate', action='store_true',
+                         help="Use fixed-memory sketches for distinct counts and rankings")
+    analyze.add_argument('--chunk-size', type=int, help="Rows per chunk when streaming sales files")
+    analyze.add_argument('--no-cache', action='store_true', help="Do not use the parsed file, result, PDF and sales checkpoint caches")
+    analyze.add_argument('--pdf-backend', choices=PDF_BACKENDS, default='auto',
+                         help="PDF writer: wkhtmltopdf, the built-in native text writer, or auto "
+                              "(wkhtmltopdf when installed)")
+    analyze.add_argument('--pretty', action='store_true', help="Indent the JSON summary")
+    analyze.set_defaults(handler=run_analyze)
+
+    partial = subparsers.add_parser('partial', help="Compute the partial analysis of the files this node holds")
+    partial.add_argument('folder', help="Folder with this node's share of the input files")
+    partial.add_argument('-o', '--output', required=True, help="Partial file to write (.npz)")
+    partial.add_argument('--chunk-size', type=int, help="Rows per chunk when streaming sales files")
+    partial.add_argument('--no-cache', action='store_true', help="Do not use the parsed file cache nor sales checkpoints")
+    partial.add_argument('--pretty', action='store_true', help="Indent the JSON summary")
+    partial.set_defaults(handler=run_partial)
+
+    merge = subparsers.add_parser('merge', help="Merge partial analyses and write the final reports")
+    merge.add_argument('partials', nargs='+', help="Partial files written by the partial command")
+    merge.add_argument('-o', '--output-dir', required=True, help="Folder to write the reports to")
+    merge.add_argument('--protocol', required=True, help="Protocol of the analysis")
+    merge.add_argument('--department', default='batch', help="Department of the analysis")
+    merge.add_argument('--email', help="Record the run as an execution of this registered user")
+    merge.add_argument('--database', default="database/sheetwise.db", help="SQLite database used with --email")
+    merge.add_argument('--pdf-backend', choices=PDF_BACKENDS, default='auto',
+                       help="PDF writer: wkhtmltopdf, the built-in native text writer, or auto "
+                            "(wkhtmltopdf when installed)")
+    merge.add_argument('--pretty', action='store_true', help="Indent the JSON summary")
+    merge.set_defaults(handler=run_merge)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command line entry point"""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if getattr(args, 'workers', 1) < 1:
+        parser.error("--workers must be at least 1")
+
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        stream=sys.stderr
+    )
+    try:
+        return args.handler(args)
+    finally:
+        close_pdf_renderers()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
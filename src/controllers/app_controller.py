@@ -6,7 +6,9 @@ import tkinter as tk
 from tkinter import messagebox
 import os
 import sys
+import queue
 import logging
+import threading
 from datetime import datetime
 
 # Add src to path if necessary
@@ -18,20 +20,33 @@ if src_dir not in sys.path:
 from models.database import DatabaseManager, User, Execution, ConfigurationManager
 from views.login_view import LoginView
 from views.main_view import MainView
-from utils.file_processor import FileValidator, DataProcessor
 from utils.i18n_manager import init_i18n, get_i18n, _
+from utils.startup_profile import STARTUP_PROFILE_ENV, report_window_shown
+
+# The data processing stack (pandas, NumPy, the analysis pipeline and job
+# scheduler) is imported on first use, not at startup, so the login window
+# appears without waiting for it; see AppController.job_scheduler.
 
 class AppController:
     """Main application controller"""
     
+    # How often the Tk loop checks job progress and finished jobs
+    ANALYSIS_POLL_MS = 200
+    # Delay between showing the login window and loading the analysis stack
+    BACKGROUND_START_DELAY_MS = 100
+    
     def __init__(self):
         self.setup_logging()
         self.db_manager = DatabaseManager()
         self.user_model = User(self.db_manager)
         self.execution_model = Execution(self.db_manager)
         self.config_manager = ConfigurationManager(self.db_manager)
-        self.file_validator = FileValidator()
-        self.data_processor = DataProcessor()
+        self.analysis_queue = queue.Queue()
+        self._job_scheduler = None
+        self._services_lock = threading.Lock()
+        self.finished_jobs = []
+        self.polling_jobs = False
+        self.displayed_job = None
         
         self.current_user = None
         self.login_view = None
@@ -39,6 +54,40 @@ class AppController:
         
         self.logger = logging.getLogger(__name__)
     
+    @property
+    def job_scheduler(self):
+        """Job scheduler, created (importing the data processing stack) on first use"""
+        with self._services_lock:
+            if self._job_scheduler is None:
+                from utils.file_processor import FileValidator, DataProcessor
+                from utils.disk_cache import AnalysisResultCache, ParsedFileCache, PdfArtifactCache
+                from utils.checkpoints import AggregateCheckpointStore
+                from utils.analysis_pipeline import AnalysisPipeline
+                from utils.job_scheduler import JobScheduler
+
+                data_processor = DataProcessor(
+                    cache=ParsedFileCache(),
+                    checkpoints=AggregateCheckpointStore(),
+                    result_cache=AnalysisResultCache(),
+                    pdf_cache=PdfArtifactCache()
+                )
+                pipeline = AnalysisPipeline(data_processor, self.execution_model, FileValidator())
+                self._job_scheduler = JobScheduler(pipeline, self.execution_model,
+                                                   on_job_finished=self._job_finished)
+            return self._job_scheduler
+    
+    @property
+    def analysis_pipeline(self):
+        """Pipeline the scheduled jobs run"""
+        return self.job_scheduler.pipeline
+    
+    def _start_background_services(self):
+        """Import the data processing stack and resume queued jobs off the UI thread"""
+        try:
+            self.job_scheduler.start()
+        except Exception as e:
+            self.logger.error(f"Error starting job scheduler: {e}")
+    
     def setup_logging(self):
         """Configure logging system"""
         logging.basicConfig(
@@ -55,7 +104,20 @@ class AppController:
         self.logger.info("Starting Sheetwise")
         # Initialize i18n with default language (English)
         init_i18n('en')
-        self.show_login()
+        try:
+            self.show_login()
+        finally:
+            # Whichever window was closed last
+            self.handle_exit()
+    
+    def handle_exit(self):
+        """Stop the background services: running jobs are cancelled and recorded as such, PDF workers stopped"""
+        if self._job_scheduler is not None:
+            self.logger.info("Stopping the job scheduler...")
+            self._job_scheduler.shutdown(cancel_running=True)
+            # Only loaded with the scheduler; stops the wkhtmltopdf workers
+            from utils.pdf_renderer import close_pdf_renderers
+            close_pdf_renderers()
     
     def load_user_settings(self, user_id):
         """Load and apply user settings"""
@@ -95,6 +157,17 @@ class AppController:
             root_window=root_window,
             initial_theme=last_theme
         )
+        if os.environ.get(STARTUP_PROFILE_ENV):
+            # Measuring startup (main.py --startup-profile): quit once drawn
+            self.login_view.root.after(0, lambda: report_window_shown(self.login_view.root))
+        elif self._job_scheduler is None:
+            # Once the login window is up, load the analysis stack and requeue
+            # jobs interrupted in a previous session while the user signs in
+            self.login_view.root.after(
+                self.BACKGROUND_START_DELAY_MS,
+                lambda: threading.Thread(target=self._start_background_services,
+                                         name="sheetwise-startup", daemon=True).start()
+            )
         self.login_view.run()
     
     def handle_login(self, email, username=None, is_new_user=False):
@@ -163,20 +236,32 @@ class AppController:
             root_window=root_window,  # Pass the existing window
             on_logout=self.handle_logout,
             on_analyze=self.handle_analyze,
+            on_cancel_analysis=self.handle_cancel_analysis,
             on_delete_execution=self.handle_delete_execution,
-            on_refresh_executions=self.handle_refresh_executions
+            on_refresh_executions=self.handle_refresh_executions,
+            on_show_execution_details=self.handle_show_execution_details,
+            on_exit=self.handle_exit
         )
         
         # Add settings callbacks
         self.main_view.on_settings_changed = self.handle_settings_changed
         self.main_view.get_current_settings = self.get_current_settings
         
+        # Run this user's queue and follow jobs still pending from before
+        self.job_scheduler.set_user(self.current_user['id'])
+        self.polling_jobs = False
+        if self.job_scheduler.pending_count():
+            self._start_polling_jobs()
+        
         # Run the view
         self.main_view.run()
     
     def handle_logout(self):
         """Handle logout"""
         self.current_user = None
+        if self._job_scheduler is not None:
+            # Jobs already running finish; the next user's queue starts at login
+            self._job_scheduler.set_user(None)
         
         # Get the root window from main_view before clearing it
         if self.main_view:
@@ -188,93 +273,107 @@ class AppController:
             self.show_login()
     
     def handle_analyze(self, analysis_data):
-        """Handle data analysis"""
+        """Handle data analysis
+        
+        The analysis is queued as an execution and run by the job scheduler's
+        workers, so the window keeps repainting and more folders can be queued
+        meanwhile. Results come back through a queue polled from the Tk loop.
+        """
         try:
-            self.logger.info(f"Starting analysis for protocol: {analysis_data['protocolo']}")
-            
-            # Validate files
-            files_dict = self.file_validator.find_files(analysis_data['pasta_origem'])
-            validation_results = self.file_validator.validate_all_files(files_dict)
-            
-            # Check if validation passed
-            for file_type, (is_valid, message) in validation_results.items():
-                if file_type in ['clientes', 'vendas'] and not is_valid:
-                    self.main_view.show_error(f"File validation error {file_type}: {message}")
-                    return
-            
-            # Process data
-            processing_results = self.data_processor.process_data(files_dict)
-            
-            if not processing_results['success']:
-                self.main_view.show_error(f"Processing error: {processing_results['error_message']}")
-                return
-            
-            # Generate report
-            report_text = self.data_processor.generate_report_text(
-                processing_results,
-                analysis_data['protocolo'],
-                analysis_data['setor'],
-                analysis_data['pasta_origem'],
-                analysis_data['arquivo_resultado']
-            )
-            
-            # Generate HTML report
-            report_html = self.data_processor.generate_report_html(
-                report_text,
-                analysis_data['protocolo'],
-                analysis_data['setor']
-            )
-            
-            # Define file paths in the output folder
-            output_folder = analysis_data['arquivo_resultado']
-            txt_file_path = os.path.join(output_folder, 'results.txt')
-            html_file_path = os.path.join(output_folder, 'results.html')
-            pdf_file_path = os.path.join(output_folder, 'results.pdf')
-            
-            # Save TXT result file
-            with open(txt_file_path, 'w', encoding='utf-8') as f:
-                f.write(report_text)
-            
-            # Save HTML result file
-            with open(html_file_path, 'w', encoding='utf-8') as f:
-                f.write(report_html)
-            
-            # Generate PDF from HTML
-            pdf_success = self.data_processor.generate_report_pdf(html_file_path, pdf_file_path)
-            
-            # Prepare success message
-            files_generated = "- results.txt\n- results.html"
-            if pdf_success:
-                files_generated += "\n- results.pdf"
-            
-            # Save execution to database
-            execution_id = self.execution_model.create_execution(
-                user_id=self.current_user['id'],
-                protocol=analysis_data['protocolo'],
-                department=analysis_data['setor'],
-                filename='results.txt / results.html / results.pdf' if pdf_success else 'results.txt / results.html',
-                source_folder_path=analysis_data['pasta_origem'],
-                result_file_path=output_folder,
-                notes=f"Analysis completed successfully. {processing_results['statistics']['total_vendas']} sales processed."
-            )
-            
-            self.logger.info(f"Analysis completed successfully. Execution ID: {execution_id}")
-            
-            # Refresh executions list
+            execution_id = self.job_scheduler.submit(analysis_data, self.current_user['id'])
+            self.logger.info(f"Analysis queued. Execution ID: {execution_id}")
             self.handle_refresh_executions()
-            
-            # Show success
-            self.main_view.show_success(
-                f"Analysis completed successfully!\n\n"
-                f"Files saved in: {output_folder}\n"
-                f"{files_generated}\n\n"
-                f"Total sales processed: {processing_results['statistics']['total_vendas']:,}\n"
-                f"Total revenue: R$ {processing_results['statistics']['receita_total']:,.2f}"
-            )
-            
+            self._start_polling_jobs()
         except Exception as e:
-            self.logger.error(f"Analysis error: {e}")
-            self.main_view.show_error(f"Error during analysis: {str(e)}")
+            self.logger.error(f"Error queueing analysis: {e}")
+            self.main_view.show_error(f"Error queueing analysis: {str(e)}")
+    
+    def _job_finished(self, execution_id, result):
+        """Scheduler callback, called on a worker thread"""
+        self.analysis_queue.put(result)
+    
+    def handle_cancel_analysis(self):
+        """Cancel the job whose progress is displayed"""
+        if self.displayed_job is not None:
+            self.logger.info(f"Cancelling execution {self.displayed_job}...")
+            self.job_scheduler.cancel(self.displayed_job)
+    
+    def _start_polling_jobs(self):
+        """Show the progress panel and poll the scheduler until no job is pending"""
+        if self.polling_jobs:
+            return
+        self.polling_jobs = True
+        self.finished_jobs = []
+        self.main_view.set_busy(True)
+        self.main_view.root.after(self.ANALYSIS_POLL_MS, self._poll_analysis)
+    
+    def _poll_analysis(self):
+        """Render job progress and deliver finished jobs on the Tk thread"""
+        if self.main_view is None or not self.polling_jobs:
+            self.polling_jobs = False
+            return
+        
+        # Read the pending state before draining, so a job finishing in
+        # between is delivered by the next poll instead of being missed
+        running = self.job_scheduler.progress()
+        pending = self.job_scheduler.pending_count()
+        
+        finished = []
+        while True:
+            try:
+                finished.append(self.analysis_queue.get_nowait())
+            except queue.Empty:
+                break
+        if finished:
+            self.finished_jobs.extend(finished)
+            self.handle_refresh_executions()
+        
+        if pending or running:
+            self.displayed_job = min(running) if running else None
+            self.main_view.update_progress(
+                running.get(self.displayed_job) if running else None,
+                self.displayed_job,
+                pending
+            )
+            self.main_view.root.after(self.ANALYSIS_POLL_MS, self._poll_analysis)
+            return
+        
+        self.polling_jobs = False
+        self.displayed_job = None
+        self.main_view.set_busy(False)
+        self._report_finished_jobs(self.finished_jobs)
+        self.finished_jobs = []
+    
+    def _report_finished_jobs(self, results):
+        """Show the outcome of the jobs finished since the progress panel opened"""
+        if len(results) > 1:
+            counts = {'completed': 0, 'failed': 0, 'cancelled': 0}
+            for result in results:
+                counts[self.analysis_pipeline.execution_fields(result)['status']] += 1
+            self.main_view.show_info(_('main_view.progress.batch_finished', total=len(results), **counts))
+            return
+        if not results:
+            return
+        
+        result = results[0]
+        if result['cancelled']:
+            self.main_view.show_info(_('main_view.progress.cancelled_message'))
+            return
+        
+        if not result['success']:
+            self.main_view.show_error(result['error_message'])
+            return
+        
+        # Show success
+        statistics = result['processing_results']['statistics']
+        files_generated = "\n".join(f"- {name}" for name in result['files'])
+        self.main_view.show_success(
+            f"Analysis completed successfully!\n\n"
+            f"Files saved in: {result['output_folder']}\n"
+            f"{files_generated}\n\n"
+            f"Total sales processed: {statistics['total_vendas']:,}\n"
+            f"Total revenue: R$ {statistics['receita_total']:,.2f}"
+        )
     
     def handle_refresh_executions(self):
         """Handle executions list refresh"""
@@ -311,6 +410,9 @@ class AppController:
         try:
             self.logger.info(f"Attempting to delete execution ID: {execution_id}")
             
+            # Stop the job first if it is still queued or running
+            self.job_scheduler.cancel(execution_id)
+            
             # Delete from database
             if self.execution_model.delete_execution(execution_id):
                 self.logger.info(f"Execution {execution_id} deleted successfully from database")
@@ -329,6 +431,18 @@ class AppController:
             messagebox.showerror(_('common.error'), f"Error deleting execution: {str(e)}")
             return False
     
+    def handle_show_execution_details(self, execution_id):
+        """Show an execution with its per-stage measurements"""
+        try:
+            execution = self.execution_model.find_execution_by_id(execution_id)
+            if not execution:
+                self.main_view.show_error(_('main_view.details.not_found', id=execution_id))
+                return
+            self.main_view.show_execution_details(execution, self.execution_model.get_stages(execution_id))
+        except Exception as e:
+            self.logger.error(f"Error loading execution {execution_id} details: {e}")
+            messagebox.showerror(_('common.error'), f"Error loading execution details: {str(e)}")
+    
     def get_current_settings(self):
         """Get current user settings"""
         if hasattr(self, 'current_config') and self.current_config:
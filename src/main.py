@@ -2,6 +2,10 @@
 """
 Sheetwise - CSV/XLSX Spreadsheet Analysis Software
 Main application file
+
+Usage:
+    python src/main.py                      Start the application
+    python src/main.py --startup-profile    Report startup import costs
 """
 
 import sys
@@ -12,11 +16,10 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(current_dir)
 sys.path.append(parent_dir)
 
-from src.controllers.app_controller import AppController
-
 def main():
     """Main application function"""
     try:
+        from src.controllers.app_controller import AppController
         app = AppController()
         app.run()
     except Exception as e:
@@ -26,4 +29,11 @@ def main():
     return 0
 
 if __name__ == "__main__":
+    # Sales partitions are aggregated on spawned worker processes; in the
+    # PyInstaller build those re-run this executable, which must not start the UI
+    import multiprocessing
+    multiprocessing.freeze_support()
+    if '--startup-profile' in sys.argv[1:]:
+        from src.utils.startup_profile import run_startup_profile
+        sys.exit(run_startup_profile(os.path.abspath(__file__)))
     sys.exit(main())
\ No newline at end of file
@@ -4,6 +4,7 @@ Data models for Sheetwise application
 
 import sqlite3
 import os
+import json
 from datetime import datetime
 from typing import Optional, List, Dict, Any
 
@@ -47,9 +48,35 @@ class DatabaseManager:
                     execution_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     status TEXT DEFAULT 'completed',
                     notes TEXT,
+                    started_at TIMESTAMP,
+                    finished_at TIMESTAMP,
+                    artifacts TEXT,
+                    owner TEXT,
+                    heartbeat_at TIMESTAMP,
                     FOREIGN KEY (user_id) REFERENCES users (id)
                 )
             ''')
+            self._migrate_executions(cursor)
+            
+            # Per-stage measurements of each execution
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS execution_stages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    execution_id INTEGER NOT NULL,
+                    position INTEGER NOT NULL,
+                    stage TEXT NOT NULL,
+                    wall_seconds REAL NOT NULL,
+                    cpu_seconds REAL NOT NULL,
+                    peak_rss_bytes INTEGER,
+                    rows INTEGER NOT NULL DEFAULT 0,
+                    bytes INTEGER NOT NULL DEFAULT 0,
+                    FOREIGN KEY (execution_id) REFERENCES executions (id)
+                )
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_execution_stages_execution
+                ON execution_stages (execution_id)
+            ''')
             
             # Configurations table
             cursor.execute('''
@@ -66,6 +93,25 @@ class DatabaseManager:
             
             conn.commit()
     
+    # Columns added to executions after its first release, with their types
+    EXECUTION_MIGRATIONS = {
+        'started_at': 'TIMESTAMP',
+        'finished_at': 'TIMESTAMP',
+        # JSON list of the files written: name, size and sha256
+        'artifacts': 'TEXT',
+        # Scheduler running the execution and its last sign of life
+        'owner': 'TEXT',
+        'heartbeat_at': 'TIMESTAMP'
+    }
+    
+    def _migrate_executions(self, cursor):
+        """Add columns missing from an executions table created by an older version"""
+        cursor.execute("PRAGMA table_info(executions)")
+        existing = {row[1] for row in cursor.fetchall()}
+        for column, column_type in self.EXECUTION_MIGRATIONS.items():
+            if column not in existing:
+                cursor.execute(f"ALTER TABLE executions ADD COLUMN {column} {column_type}")
+    
     def get_connection(self):
         """Return database connection"""
         return sqlite3.connect(self.db_path)
@@ -132,17 +178,19 @@ class Execution:
     
     def create_execution(self, user_id: int, protocol: str, department: str, 
                         filename: str, source_folder_path: str,
-                        result_file_path: str, notes: str = "") -> int:
+                        result_file_path: str, notes: str = "",
+                        status: str = "completed",
+                        artifacts: Optional[List[Dict[str, Any]]] = None) -> int:
         """Create a new execution"""
         with self.db_manager.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 INSERT INTO executions 
                 (user_id, protocol, department, filename, source_folder_path,
-                 result_file_path, notes)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
+                 result_file_path, notes, status, artifacts)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
             ''', (user_id, protocol, department, filename, source_folder_path,
-                  result_file_path, notes))
+                  result_file_path, notes, status, _dump_artifacts(artifacts)))
             return cursor.lastrowid
     
     def list_executions(self, user_id: Optional[int] = None) -> List[Dict[str, Any]]:
@@ -155,7 +203,8 @@ class Execution:
                     SELECT e.id, e.protocol, e.department, e.filename,
                            e.source_folder_path, e.result_file_path,
                            e.execution_date, e.status, e.notes,
-                           u.username as user_username
+                           u.username as user_username,
+                           e.started_at, e.finished_at, e.artifacts
                     FROM executions e
                     JOIN users u ON e.user_id = u.id
                     WHERE e.user_id = ?
@@ -166,7 +215,8 @@ class Execution:
                     SELECT e.id, e.protocol, e.department, e.filename,
                            e.source_folder_path, e.result_file_path,
                            e.execution_date, e.status, e.notes,
-                           u.username as user_username
+                           u.username as user_username,
+                           e.started_at, e.finished_at, e.artifacts
                     FROM executions e
                     JOIN users u ON e.user_id = u.id
                     ORDER BY e.execution_date DESC
@@ -184,7 +234,10 @@ class Execution:
                     'execution_date': row[6],
                     'status': row[7],
                     'notes': row[8],
-                    'user_username': row[9]
+                    'user_username': row[9],
+                    'started_at': row[10],
+                    'finished_at': row[11],
+                    'artifacts': _load_artifacts(row[12])
                 }
                 for row in rows
             ]
@@ -197,7 +250,8 @@ class Execution:
                 SELECT e.id, e.protocol, e.department, e.filename,
                        e.source_folder_path, e.result_file_path,
                        e.execution_date, e.status, e.notes,
-                       u.username as user_username, e.user_id
+                       u.username as user_username, e.user_id,
+                       e.started_at, e.finished_at, e.artifacts
                 FROM executions e
                 JOIN users u ON e.user_id = u.id
                 WHERE e.id = ?
@@ -216,7 +270,10 @@ class Execution:
                     'status': row[7],
                     'notes': row[8],
                     'user_username': row[9],
-                    'user_id': row[10]
+                    'user_id': row[10],
+                    'started_at': row[11],
+                    'finished_at': row[12],
+                    'artifacts': _load_artifacts(row[13])
                 }
         return None
     
@@ -224,6 +281,7 @@ class Execution:
         """Delete an execution"""
         with self.db_manager.get_connection() as conn:
             cursor = conn.cursor()
+            cursor.execute("DELETE FROM execution_stages WHERE execution_id = ?", (execution_id,))
             cursor.execute("DELETE FROM executions WHERE id = ?", (execution_id,))
             return cursor.rowcount > 0
     
@@ -238,6 +296,180 @@ class Execution:
                 WHERE id = ?
             ''', (status, notes, execution_id))
             return cursor.rowcount > 0
+    
+    def enqueue_execution(self, user_id: int, protocol: str, department: str,
+                          source_folder_path: str, result_file_path: str) -> int:
+        """Create a queued execution, to be picked up by a JobScheduler worker"""
+        return self.create_execution(
+            user_id=user_id,
+            protocol=protocol,
+            department=department,
+            filename='-',
+            source_folder_path=source_folder_path,
+            result_file_path=result_file_path,
+            status='queued'
+        )
+    
+    def claim_next_execution(self, owner: str, user_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Move the oldest queued execution to running and return it, or None if none is queued
+
+        Args:
+            owner: Identifier of the claiming scheduler, stored with the row
+            user_id: Only claim executions of this user
+        """
+        with self.db_manager.get_connection() as conn:
+            cursor = conn.cursor()
+            # The write lock makes select-then-update atomic across workers
+            cursor.execute("BEGIN IMMEDIATE")
+            if user_id is None:
+                cursor.execute('''
+                    SELECT id FROM executions
+                    WHERE status = 'queued'
+                    ORDER BY id
+                    LIMIT 1
+                ''')
+            else:
+                cursor.execute('''
+                    SELECT id FROM executions
+                    WHERE status = 'queued' AND user_id = ?
+                    ORDER BY id
+                    LIMIT 1
+                ''', (user_id,))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            cursor.execute('''
+                UPDATE executions
+                SET status = 'running', started_at = CURRENT_TIMESTAMP, finished_at = NULL,
+                    owner = ?, heartbeat_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (owner, row[0]))
+        return self.find_execution_by_id(row[0])
+
+    def heartbeat_executions(self, owner: str) -> int:
+        """Mark the running executions of a scheduler as still alive"""
+        with self.db_manager.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE executions
+                SET heartbeat_at = CURRENT_TIMESTAMP
+                WHERE status = 'running' AND owner = ?
+            ''', (owner,))
+            return cursor.rowcount
+    
+    def finish_execution(self, execution_id: int, status: str,
+                         filename: str, notes: str = "",
+                         artifacts: Optional[List[Dict[str, Any]]] = None) -> bool:
+        """Record the outcome of a running execution (completed, failed or cancelled)"""
+        with self.db_manager.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE executions
+                SET status = ?, filename = ?, notes = ?, artifacts = ?, finished_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (status, filename, notes, _dump_artifacts(artifacts), execution_id))
+            return cursor.rowcount > 0
+    
+    def cancel_queued_execution(self, execution_id: int) -> bool:
+        """Cancel an execution that has not started yet"""
+        with self.db_manager.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE executions
+                SET status = 'cancelled', notes = 'Cancelled before it started.',
+                    finished_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND status = 'queued'
+            ''', (execution_id,))
+            return cursor.rowcount > 0
+    
+    def requeue_running_executions(self, stale_seconds: float, owner: Optional[str] = None) -> int:
+        """
+        Put executions left running by a dead session back in the queue
+
+        A running execution is requeued when its scheduler has not sent a
+        heartbeat for stale_seconds, or when owner (if given) claimed it;
+        executions of live schedulers are left alone.
+        """
+        with self.db_manager.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE executions
+                SET status = 'queued', started_at = NULL, owner = NULL, heartbeat_at = NULL
+                WHERE status = 'running'
+                  AND (owner IS NULL OR owner = ? OR heartbeat_at IS NULL
+                       OR heartbeat_at < datetime('now', ?))
+            ''', (owner, f"-{int(stale_seconds)} seconds"))
+            return cursor.rowcount
+    
+    def record_stages(self, execution_id: int, stages: List[Dict[str, Any]]):
+        """Store the per-stage measurements of an execution (ProgressTracker.stage_timings)"""
+        with self.db_manager.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM execution_stages WHERE execution_id = ?", (execution_id,))
+            cursor.executemany('''
+                INSERT INTO execution_stages
+                (execution_id, position, stage, wall_seconds, cpu_seconds, peak_rss_bytes, rows, bytes)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [
+                (execution_id, position, stage['stage'], stage['wall_seconds'], stage['cpu_seconds'],
+                 stage['peak_rss_bytes'], stage['rows'], stage['bytes'])
+                for position, stage in enumerate(stages)
+            ])
+    
+    def get_stages(self, execution_id: int) -> List[Dict[str, Any]]:
+        """Per-stage measurements of an execution, in stage order"""
+        with self.db_manager.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT stage, wall_seconds, cpu_seconds, peak_rss_bytes, rows, bytes
+                FROM execution_stages
+                WHERE execution_id = ?
+                ORDER BY position
+            ''', (execution_id,))
+            return [
+                {
+                    'stage': row[0],
+                    'wall_seconds': row[1],
+                    'cpu_seconds': row[2],
+                    'peak_rss_bytes': row[3],
+                    'rows': row[4],
+                    'bytes': row[5]
+                }
+                for row in cursor.fetchall()
+            ]
+    
+    def count_executions_by_status(self, user_id: Optional[int] = None,
+                                   live_seconds: Optional[float] = None) -> Dict[str, int]:
+        """
+        Number of executions in each status, optionally of a single user
+
+        Args:
+            user_id: Only count executions of this user
+            live_seconds: Only count running executions whose scheduler sent
+                a heartbeat within this many seconds
+        """
+        conditions = []
+        params = []
+        if user_id is not None:
+            conditions.append("user_id = ?")
+            params.append(user_id)
+        if live_seconds is not None:
+            conditions.append("(status != 'running' OR heartbeat_at >= datetime('now', ?))")
+            params.append(f"-{int(live_seconds)} seconds")
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self.db_manager.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT status, COUNT(*) FROM executions {where} GROUP BY status", params)
+            return dict(cursor.fetchall())
+
+
+def _dump_artifacts(artifacts: Optional[List[Dict[str, Any]]]) -> Optional[str]:
+    return json.dumps(artifacts) if artifacts is not None else None
+
+
+def _load_artifacts(value: Optional[str]) -> Optional[List[Dict[str, Any]]]:
+    return json.loads(value) if value else None
 
 
 class ConfigurationManager:
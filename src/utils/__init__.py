@@ -2,6 +2,20 @@
 Inicialização do módulo utils
 """
 
-from .file_processor import FileValidator, DataProcessor
+import importlib
 
-__all__ = ['FileValidator', 'DataProcessor']
\ No newline at end of file
+# Exports are imported on first access: importing any utils module (e.g. the
+# i18n manager at startup) must not pull in pandas through file_processor
+_EXPORTS = {
+    'FileValidator': '.file_processor',
+    'DataProcessor': '.file_processor',
+    'ParsedFileCache': '.disk_cache',
+}
+
+__all__ = ['FileValidator', 'DataProcessor', 'ParsedFileCache']
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        return getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,388 @@
+"""
+Mergeable sales aggregates used by in-memory and chunked processing
+"""
+
+from typing import Any, Dict, List, Optional
+import numpy as np
+import pandas as pd
+
+from .integrity import check_referential_integrity, unique_ids
+from .sketches import HyperLogLog, SpaceSaving
+
+
+def top_k(frame: pd.DataFrame, column: str, k: int) -> pd.DataFrame:
+    """
+    Return the k rows with the largest values in column, largest first
+
+    Uses partial selection (numpy argpartition), so only the selected rows
+    are sorted: O(n + k log k) instead of a full O(n log n) sort. Ties keep
+    the order of the frame, like a stable descending sort would.
+    """
+    n = len(frame)
+    if k <= 0 or n == 0:
+        return frame.iloc[:0]
+
+    values = frame[column].to_numpy()
+    if k < n:
+        # Value of the k-th largest row; everything above it is selected,
+        # and ties at the boundary are taken in frame order
+        threshold = values[np.argpartition(values, n - k)[n - k]]
+        above = np.flatnonzero(values > threshold)
+        ties = np.flatnonzero(values == threshold)[:k - len(above)]
+        candidates = np.concatenate([above, ties])
+        candidates.sort()
+    else:
+        candidates = np.arange(n)
+
+    order = np.argsort(-values[candidates], kind='stable')
+    return frame.iloc[candidates[order]]
+
+
+# Metrics a report can request from the sales table
+SALES_METRICS = [
+    'total_vendas',
+    'receita_total',
+    'ticket_medio',
+    'quantidade_total_produtos',
+    'top_produtos',
+    'top_clientes',
+    'clientes_com_vendas'
+]
+TOTAL_METRICS = {'total_vendas', 'receita_total', 'ticket_medio', 'quantidade_total_produtos'}
+
+
+class AggregationPlan:
+    """Resolves the requested metrics into the fewest passes over the sales rows
+
+    Every requested metric is mapped to shared accumulators:
+
+    - one groupby by ``cliente_id`` carrying revenue sum and count, quantity
+      sum and row count. Totals (revenue, average ticket, quantity, number of
+      sales) are derived from these groups instead of rescanning columns, and
+      the group keys double as the set of customers with sales.
+    - one groupby by ``produto`` for the product ranking.
+    - a direct column scan only when totals are wanted without customer groups.
+
+    The same plan drives in-memory frames (a single chunk) and streamed chunks.
+    """
+
+    def __init__(self, metrics: Optional[List[str]] = None):
+        self.metrics = set(metrics if metrics is not None else SALES_METRICS)
+        unknown = self.metrics - set(SALES_METRICS)
+        if unknown:
+            raise ValueError(f"Unknown metrics: {', '.join(sorted(unknown))}")
+
+        self.group_by_cliente = bool(self.metrics & {'top_clientes', 'clientes_com_vendas'})
+        self.group_by_produto = 'top_produtos' in self.metrics
+        self.scan_totals = bool(self.metrics & TOTAL_METRICS) and not self.group_by_cliente
+
+    def required_columns(self) -> List[str]:
+        """Sales columns the plan reads"""
+        columns = set()
+        if self.group_by_cliente:
+            columns.update(['cliente_id', 'preco_final', 'quantidade'])
+        if self.group_by_produto:
+            columns.update(['produto', 'preco_final', 'quantidade'])
+        if self.scan_totals:
+            columns.update(['preco_final', 'quantidade'])
+        return [col for col in ['cliente_id', 'produto', 'quantidade', 'preco_final'] if col in columns]
+
+    def new_aggregate(self) -> 'SalesAggregate':
+        """Create an empty aggregate for this plan"""
+        return SalesAggregate(self)
+
+
+class SalesAggregate:
+    """Partial aggregates of a sales table
+
+    An aggregate can be updated with any number of chunks of the ``vendas``
+    table and merged with other aggregates built from the same plan. Memory
+    is bounded by the number of distinct products and customers, never by
+    the number of sales rows.
+
+    The groups of each chunk are buffered and summed into the accumulated
+    groups only once the buffer holds as many rows as the accumulated frame
+    (or on first read), so folding many chunks costs time proportional to
+    the rows grouped, not to chunks x distinct keys.
+    """
+
+    # Buffered group rows below this are never combined early
+    PENDING_MIN_ROWS = 1_000_000
+
+    def __init__(self, plan: Optional[AggregationPlan] = None):
+        self.plan = plan or AggregationPlan()
+        self.total_vendas = 0
+        self.receita_total = 0.0
+        self.receita_count = 0
+        self.quantidade_total = 0
+        self._groups: Dict[str, Optional[pd.DataFrame]] = {'por_produto': None, 'por_cliente': None}
+        self._pending: Dict[str, List[pd.DataFrame]] = {'por_produto': [], 'por_cliente': []}
+        self._pending_rows: Dict[str, int] = {'por_produto': 0, 'por_cliente': 0}
+
+    @property
+    def por_produto(self) -> Optional[pd.DataFrame]:
+        """Per-product sums, indexed by product"""
+        return self._flush('por_produto')
+
+    @por_produto.setter
+    def por_produto(self, frame: Optional[pd.DataFrame]):
+        self._set_groups('por_produto', frame)
+
+    @property
+    def por_cliente(self) -> Optional[pd.DataFrame]:
+        """Per-customer sums and counts, indexed by customer id (NaN for rows without one)"""
+        return self._flush('por_cliente')
+
+    @por_cliente.setter
+    def por_cliente(self, frame: Optional[pd.DataFrame]):
+        self._set_groups('por_cliente', frame)
+
+    def __getstate__(self):
+        # Checkpoints and worker results pickle the combined groups only
+        self._flush('por_produto')
+        self._flush('por_cliente')
+        return self.__dict__
+
+    def update(self, vendas_df: pd.DataFrame) -> 'SalesAggregate':
+        """Fold a chunk of sales rows into the aggregate"""
+        if self.plan.scan_totals:
+            self.total_vendas += len(vendas_df)
+            self.receita_total += vendas_df['preco_final'].sum()
+            self.receita_count += int(vendas_df['preco_final'].count())
+            self.quantidade_total += vendas_df['quantidade'].sum()
+
+        if self.plan.group_by_cliente:
+            # Rows without a customer id are kept as a NaN group so the
+            # totals derived from these groups still cover every row
+            clientes = vendas_df.groupby('cliente_id', observed=True, dropna=False).agg(
+                preco_final=('preco_final', 'sum'),
+                quantidade=('quantidade', 'sum'),
+                preco_count=('preco_final', 'count'),
+                linhas=('preco_final', 'size')
+            )
+            self._add_groups('por_cliente', clientes)
+
+        if self.plan.group_by_produto:
+            produtos = vendas_df.groupby('produto', observed=True).agg({
+                'quantidade': 'sum',
+                'preco_final': 'sum'
+            })
+            self._add_groups('por_produto', produtos)
+
+        return self
+
+    def merge(self, other: 'SalesAggregate') -> 'SalesAggregate':
+        """Merge another partial aggregate into this one"""
+        self.total_vendas += other.total_vendas
+        self.receita_total += other.receita_total
+        self.receita_count += other.receita_count
+        self.quantidade_total += other.quantidade_total
+        self._add_groups('por_produto', other.por_produto)
+        self._add_groups('por_cliente', other.por_cliente)
+        return self
+
+    def _set_groups(self, name: str, frame: Optional[pd.DataFrame]):
+        self._groups[name] = frame
+        self._pending[name] = []
+        self._pending_rows[name] = 0
+
+    def _add_groups(self, name: str, frame: Optional[pd.DataFrame]):
+        """Buffer grouped rows, combining the buffer once it outgrows the accumulated groups"""
+        if frame is None:
+            return
+        self._pending[name].append(frame)
+        self._pending_rows[name] += len(frame)
+        current = self._groups[name]
+        if self._pending_rows[name] >= max(self.PENDING_MIN_ROWS, len(current) if current is not None else 0):
+            self._flush(name)
+
+    def _flush(self, name: str) -> Optional[pd.DataFrame]:
+        """Sum the buffered groups into the accumulated ones, key by key, in a single pass"""
+        pending = self._pending[name]
+        if pending:
+            current = self._groups[name]
+            frames = pending if current is None else [current] + pending
+            self._groups[name] = (frames[0] if len(frames) == 1
+                                  else pd.concat(frames).groupby(level=0, dropna=False).sum())
+            self._pending[name] = []
+            self._pending_rows[name] = 0
+        return self._groups[name]
+
+    def _clientes(self) -> Optional[pd.DataFrame]:
+        """Per-customer groups without the group of rows lacking a customer id"""
+        if self.por_cliente is None:
+            return None
+        return self.por_cliente[self.por_cliente.index.notna()]
+
+    def customer_ids(self) -> pd.Index:
+        """Distinct customer ids seen in the sales rows"""
+        clientes = self._clientes()
+        if clientes is None:
+            return pd.Index([])
+        return clientes.index
+
+    def totals(self) -> Dict[str, Any]:
+        """Sales totals, derived from the customer groups when the plan has them"""
+        if self.plan.group_by_cliente and self.por_cliente is not None:
+            return {
+                'total_vendas': self.por_cliente['linhas'].sum(),
+                'receita_total': self.por_cliente['preco_final'].sum(),
+                'receita_count': self.por_cliente['preco_count'].sum(),
+                'quantidade_total': self.por_cliente['quantidade'].sum()
+            }
+        return {
+            'total_vendas': self.total_vendas,
+            'receita_total': self.receita_total,
+            'receita_count': self.receita_count,
+            'quantidade_total': self.quantidade_total
+        }
+
+    def to_statistics(self, total_clientes: int, total_enderecos: int,
+                      k: int = 5) -> Dict[str, Any]:
+        """Build the statistics dict reported by DataProcessor, ranking the top k products and customers"""
+        metrics = self.plan.metrics
+        totals = self.totals()
+        stats = {}
+
+        # Basic statistics
+        stats['total_clientes'] = total_clientes
+        if 'total_vendas' in metrics:
+            stats['total_vendas'] = totals['total_vendas']
+        stats['total_enderecos'] = total_enderecos
+
+        # Sales statistics, the average ticket reusing the revenue sum and count
+        if 'receita_total' in metrics:
+            stats['receita_total'] = totals['receita_total']
+        if 'ticket_medio' in metrics:
+            stats['ticket_medio'] = (totals['receita_total'] / totals['receita_count']
+                                     if totals['receita_count'] else float('nan'))
+        if 'quantidade_total_produtos' in metrics:
+            stats['quantidade_total_produtos'] = totals['quantidade_total']
+
+        # Top products
+        stats['top_k'] = k
+        if 'top_produtos' in metrics:
+            if self.por_produto is not None:
+                produtos_mais_vendidos = top_k(self.por_produto, 'quantidade', k)
+                stats['top_produtos'] = produtos_mais_vendidos.to_dict('index')
+            else:
+                stats['top_produtos'] = {}
+
+        # Top customers
+        if 'top_clientes' in metrics:
+            clientes = self._clientes()
+            if clientes is not None:
+                clientes_vendas = top_k(clientes[['preco_final', 'quantidade']], 'preco_final', k)
+                stats['top_clientes'] = clientes_vendas.to_dict('index')
+            else:
+                stats['top_clientes'] = {}
+
+        return stats
+
+
+class ApproximateSalesAggregate:
+    """Fixed-memory sales aggregate for exploratory runs on huge files
+
+    Sales totals stay exact (they are plain sums). Distinct customers are
+    counted with a HyperLogLog sketch and the product and customer rankings
+    come from Space-Saving summaries, so memory no longer grows with the
+    number of distinct products or customers. Every approximated figure is
+    reported together with its error bound under 'aproximado'.
+    """
+
+    def __init__(self, plan: Optional[AggregationPlan] = None,
+                 precision: int = 14, capacity: int = 1000):
+        self.plan = plan or AggregationPlan()
+        self.totals_aggregate = SalesAggregate(AggregationPlan(list(self.plan.metrics & TOTAL_METRICS)))
+        self.clientes_hll = HyperLogLog(precision)
+        self.produtos = SpaceSaving(capacity)
+        self.clientes = SpaceSaving(capacity)
+
+    def totals(self) -> Dict[str, Any]:
+        """Exact sales totals"""
+        return self.totals_aggregate.totals()
+
+    def update(self, vendas_df: pd.DataFrame) -> 'ApproximateSalesAggregate':
+        """Fold a chunk of sales rows into the sketches"""
+        self.totals_aggregate.update(vendas_df)
+        self.clientes_hll.add(vendas_df['cliente_id'])
+
+        if self.plan.group_by_produto:
+            produtos = vendas_df.groupby('produto', observed=True).agg({
+                'quantidade': 'sum',
+                'preco_final': 'sum'
+            })
+            self.produtos.update(produtos['quantidade'], produtos['preco_final'])
+
+        if 'top_clientes' in self.plan.metrics:
+            clientes = vendas_df.groupby('cliente_id', observed=True).agg({
+                'preco_final': 'sum',
+                'quantidade': 'sum'
+            })
+            self.clientes.update(clientes['preco_final'], clientes['quantidade'])
+        return self
+
+    def merge(self, other: 'ApproximateSalesAggregate') -> 'ApproximateSalesAggregate':
+        """Merge another approximate aggregate"""
+        self.totals_aggregate.merge(other.totals_aggregate)
+        self.clientes_hll.merge(other.clientes_hll)
+        self.produtos.merge(other.produtos)
+        self.clientes.merge(other.clientes)
+        return self
+
+    def to_statistics(self, total_clientes: int, total_enderecos: int,
+                      k: int = 5) -> Dict[str, Any]:
+        """Build the statistics dict, with approximated figures and their error bounds"""
+        stats = self.totals_aggregate.to_statistics(total_clientes, total_enderecos, k)
+
+        stats['clientes_distintos_vendas'] = round(self.clientes_hll.estimate())
+        stats['aproximado'] = {
+            'clientes_distintos_vendas': {'erro_relativo': self.clientes_hll.relative_error}
+        }
+
+        # Estimated weights over-count by at most 'erro'; the secondary
+        # measure is summed only while the key is tracked
+        if 'top_produtos' in self.plan.metrics:
+            stats['top_produtos'] = {
+                produto: {'quantidade': int(row['peso']), 'preco_final': row['secundario'], 'erro': int(row['erro'])}
+                for produto, row in self.produtos.top(k).iterrows()
+            }
+            stats['aproximado']['top_produtos'] = {'erro_maximo': self.produtos.max_error}
+        if 'top_clientes' in self.plan.metrics:
+            stats['top_clientes'] = {
+                cliente_id: {'preco_final': row['peso'], 'quantidade': int(row['secundario']), 'erro': row['erro']}
+                for cliente_id, row in self.clientes.top(k).iterrows()
+            }
+            stats['aproximado']['top_clientes'] = {'erro_maximo': self.clientes.max_error}
+        return stats
+
+    def to_summary(self, clientes_ids, enderecos_cliente_ids=None) -> Dict[str, Any]:
+        """
+        Build the data summary, estimating the sales-side integrity counts
+
+        Customers and addresses are compared exactly; the sales side uses
+        set sizes from the sketches: |C without sales| = |C u V| - |V| and
+        |V without customer| = |C u V| - |C|.
+        """
+        summary = check_referential_integrity(clientes_ids, np.array([], dtype=np.int64),
+                                              enderecos_cliente_ids)
+
+        clientes_hll = HyperLogLog(self.clientes_hll.precision).add(clientes_ids)
+        total_clientes = len(unique_ids(clientes_ids))
+        vendas_estimate = self.clientes_hll.estimate()
+        union_estimate = max(clientes_hll.merge(self.clientes_hll).estimate(), total_clientes, vendas_estimate)
+
+        summary['clientes_sem_vendas'] = max(round(union_estimate - vendas_estimate), 0)
+        summary['vendas_cliente_inexistente'] = max(round(union_estimate - total_clientes), 0)
+
+        # One standard error (not a bound) of each estimate involved in the difference
+        relative_error = self.clientes_hll.relative_error
+        summary['aproximado'] = {
+            'clientes_sem_vendas': {
+                'erro_absoluto': round(relative_error * (union_estimate + vendas_estimate))
+            },
+            'vendas_cliente_inexistente': {
+                'erro_absoluto': round(relative_error * union_estimate)
+            }
+        }
+        return summary
@@ -0,0 +1,187 @@
+"""
+Analysis pipeline: validation, processing, report writing and execution record
+
+Kept free of any UI code so it can run on a worker thread.
+"""
+
+import logging
+from typing import Any, Dict, List, Optional
+
+from .file_processor import FileValidator, DataProcessor
+from .output_writer import OutputWriter
+from .progress import AnalysisCancelled, ProgressTracker
+
+
+class AnalysisPipeline:
+    """Runs one analysis from the input folder to the saved reports"""
+
+    REQUIRED_FILES = FileValidator.REQUIRED_FILES
+
+    def __init__(self, data_processor: DataProcessor, execution_model,
+                 file_validator: Optional[FileValidator] = None):
+        self.data_processor = data_processor
+        self.execution_model = execution_model
+        self.file_validator = file_validator or FileValidator()
+        self.logger = logging.getLogger(__name__)
+
+    def execute(self, analysis_data: Dict[str, Any],
+                progress: Optional[ProgressTracker] = None) -> Dict[str, Any]:
+        """
+        Run a full analysis without recording it
+
+        Args:
+            analysis_data: Form data from MainView (protocolo, setor,
+                pasta_origem, arquivo_resultado)
+            progress: Optional tracker to report progress to and to cancel
+                the run with
+
+        Returns:
+            Dict with 'success', 'cancelled', 'error_message', 'stages'
+            (ProgressTracker.stage_timings of the run) and, on success, the
+            'output_folder', 'files' written, their 'artifacts' (see
+            write_reports) and 'processing_results'
+        """
+        if progress is None:
+            progress = ProgressTracker()
+        result = {
+            'success': False,
+            'cancelled': False,
+            'error_message': '',
+            'execution_id': None,
+            'output_folder': analysis_data['arquivo_resultado'],
+            'files': [],
+            'artifacts': [],
+            'processing_results': {},
+            'stages': []
+        }
+
+        try:
+            self.logger.info(f"Starting analysis for protocol: {analysis_data['protocolo']}")
+            self._run_stages(analysis_data, progress, result)
+
+        except AnalysisCancelled as e:
+            self.logger.info(f"{e} (protocol {analysis_data['protocolo']})")
+            result['cancelled'] = True
+            result['error_message'] = str(e)
+
+        except Exception as e:
+            self.logger.error(f"Analysis error: {e}")
+            result['error_message'] = f"Error during analysis: {str(e)}"
+
+        progress.finish()
+        result['stages'] = progress.stage_timings()
+        return result
+
+    def _run_stages(self, analysis_data: Dict[str, Any], progress: ProgressTracker,
+                    result: Dict[str, Any]):
+        """Validate, process and write the reports, filling in result"""
+        # Validate, load and process files in a single pass (or reuse a
+        # memoized result when none of them changed)
+        files_dict = self.file_validator.find_files(analysis_data['pasta_origem'])
+        validation_results, processing_results = self.data_processor.analyze_files(files_dict, progress)
+
+        # Check if validation passed
+        for file_type, (is_valid, message) in validation_results.items():
+            if file_type in self.REQUIRED_FILES and not is_valid:
+                result['error_message'] = f"File validation error {file_type}: {message}"
+                return
+
+        result['processing_results'] = processing_results
+
+        if not processing_results['success']:
+            result['error_message'] = f"Processing error: {processing_results['error_message']}"
+            return
+
+        result['artifacts'] = self.write_reports(processing_results, analysis_data, progress)
+        result['files'] = [artifact['name'] for artifact in result['artifacts']]
+        result['success'] = True
+        self.logger.info(f"Analysis completed successfully for protocol: {analysis_data['protocolo']}")
+
+    @staticmethod
+    def execution_fields(result: Dict[str, Any]) -> Dict[str, Any]:
+        """Status, filename, notes and artifacts of the execution row describing a result"""
+        if result['success']:
+            total_vendas = result['processing_results']['statistics']['total_vendas']
+            return {
+                'status': 'completed',
+                'filename': ' / '.join(result['files']),
+                'notes': f"Analysis completed successfully. {total_vendas} sales processed.",
+                'artifacts': result.get('artifacts')
+            }
+        if result['cancelled']:
+            return {
+                'status': 'cancelled',
+                'filename': '-',
+                'notes': f"{result['error_message']}. No result files were written."
+            }
+        return {
+            'status': 'failed',
+            'filename': '-',
+            'notes': result['error_message']
+        }
+
+    def write_reports(self, processing_results: Dict[str, Any],
+                      analysis_data: Dict[str, Any],
+                      progress: Optional[ProgressTracker] = None) -> List[Dict[str, Any]]:
+        """
+        Write the TXT, HTML and PDF reports to the output folder
+
+        The reports are written concurrently (the PDF overlaps the TXT and
+        HTML writes, unless it is rendered from the HTML) to temporary files,
+        and replace the final files only after all of them succeeded, so a
+        cancelled, failed or interrupted run leaves the output folder
+        untouched. A PDF that cannot be generated is left out. With a PDF
+        cache, the PDF of an HTML report identical to one already rendered
+        is reused.
+
+        Returns:
+            One dict per file written, with its 'name', 'size' and 'sha256'
+        """
+        if progress is not None:
+            progress.set_stage('reports')
+
+        # One date for every report of the run
+        generated_at = self.data_processor.report_timestamp()
+        report_text = self.data_processor.generate_report_text(
+            processing_results,
+            analysis_data['protocolo'],
+            analysis_data['setor'],
+            analysis_data['pasta_origem'],
+            analysis_data['arquivo_resultado'],
+            generated_at
+        )
+
+        def write_txt(path: str):
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(report_text)
+
+        def write_html(path: str):
+            with open(path, 'w', encoding='utf-8') as f:
+                self.data_processor.write_report_html(
+                    f,
+                    report_text,
+                    analysis_data['protocolo'],
+                    analysis_data['setor'],
+                    generated_at
+                )
+
+        with OutputWriter(analysis_data['arquivo_resultado'], progress) as writer:
+            writer.submit('results.txt', write_txt)
+            writer.submit('results.html', write_html)
+
+            def write_pdf(path: str) -> bool:
+                html = None
+                if self.data_processor.pdf_needs_html():
+                    html = writer.wait('results.html')
+                    if html is None:
+                        return False
+                return self.data_processor.generate_report_pdf(
+                    writer.temp_path('results.html'), path, progress,
+                    text_content=report_text,
+                    title=f"Analysis Report - {analysis_data['protocolo']}",
+                    # The PDF shows exactly what the final HTML holds, date included
+                    cache_key=html['sha256'] if html is not None else None
+                )
+
+            writer.submit('results.pdf', write_pdf, required=False)
+            return writer.commit()
@@ -0,0 +1,122 @@
+"""
+Checkpoints of sales aggregates for incremental re-analysis of append-only files
+"""
+
+import io
+import os
+import pickle
+import hashlib
+from typing import Any, Dict, Optional
+
+from .disk_cache import LRUDiskCache
+
+
+CHECKPOINT_VERSION = 1
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def last_line_end(file_path: str) -> int:
+    """Offset just past the last newline of a file (0 if it has none)"""
+    size = os.path.getsize(file_path)
+    with open(file_path, 'rb') as f:
+        position = size
+        while position > 0:
+            start = max(position - 64 * 1024, 0)
+            f.seek(start)
+            block = f.read(position - start)
+            index = block.rfind(b'\n')
+            if index >= 0:
+                return start + index + 1
+            position = start
+    return 0
+
+
+def hash_prefix(file_path: str, length: int):
+    """blake2b hasher fed with the first length bytes of a file"""
+    hasher = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as f:
+        remaining = length
+        while remaining > 0:
+            block = f.read(min(HASH_BLOCK_SIZE, remaining))
+            if not block:
+                break
+            hasher.update(block)
+            remaining -= len(block)
+    return hasher
+
+
+class ByteRangeReader(io.RawIOBase):
+    """Read-only view of a file handle up to an end offset
+
+    Every byte read is also fed to an optional hasher, so the prefix hash of
+    the next checkpoint is computed while the range is parsed.
+    """
+
+    def __init__(self, handle, end: int, hasher=None):
+        super().__init__()
+        self.handle = handle
+        self.end = end
+        self.hasher = hasher
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        remaining = self.end - self.handle.tell()
+        if remaining <= 0:
+            return 0
+        data = self.handle.read(min(len(buffer), remaining))
+        if self.hasher is not None:
+            self.hasher.update(data)
+        buffer[:len(data)] = data
+        return len(data)
+
+    def tell(self) -> int:
+        return self.handle.tell()
+
+    def close(self):
+        self.handle.close()
+        super().close()
+
+
+class AggregateCheckpointStore(LRUDiskCache):
+    """Latest aggregate checkpoint of each source file
+
+    A checkpoint holds the mergeable aggregate of the file's first ``offset``
+    bytes (always a line boundary) with the hash of those bytes. It is keyed
+    by path and aggregation variant, not by content, so that a grown file
+    still finds the checkpoint of its previous version.
+    """
+
+    def __init__(self, directory: str = "cache/checkpoints", max_size_bytes: int = 256 * 1024 * 1024):
+        super().__init__(directory, max_size_bytes)
+
+    def key_for(self, file_path: str, variant: str = "") -> str:
+        """Checkpoint key of file_path aggregated with a given variant"""
+        return f"{os.path.abspath(file_path)}:{variant}"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the stored checkpoint for key, if any"""
+        try:
+            path = self.lookup(key)
+            if path is None:
+                return None
+            with open(path, 'rb') as f:
+                checkpoint = pickle.load(f)
+            if checkpoint.get('version') != CHECKPOINT_VERSION:
+                return None
+            return checkpoint
+        except Exception as e:
+            self.logger.warning(f"Ignoring unreadable checkpoint {key}: {e}")
+            return None
+
+    def put(self, key: str, checkpoint: Dict[str, Any]):
+        """Store the checkpoint for key, replacing the previous one"""
+        tmp_path = self.reserve(key)
+        try:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(dict(checkpoint, version=CHECKPOINT_VERSION), f, protocol=5)
+            self.commit(key, tmp_path)
+        except Exception as e:
+            self.discard(tmp_path)
+            self.logger.warning(f"Could not store checkpoint {key}: {e}")
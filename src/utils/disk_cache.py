@@ -0,0 +1,256 @@
+"""
+On-disk caches keyed by file content fingerprints
+"""
+
+import os
+import pickle
+import shutil
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+import pandas as pd
+
+
+# Fingerprints already computed in this process, by file identity and version
+_FINGERPRINT_MEMO: "OrderedDict[tuple, str]" = OrderedDict()
+_FINGERPRINT_MEMO_SIZE = 256
+_fingerprint_lock = threading.Lock()
+
+
+def file_fingerprint(file_path: str) -> str:
+    """
+    Fingerprint a file by path, size, modification time and content hash
+
+    The content hash of a given file version (inode, size and mtime) is
+    computed once per process, since several caches key on the same inputs.
+
+    Returns:
+        Hex digest identifying this exact version of the file
+    """
+    stat = os.stat(file_path)
+    version = (os.path.abspath(file_path), stat.st_ino, stat.st_size, stat.st_mtime_ns)
+    with _fingerprint_lock:
+        if version in _FINGERPRINT_MEMO:
+            _FINGERPRINT_MEMO.move_to_end(version)
+            return _FINGERPRINT_MEMO[version]
+
+    content_hash = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            content_hash.update(block)
+
+    key = hashlib.sha256()
+    key.update(os.path.abspath(file_path).encode('utf-8'))
+    key.update(f"|{stat.st_size}|{stat.st_mtime_ns}|".encode('utf-8'))
+    key.update(content_hash.digest())
+    fingerprint = key.hexdigest()
+
+    with _fingerprint_lock:
+        _FINGERPRINT_MEMO[version] = fingerprint
+        while len(_FINGERPRINT_MEMO) > _FINGERPRINT_MEMO_SIZE:
+            _FINGERPRINT_MEMO.popitem(last=False)
+    return fingerprint
+
+
+class LRUDiskCache:
+    """Directory of cached entries evicted by least recent use
+
+    Each entry is a single file named after the hash of its key. The file
+    modification time records the last access, so the cache needs no index
+    and can be shared by several processes.
+    """
+
+    def __init__(self, directory: str, max_size_bytes: int = 512 * 1024 * 1024):
+        self.directory = directory
+        self.max_size_bytes = max_size_bytes
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def entry_path(self, key: str) -> str:
+        """Path of the file holding the entry for key"""
+        return os.path.join(self.directory, hashlib.sha256(key.encode('utf-8')).hexdigest())
+
+    def lookup(self, key: str) -> Optional[str]:
+        """Return the entry path for key if cached, marking it as recently used"""
+        path = self.entry_path(key)
+        try:
+            os.utime(path, None)
+        except OSError:
+            return None
+        return path
+
+    def reserve(self, key: str) -> str:
+        """Return a temporary path to write a new entry to before commit()"""
+        return f"{self.entry_path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+    def commit(self, key: str, tmp_path: str) -> str:
+        """Atomically publish a written entry and enforce the size limit"""
+        path = self.entry_path(key)
+        os.replace(tmp_path, path)
+        self.evict()
+        return path
+
+    def discard(self, tmp_path: str):
+        """Remove a reserved entry that could not be written"""
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits its limit"""
+        with self._lock:
+            entries = []
+            total_size = 0
+            for name in os.listdir(self.directory):
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total_size += stat.st_size
+
+            entries.sort()
+            for _, size, path in entries:
+                if total_size <= self.max_size_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total_size -= size
+                    self.logger.info(f"Evicted cache entry: {path}")
+                except OSError:
+                    pass
+
+
+class ParsedFileCache(LRUDiskCache):
+    """Cache of parsed input files stored as typed pandas frames
+
+    Frames are stored with pickle protocol 5, which keeps each column block
+    as a contiguous binary buffer, so loading skips CSV/XLSX parsing entirely.
+    """
+
+    def __init__(self, directory: str = "cache/parsed", max_size_bytes: int = 512 * 1024 * 1024):
+        super().__init__(directory, max_size_bytes)
+
+    def key_for(self, file_path: str, variant: str = "") -> str:
+        """Cache key for the current version of file_path read with a given loader variant"""
+        return f"{file_fingerprint(file_path)}:{variant}"
+
+    def get(self, key: str) -> Optional[pd.DataFrame]:
+        """Return the cached frame for key, if any"""
+        try:
+            path = self.lookup(key)
+            if path is None:
+                return None
+            return pd.read_pickle(path)
+        except Exception as e:
+            self.logger.warning(f"Ignoring unreadable cache entry {key}: {e}")
+            return None
+
+    def put(self, key: str, df: pd.DataFrame):
+        """Store a parsed frame under key"""
+        tmp_path = self.reserve(key)
+        try:
+            df.to_pickle(tmp_path, protocol=5)
+            self.commit(key, tmp_path)
+        except Exception as e:
+            self.discard(tmp_path)
+            self.logger.warning(f"Could not cache parsed frame {key}: {e}")
+
+
+class AnalysisResultCache(LRUDiskCache):
+    """Cache of whole analysis results keyed by the fingerprints of all input files
+
+    A repeated analysis of unchanged files (e.g. only the protocol or
+    department changed) reuses the statistics and only re-renders reports.
+    Any change to an input file changes its fingerprint, so stale results
+    are never returned; they simply age out of the LRU.
+    """
+
+    def __init__(self, directory: str = "cache/results", max_size_bytes: int = 64 * 1024 * 1024):
+        super().__init__(directory, max_size_bytes)
+
+    def key_for(self, files_dict: Dict[str, Any], variant: str = "") -> str:
+        """Cache key for the current versions of the input files analyzed with a given variant
+
+        Values of files_dict are a path, None, or a list of paths (sales partitions).
+        """
+        parts = []
+        for file_type in sorted(files_dict):
+            file_paths = files_dict[file_type]
+            if not isinstance(file_paths, list):
+                file_paths = [file_paths]
+            fingerprints = [
+                file_fingerprint(file_path) if file_path and os.path.exists(file_path) else "-"
+                for file_path in file_paths
+            ]
+            parts.append(f"{file_type}={','.join(fingerprints)}")
+        return f"{'|'.join(parts)}:{variant}"
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached result for key, if any"""
+        try:
+            path = self.lookup(key)
+            if path is None:
+                return None
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        except Exception as e:
+            self.logger.warning(f"Ignoring unreadable cache entry {key}: {e}")
+            return None
+
+    def put(self, key: str, value: Any):
+        """Store a result under key"""
+        tmp_path = self.reserve(key)
+        try:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(value, f, protocol=5)
+            self.commit(key, tmp_path)
+        except Exception as e:
+            self.discard(tmp_path)
+            self.logger.warning(f"Could not cache analysis result {key}: {e}")
+
+
+class PdfArtifactCache(LRUDiskCache):
+    """Cache of rendered PDF reports keyed by the hash of their report
+
+    Rendering the same report with the same backend gives the same PDF, so
+    a hit is copied into the output folder instead of being rendered again.
+    Entries are always copied, never linked: the output files stay
+    independent of the cache, whose access times they must not share.
+    """
+
+    def __init__(self, directory: str = "cache/pdf", max_size_bytes: int = 128 * 1024 * 1024):
+        super().__init__(directory, max_size_bytes)
+
+    def key_for(self, report_key: str, variant: str = "") -> str:
+        """Cache key for the PDF of a report rendered by a given backend variant"""
+        return f"{report_key}:{variant}"
+
+    def fetch(self, key: str, pdf_path: str) -> bool:
+        """Place the cached PDF for key at pdf_path; False if there is none"""
+        try:
+            path = self.lookup(key)
+            if path is None:
+                return False
+            shutil.copyfile(path, pdf_path)
+            return True
+        except Exception as e:
+            self.logger.warning(f"Ignoring unusable cache entry {key}: {e}")
+            return False
+
+    def store(self, key: str, pdf_path: str):
+        """Store a rendered PDF under key"""
+        tmp_path = self.reserve(key)
+        try:
+            shutil.copyfile(pdf_path, tmp_path)
+            self.commit(key, tmp_path)
+        except Exception as e:
+            self.discard(tmp_path)
+            self.logger.warning(f"Could not cache PDF {key}: {e}")
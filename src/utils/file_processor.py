@@ -3,13 +3,41 @@ File validation and processing utilities
 """
 
 import os
+import hashlib
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
 import pandas as pd
-from typing import Dict, List, Tuple, Optional
+from typing import Any, Dict, Iterable, List, Tuple, Optional
+import json
 import logging
 
+from .aggregation import AggregationPlan, ApproximateSalesAggregate, SalesAggregate
+from .checkpoints import AggregateCheckpointStore, ByteRangeReader, hash_prefix, last_line_end
+from .disk_cache import AnalysisResultCache, ParsedFileCache, PdfArtifactCache
+from .integrity import check_referential_integrity
+from .partials import AnalysisPartial, merge_partials
+from .pdf_renderer import PDF_BACKENDS, get_pdf_renderer
+from .progress import AnalysisCancelled, ProgressTracker
+from .schema import apply_schema, build_dataset_schemas, estimate_default_memory, parse_dtypes
+from .template_engine import CompiledTemplate, load_template
+from .xlsx_reader import iter_xlsx_batches, read_xlsx, read_xlsx_header
+
 class FileValidator:
     """Class for validating CSV/XLSX files"""
     
+    # Expected columns for each file
+    EXPECTED_COLUMNS = {
+        'clientes': ['id', 'nome'],
+        'vendas': ['cliente_id', 'produto', 'quantidade', 'preco_unitario', 'preco_final'],
+        'enderecos': ['cliente_id', 'rua', 'bairro', 'cidade']
+    }
+    REQUIRED_FILES = ['clientes', 'vendas']
+    # Sales may also be exported as many partitions: vendas_<anything>.csv/xlsx
+    # files and/or every CSV/XLSX file of a vendas/ subfolder
+    PARTITION_PREFIX = 'vendas_'
+    PARTITION_FOLDER = 'vendas'
+    PARTITIONS_KEY = 'vendas_partitions'
+    
     def __init__(self):
         self.logger = logging.getLogger(__name__)
     
@@ -18,7 +46,9 @@ class FileValidator:
         Find necessary files in folder
         
         Returns:
-            Dict with paths of found files
+            Dict with paths of found files. When sales come in several
+            partitions, 'vendas_partitions' lists all of them (sorted) and
+            'vendas' is the first one.
         """
         files_found = {
             'clientes': None,
@@ -29,6 +59,7 @@ class FileValidator:
         if not os.path.exists(folder_path):
             return files_found
         
+        partitions = []
         try:
             files_in_folder = os.listdir(folder_path)
             
@@ -42,12 +73,44 @@ class FileValidator:
                     files_found['vendas'] = full_path
                 elif name_lower.startswith('enderecos.') and self._is_valid_extension(name_lower):
                     files_found['enderecos'] = full_path
+                elif name_lower.startswith(self.PARTITION_PREFIX) and self._is_valid_extension(name_lower):
+                    partitions.append(full_path)
+                elif name_lower == self.PARTITION_FOLDER and os.path.isdir(full_path):
+                    partitions.extend(self._find_partitions(full_path))
                     
         except Exception as e:
             self.logger.error(f"Error listing files from folder {folder_path}: {e}")
         
+        if partitions:
+            if files_found['vendas']:
+                partitions.append(files_found['vendas'])
+            partitions.sort()
+            files_found['vendas'] = partitions[0]
+            if len(partitions) > 1:
+                files_found[self.PARTITIONS_KEY] = partitions
+        
         return files_found
     
+    def _find_partitions(self, folder_path: str) -> List[str]:
+        """Sales partitions stored in a vendas/ subfolder"""
+        return [
+            os.path.join(folder_path, file_name)
+            for file_name in os.listdir(folder_path)
+            if not file_name.startswith('.') and self._is_valid_extension(file_name.lower())
+        ]
+    
+    @classmethod
+    def input_files(cls, files_dict: Dict[str, Any]) -> Dict[str, Optional[str]]:
+        """The clientes/vendas/enderecos entries of files_dict, without the partition list"""
+        return {file_type: path for file_type, path in files_dict.items() if file_type != cls.PARTITIONS_KEY}
+    
+    @classmethod
+    def sales_partitions(cls, files_dict: Dict[str, Any]) -> List[str]:
+        """All sales files of files_dict: its partitions, or the single sales file"""
+        if files_dict.get(cls.PARTITIONS_KEY):
+            return list(files_dict[cls.PARTITIONS_KEY])
+        return [files_dict['vendas']] if files_dict.get('vendas') else []
+    
     def _is_valid_extension(self, filename: str) -> bool:
         """Check if file extension is valid"""
         return filename.endswith('.csv') or filename.endswith('.xlsx')
@@ -65,26 +128,38 @@ class FileValidator:
         try:
             # Read header only
             if file_path.endswith('.csv'):
-                df = pd.read_csv(file_path, nrows=0)
+                columns = pd.read_csv(file_path, nrows=0).columns
             elif file_path.endswith('.xlsx'):
-                df = pd.read_excel(file_path, nrows=0)
+                columns = read_xlsx_header(file_path)
             else:
                 return False, "Unsupported file format"
             
-            # Check columns
-            missing_columns = []
-            for col in expected_columns:
-                if col not in df.columns:
-                    missing_columns.append(col)
-            
-            if missing_columns:
-                return False, f"Missing columns: {', '.join(missing_columns)}"
-            
-            return True, "Valid file"
+            return self.validate_columns(columns, expected_columns)
             
         except Exception as e:
             return False, f"Error reading file: {str(e)}"
     
+    def validate_columns(self, columns: Iterable[str], expected_columns: List[str]) -> Tuple[bool, str]:
+        """
+        Check an already read header against the expected columns
+        
+        Returns:
+            Tuple (is_valid, error_message)
+        """
+        columns = set(columns)
+        missing_columns = [col for col in expected_columns if col not in columns]
+        
+        if missing_columns:
+            return False, f"Missing columns: {', '.join(missing_columns)}"
+        
+        return True, "Valid file"
+    
+    def missing_file_result(self, file_type: str) -> Tuple[bool, str]:
+        """Validation result for a file that was not found"""
+        if file_type in self.REQUIRED_FILES:
+            return False, "Required file not found"
+        return True, "Optional file not found"
+    
     def validate_all_files(self, files_dict: Dict[str, Optional[str]]) -> Dict[str, Tuple[bool, str]]:
         """
         Validate all found files
@@ -94,54 +169,402 @@ class FileValidator:
         """
         validation_results = {}
         
-        # Define expected columns for each file
-        expected_columns = {
-            'clientes': ['id', 'nome'],
-            'vendas': ['cliente_id', 'produto', 'quantidade', 'preco_unitario', 'preco_final'],
-            'enderecos': ['cliente_id', 'rua', 'bairro', 'cidade']
-        }
-        
-        for file_type, file_path in files_dict.items():
+        for file_type, file_path in self.input_files(files_dict).items():
             if file_path is None:
-                if file_type in ['clientes', 'vendas']:  # Required
-                    validation_results[file_type] = (False, "Required file not found")
-                else:  # Optional
-                    validation_results[file_type] = (True, "Optional file not found")
+                validation_results[file_type] = self.missing_file_result(file_type)
+            elif file_type == 'vendas':
+                validation_results[file_type] = self.validate_partitions(self.sales_partitions(files_dict))
             else:
                 validation_results[file_type] = self.validate_file_structure(
-                    file_path, expected_columns[file_type]
+                    file_path, self.EXPECTED_COLUMNS[file_type]
                 )
         
         return validation_results
+    
+    def validate_partitions(self, paths: List[str]) -> Tuple[bool, str]:
+        """
+        Validate the structure of every sales partition
+        
+        Returns:
+            Tuple (is_valid, error_message) naming the first invalid partition
+        """
+        for path in paths:
+            is_valid, message = self.validate_file_structure(path, self.EXPECTED_COLUMNS['vendas'])
+            if not is_valid:
+                if len(paths) > 1:
+                    message = f"{os.path.basename(path)}: {message}"
+                return False, message
+        if len(paths) > 1:
+            return True, f"Valid files ({len(paths)} partitions)"
+        return True, "Valid file"
 
 
 class DataProcessor:
     """Class for data processing"""
     
-    def __init__(self):
+    # Sales files larger than this are aggregated in chunks instead of loaded whole
+    STREAMING_THRESHOLD_BYTES = 256 * 1024 * 1024
+    # XLSX is zip-compressed, so a much smaller file already holds many rows
+    XLSX_STREAMING_THRESHOLD_BYTES = 32 * 1024 * 1024
+    DEFAULT_CHUNK_SIZE = 200_000
+    # One loader thread per input file (clientes, vendas, enderecos)
+    LOAD_WORKERS = 3
+    # Sales partitions totalling less than this are aggregated in-process:
+    # below it, starting worker processes costs more than it saves
+    PARALLEL_PARTITIONS_MIN_BYTES = 16 * 1024 * 1024
+    # How often the partition pool is checked for cancellation
+    PARTITION_POLL_SECONDS = 0.2
+    
+    def __init__(self, chunk_size: Optional[int] = None,
+                 cache: Optional[ParsedFileCache] = None,
+                 top_k: int = 5,
+                 metrics: Optional[List[str]] = None,
+                 orphan_sample_size: int = 0,
+                 approximate: bool = False,
+                 checkpoints: Optional[AggregateCheckpointStore] = None,
+                 result_cache: Optional[AnalysisResultCache] = None,
+                 partition_workers: Optional[int] = None,
+                 pdf_backend: str = 'auto',
+                 pdf_cache: Optional[PdfArtifactCache] = None):
+        """
+        Args:
+            chunk_size: Rows per chunk when streaming the sales file. When None,
+                chunked mode is only used for files above STREAMING_THRESHOLD_BYTES.
+            cache: Optional on-disk cache of parsed files, reused while a file is unchanged
+            top_k: Number of products and customers listed in the rankings
+            metrics: Sales metrics to compute (see aggregation.SALES_METRICS); all by default
+            orphan_sample_size: When positive, the data summary also lists up to
+                this many orphaned ids per integrity check (exact mode only)
+            approximate: Stream the sales file once into fixed-memory sketches
+                (HyperLogLog, Space-Saving) instead of exact per-key groups.
+                Distinct counts are reported with their standard error, the
+                top lists with their maximum over-count.
+            checkpoints: Optional store of sales aggregate checkpoints. When
+                given, CSV sales files are aggregated incrementally: only the
+                bytes appended since the last run are parsed.
+            result_cache: Optional cache of whole analysis results. When given,
+                analyze_files() returns the stored results of a previous run
+                on the very same input files without reading them again.
+            partition_workers: Worker processes aggregating sales partitions
+                (default: CPU count). 1 aggregates them in-process.
+            pdf_backend: PDF backend (see pdf_renderer.PDF_BACKENDS): 'wkhtmltopdf'
+                renders the HTML report, 'native' writes the text report
+                directly, 'auto' uses wkhtmltopdf when installed and falls
+                back to the native writer otherwise
+            pdf_cache: Optional cache of rendered PDFs. When given, the PDF
+                of an HTML report already rendered byte for byte (date
+                included) is copied instead of rendered again. Not used by
+                the native backend, which is faster than a cache lookup.
+        """
         self.logger = logging.getLogger(__name__)
+        self.chunk_size = chunk_size
+        self.cache = cache
+        self.top_k = top_k
+        self.orphan_sample_size = orphan_sample_size
+        self.approximate = approximate
+        self.checkpoints = checkpoints
+        self.result_cache = result_cache
+        self.partition_workers = max(1, partition_workers or os.cpu_count() or 1)
+        if pdf_backend not in PDF_BACKENDS:
+            raise ValueError(f"Unknown PDF backend: {pdf_backend}")
+        if approximate and orphan_sample_size > 0:
+            raise ValueError("Orphaned id samples need exact mode: the sketches keep no sales ids")
+        self.pdf_backend = pdf_backend
+        self.pdf_cache = pdf_cache
+        self.validator = FileValidator()
+        # The integrity summary always needs the customers with sales
+        if metrics is not None and 'clientes_com_vendas' not in metrics:
+            metrics = list(metrics) + ['clientes_com_vendas']
+        self.plan = AggregationPlan(metrics)
+        self.schemas = build_dataset_schemas(
+            FileValidator.EXPECTED_COLUMNS,
+            {'vendas': self.plan.required_columns()}
+        )
     
-    def load_file(self, file_path: str) -> Optional[pd.DataFrame]:
-        """Load CSV or XLSX file"""
+    def load_file(self, file_path: str, file_type: Optional[str] = None,
+                  progress: Optional[ProgressTracker] = None) -> Optional[pd.DataFrame]:
+        """
+        Load CSV or XLSX file
+        
+        When file_type names a known dataset, only the columns its schema
+        needs are read, with compact dtypes.
+        """
         if not os.path.exists(file_path):
             return None
         
         try:
-            if file_path.endswith('.csv'):
-                return pd.read_csv(file_path)
-            elif file_path.endswith('.xlsx'):
-                return pd.read_excel(file_path)
-            else:
-                self.logger.error(f"Unsupported format: {file_path}")
-                return None
+            return self._load(file_path, self.schemas.get(file_type), progress)
+        except AnalysisCancelled:
+            raise
         except Exception as e:
             self.logger.error(f"Error loading file {file_path}: {e}")
             return None
     
-    def process_data(self, files_dict: Dict[str, Optional[str]]) -> Dict[str, any]:
+    def _load(self, file_path: str, schema: Optional[Dict] = None,
+              progress: Optional[ProgressTracker] = None) -> pd.DataFrame:
+        """Parse a file, reusing the parsed cache when the file is unchanged"""
+        df = self._load_cached(file_path, schema)
+        if progress is not None:
+            progress.advance(rows=len(df), bytes_read=os.path.getsize(file_path))
+        return df
+    
+    def _load_cached(self, file_path: str, schema: Optional[Dict] = None) -> pd.DataFrame:
+        """Return the parsed file from the cache, parsing and storing it on a miss"""
+        cache_key = None
+        if self.cache is not None:
+            try:
+                variant = json.dumps(schema, sort_keys=True) if schema else ""
+                cache_key = self.cache.key_for(file_path, variant)
+                df = self.cache.get(cache_key)
+                if df is not None:
+                    self.logger.info(f"Loaded {file_path} from parsed cache")
+                    return df
+            except OSError as e:
+                self.logger.warning(f"Parsed cache unavailable for {file_path}: {e}")
+                cache_key = None
+        
+        df = self._read_file(file_path, schema)
+        
+        if cache_key is not None:
+            self.cache.put(cache_key, df)
+        return df
+    
+    def _read_file(self, file_path: str, schema: Optional[Dict] = None) -> pd.DataFrame:
+        """Parse a CSV or XLSX file, raising on unsupported formats and read errors"""
+        if file_path.endswith('.csv'):
+            if schema is None:
+                return pd.read_csv(file_path)
+            return apply_schema(pd.read_csv(file_path, **self._csv_schema_options(schema)), schema)
+        elif file_path.endswith('.xlsx'):
+            df = read_xlsx(file_path)
+            return apply_schema(df, schema) if schema is not None else df
+        raise ValueError("Unsupported file format")
+    
+    def _read_chunks(self, file_path: str, chunk_size: int,
+                     schema: Optional[Dict] = None,
+                     progress: Optional[ProgressTracker] = None) -> Iterable[pd.DataFrame]:
+        """Open a CSV or XLSX file as an iterator of DataFrame chunks"""
+        if file_path.endswith('.csv'):
+            options = self._csv_schema_options(schema) if schema is not None else {}
+            # Parsing from our own handle lets progress report the bytes consumed
+            handle = open(file_path, 'rb')
+            try:
+                chunks = pd.read_csv(handle, chunksize=chunk_size, **options)
+            except Exception:
+                handle.close()
+                raise
+            chunks = self._track_chunks(chunks, progress, handle=handle)
+        elif file_path.endswith('.xlsx'):
+            # Compressed XLSX offers no byte position; the size is counted at the end
+            chunks = self._track_chunks(iter_xlsx_batches(file_path, chunk_size), progress,
+                                        file_size=os.path.getsize(file_path))
+        else:
+            raise ValueError("Unsupported file format")
+        if schema is None:
+            return chunks
+        return (apply_schema(chunk, schema) for chunk in chunks)
+    
+    @staticmethod
+    def _track_chunks(chunks: Iterable[pd.DataFrame], progress: Optional[ProgressTracker],
+                      handle=None, file_size: int = 0, start: int = 0) -> Iterable[pd.DataFrame]:
+        """Yield chunks, reporting rows and bytes read; stops with AnalysisCancelled when cancelled"""
+        position = start
+        try:
+            for chunk in chunks:
+                if progress is not None:
+                    current = handle.tell() if handle is not None else 0
+                    progress.advance(rows=len(chunk), bytes_read=max(current - position, 0))
+                    position = max(current, position)
+                yield chunk
+            if progress is not None:
+                end = handle.tell() if handle is not None else file_size
+                progress.advance(bytes_read=max(end - position, 0))
+        finally:
+            if handle is not None:
+                handle.close()
+    
+    @staticmethod
+    def _csv_schema_options(schema: Dict) -> Dict[str, Any]:
+        """read_csv options that project and type columns while parsing"""
+        usecols = set(schema['usecols'])
+        return {
+            'usecols': lambda col: col in usecols,
+            'dtype': parse_dtypes(schema)
+        }
+    
+    def _read_header(self, file_path: str) -> List[str]:
+        """Read the column names of a CSV or XLSX file"""
+        if file_path.endswith('.xlsx'):
+            return read_xlsx_header(file_path)
+        return list(pd.read_csv(file_path, nrows=0).columns)
+    
+    def ingest_files(self, files_dict: Dict[str, Optional[str]],
+                     progress: Optional[ProgressTracker] = None) -> Tuple[Dict[str, Tuple[bool, str]], Dict[str, Any]]:
+        """
+        Validate the header of each input file and parse the valid ones
+        
+        Replaces running FileValidator.validate_all_files followed by a second
+        parse in process_data. Files are read concurrently. Each file's header
+        is read and checked first (_read_header); only valid files are then
+        parsed, as a DataFrame or, for large sales files, as a chunk reader.
+        
+        Returns:
+            Tuple (validation_results, loaded_data) where loaded_data maps each
+            valid file type to a DataFrame or, for streamed sales, an iterator
+            of chunks (a finished aggregate when sales are checkpointed).
+            Pass loaded_data to process_data.
+        """
+        validation_results = {}
+        loaded_data = {}
+        
+        if progress is not None:
+            progress.set_stage('reading')
+            self._expect_files(files_dict, progress)
+        
+        partitions = FileValidator.sales_partitions(files_dict)
+        with ThreadPoolExecutor(max_workers=self.LOAD_WORKERS) as executor:
+            futures = {}
+            for file_type, file_path in FileValidator.input_files(files_dict).items():
+                if file_type == 'vendas' and len(partitions) > 1:
+                    futures[file_type] = executor.submit(self._ingest_partitions, partitions, progress)
+                else:
+                    futures[file_type] = executor.submit(self._ingest_file, file_type, file_path, progress)
+            for file_type, future in futures.items():
+                validation_results[file_type], data = future.result()
+                if data is not None:
+                    loaded_data[file_type] = data
+        
+        return validation_results, loaded_data
+    
+    def _ingest_partitions(self, paths: List[str],
+                           progress: Optional[ProgressTracker] = None) -> Tuple[Tuple[bool, str], Any]:
+        """
+        Validate every sales partition, then aggregate them all
+        
+        Returns:
+            Tuple (validation_result, aggregate) where aggregate is None
+            unless every partition is valid
+        """
+        schema = self.schemas['vendas']
+        for path in paths:
+            if not os.path.exists(path):
+                return (False, f"{os.path.basename(path)}: File not found"), None
+            try:
+                is_valid, message = self.validator.validate_columns(self._read_header(path), schema['columns'])
+            except Exception as e:
+                is_valid, message = False, f"Error reading file: {str(e)}"
+            if not is_valid:
+                self.logger.warning(f"Skipping invalid sales partition {path}: {message}")
+                return (False, f"{os.path.basename(path)}: {message}"), None
+        
+        try:
+            aggregate = self.aggregate_partitions(paths, progress)
+        except AnalysisCancelled:
+            raise
+        except Exception as e:
+            return (False, f"Error reading file: {str(e)}"), None
+        return (True, f"Valid files ({len(paths)} partitions)"), aggregate
+    
+    def analyze_files(self, files_dict: Dict[str, Optional[str]],
+                      progress: Optional[ProgressTracker] = None) -> Tuple[Dict[str, Tuple[bool, str]], Optional[Dict[str, Any]]]:
+        """
+        Validate and process the input files, reusing a memoized result when possible
+        
+        Equivalent to ingest_files() followed by process_data(). Successful
+        results are memoized by the fingerprints of all input files and the
+        analysis settings, so repeating an analysis of unchanged files only
+        costs hashing them.
+        
+        Returns:
+            Tuple (validation_results, processing_results); processing_results
+            is None when a required file failed validation
+        """
+        cache_key = None
+        if self.result_cache is not None:
+            try:
+                cache_key = self.result_cache.key_for(files_dict, self._result_variant())
+                cached = self.result_cache.get(cache_key)
+            except OSError as e:
+                self.logger.warning(f"Could not fingerprint input files: {e}")
+                cached = None
+            if cached is not None:
+                self.logger.info("Reusing the memoized analysis of unchanged input files")
+                if progress is not None:
+                    progress.set_stage('aggregating')
+                    self._expect_files(files_dict, progress)
+                    progress.advance(rows=int(cached['results']['statistics'].get('total_vendas', 0)),
+                                     bytes_read=progress.total_bytes)
+                return cached['validation'], cached['results']
+        
+        validation_results, loaded_data = self.ingest_files(files_dict, progress)
+        for file_type, (is_valid, _) in validation_results.items():
+            if file_type in FileValidator.REQUIRED_FILES and not is_valid:
+                return validation_results, None
+        
+        processing_results = self.process_data(files_dict, loaded_data, progress)
+        if cache_key is not None and processing_results['success']:
+            self.result_cache.put(cache_key, {'validation': validation_results, 'results': processing_results})
+        return validation_results, processing_results
+    
+    def _result_variant(self) -> str:
+        """Identifies the settings that shape a whole analysis result"""
+        return json.dumps({
+            'schemas': self.schemas,
+            'metrics': sorted(self.plan.metrics),
+            'approximate': self.approximate,
+            'top_k': self.top_k,
+            'orphan_sample_size': self.orphan_sample_size
+        }, sort_keys=True)
+    
+    def _ingest_file(self, file_type: str, file_path: Optional[str],
+                     progress: Optional[ProgressTracker] = None) -> Tuple[Tuple[bool, str], Any]:
+        """
+        Read and validate a single input file
+        
+        Returns:
+            Tuple (validation_result, data) where data is None unless the file is valid
+        """
+        if file_path is None:
+            return self.validator.missing_file_result(file_type), None
+        if not os.path.exists(file_path):
+            return (False, "File not found"), None
+        
+        schema = self.schemas[file_type]
+        try:
+            # The header is checked against every expected column, then only
+            # the columns the analysis needs are parsed
+            validation = self.validator.validate_columns(self._read_header(file_path), schema['columns'])
+            if not validation[0]:
+                self.logger.warning(f"Skipping invalid {file_type} file: {validation[1]}")
+                return validation, None
+            
+            chunk_size = self._streaming_chunk_size(file_path) if file_type == 'vendas' else None
+            if file_type == 'vendas' and self._incremental(file_path):
+                data = self.aggregate_incremental(file_path, progress)
+            elif chunk_size:
+                data = self._read_chunks(file_path, chunk_size, schema, progress)
+            else:
+                data = self._load(file_path, schema, progress)
+        except AnalysisCancelled:
+            raise
+        except Exception as e:
+            return (False, f"Error reading file: {str(e)}"), None
+        
+        return validation, data
+    
+    def process_data(self, files_dict: Dict[str, Optional[str]],
+                     loaded_data: Optional[Dict[str, Any]] = None,
+                     progress: Optional[ProgressTracker] = None) -> Dict[str, any]:
         """
         Process file data and generate statistics
         
+        Args:
+            files_dict: Paths of the input files
+            loaded_data: Data already read by ingest_files. When given, files
+                missing from it are treated as unavailable instead of re-read.
+            progress: Optional tracker receiving stage, rows and bytes. A
+                cancelled tracker makes this method raise AnalysisCancelled.
+        
         Returns:
             Dict with processing results
         """
@@ -149,107 +572,447 @@ class DataProcessor:
             'success': False,
             'error_message': '',
             'statistics': {},
-            'data_summary': {}
+            'data_summary': {},
+            'memory_report': {}
         }
         
         try:
-            # Load required files
-            clientes_df = self.load_file(files_dict['clientes'])
-            vendas_df = self.load_file(files_dict['vendas'])
+            if progress is not None:
+                progress.set_stage('aggregating')
+                if loaded_data is None:
+                    self._expect_files(files_dict, progress)
+            
+            with ThreadPoolExecutor(max_workers=self.LOAD_WORKERS) as executor:
+                # Customers and addresses load in the background while the
+                # sales aggregation, which only needs the sales file, runs here
+                if loaded_data is not None:
+                    clientes_future = self._completed(loaded_data.get('clientes'))
+                    enderecos_future = self._completed(loaded_data.get('enderecos'))
+                else:
+                    clientes_future = executor.submit(self.load_file, files_dict['clientes'], 'clientes', progress)
+                    if files_dict['enderecos']:
+                        enderecos_future = executor.submit(self.load_file, files_dict['enderecos'], 'enderecos', progress)
+                    else:
+                        enderecos_future = self._completed(None)
+                
+                vendas_df = None
+                aggregate = None
+                if loaded_data is not None:
+                    vendas_data = loaded_data.get('vendas')
+                    if isinstance(vendas_data, pd.DataFrame):
+                        vendas_df = vendas_data
+                    elif isinstance(vendas_data, (SalesAggregate, ApproximateSalesAggregate)):
+                        aggregate = vendas_data
+                    elif vendas_data is not None:
+                        aggregate = self.aggregate_chunks(vendas_data)
+                elif len(FileValidator.sales_partitions(files_dict)) > 1:
+                    aggregate = self.aggregate_partitions(FileValidator.sales_partitions(files_dict), progress)
+                else:
+                    chunk_size = self._streaming_chunk_size(files_dict['vendas'])
+                    if self._incremental(files_dict['vendas']):
+                        aggregate = self.aggregate_incremental(files_dict['vendas'], progress)
+                    elif chunk_size:
+                        aggregate = self.aggregate_file(files_dict['vendas'], chunk_size, progress)
+                    else:
+                        vendas_df = self.load_file(files_dict['vendas'], 'vendas', progress)
+                
+                if vendas_df is not None and aggregate is None:
+                    aggregate = self._new_aggregate().update(vendas_df)
+                
+                clientes_df = clientes_future.result()
+                enderecos_df = enderecos_future.result()
             
-            if clientes_df is None or vendas_df is None:
+            # Check required files
+            if clientes_df is None or aggregate is None:
                 results['error_message'] = "Error loading required files"
                 return results
             
-            # Load optional file
-            enderecos_df = None
-            if files_dict['enderecos']:
-                enderecos_df = self.load_file(files_dict['enderecos'])
-            
             # Process data
-            stats = self._calculate_statistics(clientes_df, vendas_df, enderecos_df)
-            summary = self._generate_summary(clientes_df, vendas_df, enderecos_df)
+            stats = self._calculate_statistics(clientes_df, aggregate, enderecos_df)
+            if progress is not None:
+                progress.set_stage('integrity')
+            if self.approximate:
+                summary = aggregate.to_summary(
+                    clientes_df['id'],
+                    enderecos_df['cliente_id'] if enderecos_df is not None else None
+                )
+            else:
+                summary = self._generate_summary(clientes_df, aggregate.customer_ids(), enderecos_df)
             
+            results['memory_report'] = self._memory_report({
+                'clientes': clientes_df,
+                'vendas': vendas_df,
+                'enderecos': enderecos_df
+            })
             results['success'] = True
             results['statistics'] = stats
             results['data_summary'] = summary
             
+        except AnalysisCancelled:
+            raise
         except Exception as e:
             results['error_message'] = f"Processing error: {str(e)}"
             self.logger.error(f"Data processing error: {e}")
         
         return results
     
-    def _calculate_statistics(self, clientes_df: pd.DataFrame, 
-                            vendas_df: pd.DataFrame, 
-                            enderecos_df: Optional[pd.DataFrame]) -> Dict:
-        """Calculate data statistics"""
-        stats = {}
+    def compute_partial(self, files_dict: Dict[str, Any],
+                        progress: Optional[ProgressTracker] = None) -> AnalysisPartial:
+        """
+        Compute the mergeable partial analysis of one node's input files
         
-        # Basic statistics
-        stats['total_clientes'] = len(clientes_df)
-        stats['total_vendas'] = len(vendas_df)
-        stats['total_enderecos'] = len(enderecos_df) if enderecos_df is not None else 0
+        A node may hold any share of the inputs (e.g. only some sales
+        partitions); merge_partials() on the coordinator combines the
+        partials of all nodes. Only exact mode is supported.
         
-        # Sales statistics
-        stats['receita_total'] = vendas_df['preco_final'].sum()
-        stats['ticket_medio'] = vendas_df['preco_final'].mean()
-        stats['quantidade_total_produtos'] = vendas_df['quantidade'].sum()
+        Raises:
+            ValueError: In approximate mode, or when an input file is invalid
+                or none was found
+        """
+        if self.approximate:
+            raise ValueError("Partials can only be computed in exact mode")
         
-        # Top products
-        produtos_mais_vendidos = vendas_df.groupby('produto').agg({
-            'quantidade': 'sum',
-            'preco_final': 'sum'
-        }).sort_values('quantidade', ascending=False).head(5)
+        validation_results, loaded_data = self.ingest_files(files_dict, progress)
+        present = FileValidator.input_files(files_dict)
+        for file_type, (is_valid, message) in validation_results.items():
+            if present.get(file_type) and not is_valid:
+                raise ValueError(f"File validation error {file_type}: {message}")
+        if not loaded_data:
+            raise ValueError("No input files found")
         
-        stats['top_produtos'] = produtos_mais_vendidos.to_dict('index')
+        if progress is not None:
+            progress.set_stage('aggregating')
+        vendas_data = loaded_data.get('vendas')
+        if isinstance(vendas_data, pd.DataFrame):
+            aggregate = self._new_aggregate().update(vendas_data)
+        elif isinstance(vendas_data, SalesAggregate):
+            aggregate = vendas_data
+        elif vendas_data is not None:
+            aggregate = self.aggregate_chunks(vendas_data)
+        else:
+            aggregate = self._new_aggregate()
         
-        # Top customers
-        clientes_vendas = vendas_df.groupby('cliente_id').agg({
-            'preco_final': 'sum',
-            'quantidade': 'sum'
-        }).sort_values('preco_final', ascending=False).head(5)
+        return AnalysisPartial.from_data(self.plan, aggregate, loaded_data.get('clientes'), loaded_data.get('enderecos'))
+    
+    def merge_partials(self, partials: List[AnalysisPartial]) -> Dict[str, Any]:
+        """
+        Merge the partials of all nodes into the final statistics
         
-        stats['top_clientes'] = clientes_vendas.to_dict('index')
+        Returns:
+            Dict with processing results, like process_data
+        """
+        results = {
+            'success': False,
+            'error_message': '',
+            'statistics': {},
+            'data_summary': {},
+            'memory_report': {}
+        }
+        try:
+            merged = merge_partials(partials)
+            if merged.clientes_rows == 0:
+                results['error_message'] = "No partial includes the customers file"
+                return results
+            return merged.to_results(self.top_k, self.orphan_sample_size)
+        except Exception as e:
+            results['error_message'] = f"Processing error: {str(e)}"
+            self.logger.error(f"Error merging partials: {e}")
+        return results
+    
+    def _memory_report(self, frames: Dict[str, Optional[pd.DataFrame]]) -> Dict[str, Dict[str, int]]:
+        """
+        Report the memory used by each loaded frame and the estimated saving
+        of the typed loader over pandas' default dtypes
+        
+        Columns skipped by projection are not counted, so savings are a lower bound.
+        """
+        report = {}
+        for file_type, df in frames.items():
+            if df is None:
+                continue
+            memory_bytes = int(df.memory_usage(deep=True).sum())
+            default_bytes = estimate_default_memory(df)
+            schema = self.schemas[file_type]
+            report[file_type] = {
+                'rows': len(df),
+                'columns_read': len(df.columns),
+                'columns_skipped': len(schema['columns']) - len(schema['usecols']),
+                'memory_bytes': memory_bytes,
+                'default_memory_bytes': default_bytes,
+                'saved_bytes': max(default_bytes - memory_bytes, 0)
+            }
+            self.logger.info(
+                f"{file_type}: {len(df):,} rows in {memory_bytes / 1024:,.0f} KB "
+                f"(saved ~{report[file_type]['saved_bytes'] / 1024:,.0f} KB with typed columns)"
+            )
+        return report
+    
+    @staticmethod
+    def _expect_files(files_dict: Dict[str, Any], progress: ProgressTracker):
+        """Add the sizes of the existing input files to the bytes progress expects"""
+        file_paths = set(FileValidator.input_files(files_dict).values())
+        file_paths.update(FileValidator.sales_partitions(files_dict))
+        for file_path in file_paths:
+            if file_path and os.path.exists(file_path):
+                progress.expect_bytes(os.path.getsize(file_path))
+    
+    @staticmethod
+    def _completed(value: Any) -> Future:
+        """Wrap an already available value in a finished Future"""
+        future = Future()
+        future.set_result(value)
+        return future
+    
+    def _streaming_chunk_size(self, file_path: Optional[str]) -> Optional[int]:
+        """Return the chunk size to stream the sales file with, or None to load it whole"""
+        if not file_path or not os.path.exists(file_path):
+            return None
+        if file_path.endswith('.csv'):
+            threshold = self.STREAMING_THRESHOLD_BYTES
+        elif file_path.endswith('.xlsx'):
+            threshold = self.XLSX_STREAMING_THRESHOLD_BYTES
+        else:
+            return None
+        if self.chunk_size:
+            return self.chunk_size
+        # Sketches have fixed memory, so approximate mode always streams
+        if self.approximate or os.path.getsize(file_path) > threshold:
+            return self.DEFAULT_CHUNK_SIZE
+        return None
+    
+    def aggregate_file(self, file_path: str, chunk_size: int,
+                       progress: Optional[ProgressTracker] = None) -> Optional[SalesAggregate]:
+        """
+        Aggregate a sales CSV/XLSX file chunk by chunk without loading it whole
         
-        return stats
+        Returns:
+            SalesAggregate with the folded chunks, or None on error
+        """
+        try:
+            return self.aggregate_chunks(self._read_chunks(file_path, chunk_size, self.schemas['vendas'], progress))
+        except AnalysisCancelled:
+            raise
+        except Exception as e:
+            self.logger.error(f"Error aggregating file {file_path}: {e}")
+            return None
+    
+    def aggregate_partitions(self, paths: List[str],
+                             progress: Optional[ProgressTracker] = None):
+        """
+        Map-reduce the sales partitions into one aggregate
+        
+        Each partition is aggregated by a worker process into a picklable
+        partial aggregate (resuming from its checkpoint when checkpoints are
+        enabled); the partials are merged here in partition order, so the
+        result does not depend on which worker finished first. Small inputs
+        are aggregated in-process.
+        
+        Returns:
+            Aggregate of all partitions
+        """
+        sizes = [os.path.getsize(path) for path in paths]
+        workers = min(self.partition_workers, len(paths))
+        if workers <= 1 or sum(sizes) < self.PARALLEL_PARTITIONS_MIN_BYTES:
+            aggregate = self._new_aggregate()
+            for path in paths:
+                aggregate.merge(self.aggregate_partition(path, progress))
+            return aggregate
+        
+        self.logger.info(f"Aggregating {len(paths)} sales partitions on {workers} processes")
+        partials = [None] * len(paths)
+        # Worker processes are spawned, not forked: the analysis runs on a
+        # thread of a multi-threaded process
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        try:
+            futures = {
+                executor.submit(_aggregate_partition, self._partition_settings(), path): index
+                for index, path in enumerate(paths)
+            }
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, timeout=self.PARTITION_POLL_SECONDS, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = futures[future]
+                    partials[index] = future.result()
+                    if progress is not None:
+                        progress.advance(rows=int(partials[index].totals()['total_vendas']), bytes_read=sizes[index])
+                if progress is not None:
+                    progress.check()
+        finally:
+            # On error or cancellation, partitions not started yet are dropped
+            executor.shutdown(wait=False, cancel_futures=True)
+        
+        aggregate = partials[0]
+        for partial in partials[1:]:
+            aggregate.merge(partial)
+        return aggregate
+    
+    def aggregate_partition(self, file_path: str,
+                            progress: Optional[ProgressTracker] = None):
+        """Aggregate one sales partition, incrementally when checkpoints are enabled"""
+        if self._incremental(file_path):
+            return self.aggregate_incremental(file_path, progress)
+        return self.aggregate_chunks(self._read_chunks(file_path, self._incremental_chunk_size(),
+                                                       self.schemas['vendas'], progress))
+    
+    def _partition_settings(self) -> Dict[str, Any]:
+        """Settings a partition worker rebuilds an equivalent DataProcessor from"""
+        return {
+            'chunk_size': self.chunk_size,
+            'metrics': sorted(self.plan.metrics),
+            'approximate': self.approximate,
+            'checkpoints': (self.checkpoints.directory, self.checkpoints.max_size_bytes)
+            if self.checkpoints is not None else None
+        }
+    
+    def _incremental(self, file_path: Optional[str]) -> bool:
+        """Whether the sales file is aggregated incrementally from a checkpoint"""
+        return bool(self.checkpoints is not None and file_path and file_path.endswith('.csv'))
+    
+    def aggregate_incremental(self, file_path: str,
+                              progress: Optional[ProgressTracker] = None) -> SalesAggregate:
+        """
+        Aggregate an append-only sales CSV, parsing only what was appended
+        
+        The checkpoint of the previous run holds the aggregate of the first
+        N bytes and their hash. If those bytes are unchanged, only the rows
+        after them are parsed and merged in; otherwise (the file was
+        rewritten) the whole file is recomputed. The new checkpoint stops at
+        the last complete line, so a row still being written is counted in
+        this run but parsed again by the next one.
+        
+        Returns:
+            SalesAggregate of the whole file
+        """
+        end = last_line_end(file_path)
+        if end == 0:
+            return self.aggregate_chunks(self._read_chunks(file_path, self._incremental_chunk_size(),
+                                                           self.schemas['vendas'], progress))
+        
+        header = self._read_header(file_path)
+        key = self.checkpoints.key_for(file_path, self._aggregate_variant())
+        checkpoint = self.checkpoints.get(key)
+        
+        aggregate = None
+        if checkpoint is not None and checkpoint['header'] == header and checkpoint['offset'] <= end:
+            hasher = hash_prefix(file_path, checkpoint['offset'])
+            if hasher.hexdigest() == checkpoint['prefix_hash']:
+                aggregate = checkpoint['aggregate']
+                start = checkpoint['offset']
+                rows = checkpoint['rows']
+                self.logger.info(f"Resuming {file_path} from checkpoint at byte {start:,} ({rows:,} rows)")
+            else:
+                self.logger.info(f"{file_path} was rewritten since its checkpoint; recomputing")
+        if aggregate is None:
+            aggregate = self._new_aggregate()
+            start = 0
+            rows = 0
+            hasher = hashlib.blake2b(digest_size=16)
+        if progress is not None:
+            progress.advance(bytes_read=start)
+        
+        if end > start:
+            rows += self._aggregate_range(file_path, start, end, aggregate, hasher, progress)
+            self.checkpoints.put(key, {
+                'offset': end,
+                'prefix_hash': hasher.hexdigest(),
+                'header': header,
+                'rows': rows,
+                'aggregate': aggregate
+            })
+        
+        # A last line without its newline is merged in but left out of the checkpoint
+        size = os.path.getsize(file_path)
+        if size > end:
+            tail = self._new_aggregate()
+            self._aggregate_range(file_path, end, size, tail, None, progress, header)
+            aggregate.merge(tail)
+        return aggregate
+    
+    def _aggregate_range(self, file_path: str, start: int, end: int, aggregate,
+                         hasher=None, progress: Optional[ProgressTracker] = None,
+                         names: Optional[List[str]] = None) -> int:
+        """
+        Fold the sales rows stored in bytes [start, end) of a CSV into aggregate
+        
+        A range starting at 0 includes the header line; later ranges are
+        parsed with the header names (given or read from the file).
+        
+        Returns:
+            Number of rows folded
+        """
+        schema = self.schemas['vendas']
+        options = self._csv_schema_options(schema)
+        if start > 0:
+            options.update(names=names or self._read_header(file_path), header=None)
+        
+        handle = open(file_path, 'rb')
+        handle.seek(start)
+        reader = ByteRangeReader(handle, end, hasher)
+        try:
+            chunks = pd.read_csv(reader, chunksize=self._incremental_chunk_size(), **options)
+        except Exception:
+            reader.close()
+            raise
+        
+        rows = 0
+        for chunk in self._track_chunks(chunks, progress, handle=reader, start=start):
+            aggregate.update(apply_schema(chunk, schema))
+            rows += len(chunk)
+        return rows
+    
+    def _incremental_chunk_size(self) -> int:
+        return self.chunk_size or self.DEFAULT_CHUNK_SIZE
+    
+    def _aggregate_variant(self) -> str:
+        """Identifies the aggregation settings a checkpoint was built with"""
+        return json.dumps({
+            'schema': self.schemas['vendas'],
+            'metrics': sorted(self.plan.metrics),
+            'approximate': self.approximate
+        }, sort_keys=True)
+    
+    def aggregate_chunks(self, chunks: Iterable[pd.DataFrame]) -> SalesAggregate:
+        """Fold an iterator of sales chunks into a SalesAggregate"""
+        aggregate = self._new_aggregate()
+        for chunk in chunks:
+            aggregate.update(chunk)
+        return aggregate
+    
+    def _new_aggregate(self):
+        """Create an empty exact or approximate aggregate, depending on the mode"""
+        if self.approximate:
+            return ApproximateSalesAggregate(self.plan)
+        return self.plan.new_aggregate()
+    
+    def _calculate_statistics(self, clientes_df: pd.DataFrame, 
+                            aggregate: SalesAggregate, 
+                            enderecos_df: Optional[pd.DataFrame]) -> Dict:
+        """Calculate data statistics"""
+        # In-memory frames are aggregated as a single chunk, so loaded and
+        # streamed sales share the exact same code path
+        return aggregate.to_statistics(
+            len(clientes_df),
+            len(enderecos_df) if enderecos_df is not None else 0,
+            self.top_k
+        )
     
     def _generate_summary(self, clientes_df: pd.DataFrame,
-                         vendas_df: pd.DataFrame,
+                         vendas_cliente_ids,
                          enderecos_df: Optional[pd.DataFrame]) -> Dict:
         """Generate data summary"""
-        summary = {}
-        
-        # Integrity validation
-        clientes_ids = set(clientes_df['id'])
-        vendas_cliente_ids = set(vendas_df['cliente_id'])
-        
-        # Customers without sales
-        clientes_sem_vendas = clientes_ids - vendas_cliente_ids
-        summary['clientes_sem_vendas'] = len(clientes_sem_vendas)
-        
-        # Sales with non-existent customer
-        vendas_cliente_inexistente = vendas_cliente_ids - clientes_ids
-        summary['vendas_cliente_inexistente'] = len(vendas_cliente_inexistente)
-        
-        # If addresses file exists, check coverage
-        if enderecos_df is not None:
-            enderecos_cliente_ids = set(enderecos_df['cliente_id'])
-            clientes_sem_endereco = clientes_ids - enderecos_cliente_ids
-            summary['clientes_sem_endereco'] = len(clientes_sem_endereco)
-            summary['cobertura_enderecos'] = (len(enderecos_cliente_ids) / len(clientes_ids)) * 100
-        else:
-            summary['clientes_sem_endereco'] = len(clientes_ids)
-            summary['cobertura_enderecos'] = 0
-        
-        return summary
+        return check_referential_integrity(
+            clientes_df['id'],
+            vendas_cliente_ids,
+            enderecos_df['cliente_id'] if enderecos_df is not None else None,
+            sample_size=self.orphan_sample_size
+        )
     
     def generate_report_text(self, processing_results: Dict, 
                            protocolo: str, setor: str,
-                           pasta_origem: str, arquivo_resultado: str) -> str:
-        """Generate report text for resultado.txt"""
-        from datetime import datetime
-        
+                           pasta_origem: str, arquivo_resultado: str,
+                           generated_at: Optional[str] = None) -> str:
+        """Generate report text for resultado.txt (dated generated_at, now by default)"""
         report_lines = []
         report_lines.append("="*60)
         report_lines.append("SPREADSHEET ANALYSIS REPORT")
@@ -260,7 +1023,7 @@ class DataProcessor:
         report_lines.append("EXECUTION INFORMATION:")
         report_lines.append(f"Protocol: {protocolo}")
         report_lines.append(f"Department: {setor}")
-        report_lines.append(f"Execution date: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}")
+        report_lines.append(f"Execution date: {generated_at or self.report_timestamp()}")
         report_lines.append(f"Source folder: {pasta_origem}")
         report_lines.append(f"Result file: {arquivo_resultado}")
         report_lines.append("")
@@ -272,9 +1035,18 @@ class DataProcessor:
         
         # General statistics
         stats = processing_results['statistics']
+        aproximado = stats.get('aproximado', {})
+        if aproximado:
+            report_lines.append("APPROXIMATE MODE: figures marked with ~ are estimates. Distinct counts show")
+            report_lines.append("their standard error (the true value is almost always within three standard")
+            report_lines.append("errors); top-list figures show the most they may exceed the true value.")
+            report_lines.append("")
         report_lines.append("GENERAL STATISTICS:")
         report_lines.append(f"Total customers: {stats['total_clientes']:,}")
         report_lines.append(f"Total sales: {stats['total_vendas']:,}")
+        if 'clientes_distintos_vendas' in stats:
+            erro = aproximado['clientes_distintos_vendas']['erro_relativo'] * stats['clientes_distintos_vendas']
+            report_lines.append(f"Distinct customers with sales: ~{stats['clientes_distintos_vendas']:,} (std. error {erro:,.0f})")
         report_lines.append(f"Total addresses: {stats['total_enderecos']:,}")
         report_lines.append(f"Total revenue: R$ {stats['receita_total']:,.2f}")
         report_lines.append(f"Average ticket: R$ {stats['ticket_medio']:,.2f}")
@@ -282,145 +1054,192 @@ class DataProcessor:
         report_lines.append("")
         
         # Top products
-        report_lines.append("TOP 5 BEST-SELLING PRODUCTS:")
+        top_count = stats.get('top_k', 5)
+        marca = "~" if aproximado else ""
+        report_lines.append(f"TOP {top_count} BEST-SELLING PRODUCTS:")
         for produto, dados in stats['top_produtos'].items():
-            report_lines.append(f"- {produto}: {dados['quantidade']:,} units, R$ {dados['preco_final']:,.2f}")
+            erro = f" (at most {dados['erro']:,.0f} units over)" if 'erro' in dados else ""
+            report_lines.append(f"- {produto}: {marca}{dados['quantidade']:,} units{erro}, R$ {dados['preco_final']:,.2f}")
         report_lines.append("")
         
         # Top customers
-        report_lines.append("TOP 5 CUSTOMERS (by revenue):")
+        report_lines.append(f"TOP {top_count} CUSTOMERS (by revenue):")
         for cliente_id, dados in stats['top_clientes'].items():
-            report_lines.append(f"- Customer {cliente_id}: R$ {dados['preco_final']:,.2f} ({dados['quantidade']:,} items)")
+            erro = f" (at most R$ {dados['erro']:,.2f} over)" if 'erro' in dados else ""
+            report_lines.append(f"- Customer {cliente_id}: {marca}R$ {dados['preco_final']:,.2f}{erro} ({dados['quantidade']:,} items)")
         report_lines.append("")
         
         # Integrity summary
         summary = processing_results['data_summary']
         report_lines.append("DATA INTEGRITY ANALYSIS:")
-        report_lines.append(f"Customers without sales: {summary['clientes_sem_vendas']}")
-        report_lines.append(f"Sales with non-existent customer: {summary['vendas_cliente_inexistente']}")
+        estimados = summary.get('aproximado', {})
+        for key, label in [('clientes_sem_vendas', "Customers without sales"),
+                           ('vendas_cliente_inexistente', "Sales with non-existent customer")]:
+            if key in estimados:
+                report_lines.append(f"{label}: ~{summary[key]} (std. error {estimados[key]['erro_absoluto']})")
+            else:
+                report_lines.append(f"{label}: {summary[key]}")
         report_lines.append(f"Customers without address: {summary['clientes_sem_endereco']}")
         report_lines.append(f"Address coverage: {summary['cobertura_enderecos']:.1f}%")
         report_lines.append("")
         
+        # Samples of orphaned ids, when requested
+        amostras = summary.get('amostras_orfaos')
+        if amostras:
+            labels = {
+                'clientes_sem_vendas': "Customers without sales",
+                'vendas_cliente_inexistente': "Non-existent customers in sales",
+                'clientes_sem_endereco': "Customers without address"
+            }
+            report_lines.append("ORPHANED ID SAMPLES:")
+            for check, ids in amostras.items():
+                if ids:
+                    report_lines.append(f"{labels[check]}: {', '.join(str(i) for i in ids)}")
+            report_lines.append("")
+        
         report_lines.append("="*60)
         report_lines.append("Report generated by Sheetwise v1.0")
         report_lines.append("="*60)
         
         return "\n".join(report_lines)
     
-    def generate_report_html(self, text_content: str, protocolo: str, setor: str) -> str:
-        """Generate HTML report by reading template file and replacing placeholders"""
+    # Used when the template file is missing or unreadable
+    FALLBACK_HTML_TEMPLATE = CompiledTemplate.from_text("""<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <title>Analysis Report - {{PROTOCOL}}</title>
+    <style>
+        body { font-family: monospace; padding: 20px; background: #f5f5f5; }
+        .container { max-width: 1200px; margin: 0 auto; background: white; padding: 30px; }
+        pre { background: #2c3e50; color: #ecf0f1; padding: 20px; overflow-x: auto; }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <h1>📊 Analysis Report</h1>
+        <p><strong>Protocol:</strong> {{PROTOCOL}}</p>
+        <p><strong>Department:</strong> {{DEPARTMENT}}</p>
+        <p><strong>Date:</strong> {{GENERATED_DATE}}</p>
+        <pre>{{REPORT_CONTENT}}</pre>
+    </div>
+</body>
+</html>""")
+    
+    def generate_report_html(self, text_content: str, protocolo: str, setor: str,
+                             generated_at: Optional[str] = None) -> str:
+        """Generate HTML report from the template file (see write_report_html)"""
+        return self._report_template().render(self._report_html_values(text_content, protocolo, setor, generated_at))
+    
+    def write_report_html(self, f, text_content: str, protocolo: str, setor: str,
+                          generated_at: Optional[str] = None):
+        """Write the HTML report to a text file handle in one pass, without building it in memory
+        
+        Args:
+            f: Text file handle opened for writing
+            text_content: Text report, shown in the report body
+            protocolo: Protocol of the analysis
+            setor: Department of the analysis
+            generated_at: Generation date shown (default: now)
+        """
+        self._report_template().write(f, self._report_html_values(text_content, protocolo, setor, generated_at))
+    
+    def _report_html_values(self, text_content: str, protocolo: str, setor: str,
+                            generated_at: Optional[str] = None) -> Dict[str, str]:
+        """Values of the report template placeholders"""
+        return {
+            'PROTOCOL': protocolo,
+            'DEPARTMENT': setor,
+            'GENERATED_DATE': self.report_timestamp() if generated_at is None else generated_at,
+            'REPORT_CONTENT': text_content
+        }
+    
+    @staticmethod
+    def report_timestamp() -> str:
+        """Generation date shown in the reports: now"""
         from datetime import datetime
         
+        return datetime.now().strftime('%d/%m/%Y %H:%M:%S')
+    
+    def _report_template(self) -> CompiledTemplate:
+        """The compiled report template, or the inline fallback if the file cannot be read"""
         # Get template file path
         current_dir = os.path.dirname(os.path.abspath(__file__))
         template_path = os.path.join(current_dir, '..', 'static', 'templates', 'template_result.html')
         
         try:
-            # Read HTML template
-            with open(template_path, 'r', encoding='utf-8') as f:
-                html_template = f.read()
-            
-            # Replace placeholders with actual values
-            html_content = html_template.replace('{{PROTOCOL}}', protocolo)
-            html_content = html_content.replace('{{DEPARTMENT}}', setor)
-            html_content = html_content.replace('{{GENERATED_DATE}}', datetime.now().strftime('%d/%m/%Y %H:%M:%S'))
-            html_content = html_content.replace('{{REPORT_CONTENT}}', text_content)
-            
-            return html_content
-            
+            return load_template(template_path)
         except FileNotFoundError:
             self.logger.error(f"HTML template not found at: {template_path}")
-            # Fallback to inline template
-            return self._generate_fallback_html(text_content, protocolo, setor)
         except Exception as e:
             self.logger.error(f"Error reading HTML template: {e}")
-            return self._generate_fallback_html(text_content, protocolo, setor)
+        return self.FALLBACK_HTML_TEMPLATE
     
-    def _generate_fallback_html(self, text_content: str, protocolo: str, setor: str) -> str:
-        """Fallback HTML generation if template file is not available"""
-        from datetime import datetime
-        
-        return f"""<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <title>Analysis Report - {protocolo}</title>
-    <style>
-        body {{ font-family: monospace; padding: 20px; background: #f5f5f5; }}
-        .container {{ max-width: 1200px; margin: 0 auto; background: white; padding: 30px; }}
-        pre {{ background: #2c3e50; color: #ecf0f1; padding: 20px; overflow-x: auto; }}
-    </style>
-</head>
-<body>
-    <div class="container">
-        <h1>📊 Analysis Report</h1>
-        <p><strong>Protocol:</strong> {protocolo}</p>
-        <p><strong>Department:</strong> {setor}</p>
-        <p><strong>Date:</strong> {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}</p>
-        <pre>{text_content}</pre>
-    </div>
-</body>
-</html>"""
+    def pdf_needs_html(self) -> bool:
+        """Whether the configured PDF backend renders from the HTML report"""
+        return get_pdf_renderer(self.pdf_backend).needs_html
     
-    def generate_report_pdf(self, html_path: str, pdf_path: str) -> bool:
-        """Generate PDF report from HTML file using pdfkit
+    def generate_report_pdf(self, html_path: str, pdf_path: str,
+                            progress: Optional[ProgressTracker] = None,
+                            text_content: Optional[str] = None,
+                            title: Optional[str] = None,
+                            cache_key: Optional[str] = None) -> bool:
+        """Generate PDF report with the configured backend
         
         Args:
             html_path: Path to the HTML file
             pdf_path: Path where PDF will be saved
+            progress: Optional tracker; cancelling it while the report is
+                queued or rendering raises AnalysisCancelled
+            text_content: Text report, needed by the native backend
+            title: PDF document title
+            cache_key: SHA-256 of the final HTML report, keying its PDF in
+                the PDF cache; ignored by backends that do not render HTML
             
         Returns:
             bool: True if successful, False otherwise
         """
         try:
-            import pdfkit
-            import sys
-            
-            # Configure wkhtmltopdf path
-            config = None
-            if getattr(sys, 'frozen', False):
-                # Running as compiled executable
-                base_path = sys._MEIPASS
-                
-                if sys.platform.startswith('win'):
-                    # Windows executable - need to add bin directory to PATH for DLL access
-                    wkhtmltopdf_bin_dir = os.path.join(base_path, 'wkhtmltopdf', 'bin')
-                    wkhtmltopdf_path = os.path.join(wkhtmltopdf_bin_dir, 'wkhtmltopdf.exe')
-                    
-                    # Add wkhtmltopdf bin directory to PATH so DLLs can be found
-                    if os.path.exists(wkhtmltopdf_bin_dir):
-                        os.environ['PATH'] = wkhtmltopdf_bin_dir + os.pathsep + os.environ.get('PATH', '')
-                        self.logger.info(f"Added to PATH: {wkhtmltopdf_bin_dir}")
-                else:
-                    # Linux executable
-                    wkhtmltopdf_path = os.path.join(base_path, 'wkhtmltopdf', 'bin', 'wkhtmltopdf')
-                
-                if os.path.exists(wkhtmltopdf_path):
-                    config = pdfkit.configuration(wkhtmltopdf=wkhtmltopdf_path)
-                    self.logger.info(f"Using bundled wkhtmltopdf: {wkhtmltopdf_path}")
-                else:
-                    self.logger.warning(f"Bundled wkhtmltopdf not found at: {wkhtmltopdf_path}")
+            renderer = get_pdf_renderer(self.pdf_backend)
+            use_cache = self.pdf_cache is not None and cache_key is not None and renderer.needs_html
+            if use_cache and self.pdf_cache.fetch(self.pdf_cache.key_for(cache_key, renderer.cache_variant()), pdf_path):
+                if progress is not None:
+                    progress.set_stage('pdf')
+                self.logger.info(f"PDF reused from cache: {pdf_path}")
+                return True
             
-            # PDF generation options
-            options = {
-                'page-size': 'A4',
-                'margin-top': '0.75in',
-                'margin-right': '0.75in',
-                'margin-bottom': '0.75in',
-                'margin-left': '0.75in',
-                'encoding': "UTF-8",
-                'enable-local-file-access': None,
-                'quiet': ''
-            }
-            
-            # Generate PDF
-            pdfkit.from_file(html_path, pdf_path, options=options, configuration=config)
+            try:
+                renderer.render(html_path, pdf_path, progress, text_content, title)
+            except AnalysisCancelled:
+                raise
+            except Exception as e:
+                if self.pdf_backend != 'auto' or renderer.name == 'native' or text_content is None:
+                    raise
+                self.logger.warning(f"{renderer.name} failed ({e}), using the native PDF backend")
+                renderer = get_pdf_renderer('native')
+                renderer.render(html_path, pdf_path, progress, text_content, title)
+            if use_cache:
+                self.pdf_cache.store(self.pdf_cache.key_for(cache_key, renderer.cache_variant()), pdf_path)
             self.logger.info(f"PDF generated successfully: {pdf_path}")
             return True
             
+        except AnalysisCancelled:
+            raise
         except Exception as e:
             self.logger.error(f"Error generating PDF: {e}")
             import traceback
             self.logger.error(f"Traceback: {traceback.format_exc()}")
-            return False
\ No newline at end of file
+            return False
+
+
+def _aggregate_partition(settings: Dict[str, Any], file_path: str):
+    """Process pool worker: aggregate one sales partition"""
+    checkpoints = settings['checkpoints']
+    processor = DataProcessor(
+        chunk_size=settings['chunk_size'],
+        metrics=settings['metrics'],
+        approximate=settings['approximate'],
+        checkpoints=AggregateCheckpointStore(*checkpoints) if checkpoints else None,
+        partition_workers=1
+    )
+    return processor.aggregate_partition(file_path)
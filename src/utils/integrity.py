@@ -0,0 +1,93 @@
+"""
+Vectorized referential-integrity checks between customer id columns
+"""
+
+from typing import Any, Dict
+import numpy as np
+import pandas as pd
+
+
+def unique_ids(ids) -> np.ndarray:
+    """
+    Distinct non-null ids as a NumPy array
+
+    Numeric ids come back sorted (np.unique), so membership tests can use a
+    sorted merge; other ids are deduplicated through pandas' hash table.
+    """
+    values = pd.Series(ids).dropna()
+    if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+        return np.unique(values.to_numpy())
+    return pd.unique(values.to_numpy(dtype=object))
+
+
+def has_null(ids) -> bool:
+    """Whether an id column holds a null id"""
+    return bool(pd.Series(ids).isna().any())
+
+
+def _contains(ids: np.ndarray, reference: np.ndarray) -> np.ndarray:
+    """Boolean mask of the ids present in reference"""
+    if ids.dtype != object and reference.dtype != object:
+        return np.isin(ids, reference, assume_unique=True)
+    return pd.Index(ids, dtype=object).isin(reference)
+
+
+def check_referential_integrity(clientes_ids, vendas_cliente_ids,
+                                enderecos_cliente_ids=None,
+                                sample_size: int = 0) -> Dict[str, Any]:
+    """
+    Count customers without sales, sales of unknown customers and address coverage
+
+    Works on id arrays instead of Python sets, so memory is proportional to
+    the arrays. As in a set of ids, the null ids of a column count as one
+    more id, which matches no customer: a sale without customer id counts as
+    a sale of a non-existent customer.
+
+    Args:
+        clientes_ids: The id column of the customers file
+        vendas_cliente_ids: Customer ids referenced by the sales
+        enderecos_cliente_ids: Customer ids referenced by the addresses, if any
+        sample_size: When positive, also return up to this many orphaned ids
+            per check under 'amostras_orfaos'
+
+    Returns:
+        Dict with the data summary counts
+    """
+    clientes = unique_ids(clientes_ids)
+    clientes_nulo = int(has_null(clientes_ids))
+    vendas = unique_ids(vendas_cliente_ids)
+    vendas_nulo = int(has_null(vendas_cliente_ids))
+
+    summary = {}
+    orphans = {}
+
+    # Customers without sales
+    clientes_com_vendas = _contains(clientes, vendas)
+    summary['clientes_sem_vendas'] = int(len(clientes) - clientes_com_vendas.sum()) + clientes_nulo
+    orphans['clientes_sem_vendas'] = clientes, ~clientes_com_vendas, clientes_nulo
+
+    # Sales with non-existent customer
+    vendas_cliente_existe = _contains(vendas, clientes)
+    summary['vendas_cliente_inexistente'] = int(len(vendas) - vendas_cliente_existe.sum()) + vendas_nulo
+    orphans['vendas_cliente_inexistente'] = vendas, ~vendas_cliente_existe, vendas_nulo
+
+    # If addresses file exists, check coverage
+    if enderecos_cliente_ids is not None:
+        enderecos = unique_ids(enderecos_cliente_ids)
+        enderecos_nulo = int(has_null(enderecos_cliente_ids))
+        clientes_com_endereco = _contains(clientes, enderecos)
+        summary['clientes_sem_endereco'] = int(len(clientes) - clientes_com_endereco.sum()) + clientes_nulo
+        summary['cobertura_enderecos'] = ((len(enderecos) + enderecos_nulo) / (len(clientes) + clientes_nulo)) * 100
+        orphans['clientes_sem_endereco'] = clientes, ~clientes_com_endereco, clientes_nulo
+    else:
+        summary['clientes_sem_endereco'] = len(clientes) + clientes_nulo
+        summary['cobertura_enderecos'] = 0
+
+    if sample_size > 0:
+        # A null id is listed as None, after the other orphans
+        summary['amostras_orfaos'] = {
+            check: (ids[mask].tolist() + [None] * nulo)[:sample_size]
+            for check, (ids, mask, nulo) in orphans.items()
+        }
+
+    return summary
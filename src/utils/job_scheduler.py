@@ -0,0 +1,248 @@
+"""
+Persistent analysis job queue backed by the executions table
+"""
+
+import os
+import uuid
+import socket
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from .analysis_pipeline import AnalysisPipeline
+from .progress import ProgressTracker
+
+
+class JobScheduler:
+    """Runs queued executions on a bounded pool of worker threads
+
+    Submitting an analysis inserts a ``queued`` executions row; each worker
+    claims the oldest queued row of the current user (``running``, tagged
+    with this scheduler's owner id), runs the pipeline and records the
+    outcome as ``completed``, ``failed`` or ``cancelled`` together with its
+    start and finish times. While jobs run, the scheduler refreshes their
+    heartbeat. Running rows whose scheduler stopped sending heartbeats (its
+    session died) are requeued at start() and then periodically, while jobs
+    of another live instance are left alone.
+    """
+
+    DEFAULT_WORKERS = 2
+    # Idle workers recheck the queue this often, besides being woken by submit()
+    IDLE_POLL_SECONDS = 1.0
+    # Running jobs are marked alive, and rows silent for STALE_SECONDS
+    # (they belong to a dead session) requeued, this often
+    HEARTBEAT_SECONDS = 15.0
+    STALE_SECONDS = 60.0
+
+    def __init__(self, pipeline: AnalysisPipeline, execution_model,
+                 max_workers: int = DEFAULT_WORKERS,
+                 on_job_finished: Optional[Callable[[int, Dict[str, Any]], None]] = None,
+                 user_id: Optional[int] = None):
+        """
+        Args:
+            pipeline: Pipeline each job runs
+            execution_model: Execution model owning the executions table
+            max_workers: Maximum number of jobs running at the same time
+            on_job_finished: Called from the worker thread with
+                (execution_id, result) after each job is recorded
+            user_id: User whose queue is run (see set_user); no job is
+                claimed while it is None
+        """
+        self.pipeline = pipeline
+        self.execution_model = execution_model
+        self.max_workers = max(1, max_workers)
+        self.on_job_finished = on_job_finished
+        self.user_id = user_id
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.logger = logging.getLogger(__name__)
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition()
+        self._stopping = threading.Event()
+        self._running: Dict[int, ProgressTracker] = {}
+        self._workers: List[threading.Thread] = []
+        self._heartbeat: Optional[threading.Thread] = None
+        self._heartbeat_stop = threading.Event()
+
+    def start(self):
+        """
+        Requeue jobs interrupted by a dead session and start the workers
+
+        Raises:
+            RuntimeError: If workers of a previous shutdown(wait=False) are still running
+        """
+        self._workers = [worker for worker in self._workers if worker.is_alive()]
+        if self._workers:
+            if self._stopping.is_set():
+                raise RuntimeError("Workers of the previous run are still stopping")
+            return
+        self._requeue_stale()
+        self._stopping.clear()
+        for index in range(self.max_workers):
+            worker = threading.Thread(target=self._work, name=f"sheetwise-job-{index + 1}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        # A heartbeat left by shutdown(wait=False) stops; this one takes over
+        self._heartbeat_stop.set()
+        self._heartbeat_stop = threading.Event()
+        self._heartbeat = threading.Thread(target=self._send_heartbeats, args=(self._heartbeat_stop,),
+                                           name="sheetwise-job-heartbeat", daemon=True)
+        self._heartbeat.start()
+
+    def shutdown(self, cancel_running: bool = False, wait: bool = True):
+        """
+        Stop claiming new jobs
+
+        Queued jobs stay queued for the next start(). Running jobs finish
+        unless cancel_running is set.
+
+        Args:
+            cancel_running: Cancel the running jobs
+            wait: Wait for the workers to exit (after their current job)
+        """
+        self._stopping.set()
+        if cancel_running:
+            with self._lock:
+                for progress in self._running.values():
+                    progress.cancel()
+        with self._wakeup:
+            self._wakeup.notify_all()
+        if wait:
+            for worker in self._workers:
+                worker.join()
+            self._workers = []
+            self._heartbeat_stop.set()
+            if self._heartbeat is not None:
+                self._heartbeat.join()
+                self._heartbeat = None
+
+    def set_user(self, user_id: Optional[int]):
+        """Run the queue of another user (None: claim nothing); running jobs finish"""
+        self.user_id = user_id
+        with self._wakeup:
+            self._wakeup.notify_all()
+
+    def submit(self, analysis_data: Dict[str, Any], user_id: int) -> int:
+        """
+        Queue an analysis
+
+        Returns:
+            Id of the queued execution
+        """
+        execution_id = self.execution_model.enqueue_execution(
+            user_id=user_id,
+            protocol=analysis_data['protocolo'],
+            department=analysis_data['setor'],
+            source_folder_path=analysis_data['pasta_origem'],
+            result_file_path=analysis_data['arquivo_resultado']
+        )
+        self.logger.info(f"Queued execution {execution_id} for protocol: {analysis_data['protocolo']}")
+        with self._wakeup:
+            self._wakeup.notify()
+        return execution_id
+
+    def cancel(self, execution_id: int) -> bool:
+        """
+        Cancel a queued or running job
+
+        Returns:
+            True if the job was queued or running
+        """
+        if self.execution_model.cancel_queued_execution(execution_id):
+            self.logger.info(f"Cancelled queued execution {execution_id}")
+            return True
+        with self._lock:
+            progress = self._running.get(execution_id)
+        if progress is None:
+            return False
+        progress.cancel()
+        return True
+
+    def progress(self) -> Dict[int, Dict[str, Any]]:
+        """Progress snapshots of the running jobs, by execution id"""
+        with self._lock:
+            running = dict(self._running)
+        return {execution_id: progress.snapshot() for execution_id, progress in running.items()}
+
+    def pending_count(self) -> int:
+        """Number of jobs of the current user queued, or running in a live session"""
+        if self.user_id is None:
+            return 0
+        counts = self.execution_model.count_executions_by_status(self.user_id, self.STALE_SECONDS)
+        return counts.get('queued', 0) + counts.get('running', 0)
+
+    def _work(self):
+        """Worker loop: claim and run jobs until shutdown"""
+        while not self._stopping.is_set():
+            user_id = self.user_id
+            job = None
+            if user_id is not None:
+                try:
+                    job = self.execution_model.claim_next_execution(self.owner, user_id)
+                except Exception as e:
+                    self.logger.error(f"Error claiming execution: {e}")
+            if job is None:
+                with self._wakeup:
+                    self._wakeup.wait(self.IDLE_POLL_SECONDS)
+                continue
+            self._run_job(job)
+
+    def _send_heartbeats(self, stop: threading.Event):
+        """Heartbeat loop: mark the running jobs alive and requeue those of dead
+        sessions, until stopped or shut down with no job left"""
+        while not stop.wait(self.HEARTBEAT_SECONDS):
+            with self._lock:
+                running = bool(self._running)
+            if running:
+                try:
+                    self.execution_model.heartbeat_executions(self.owner)
+                except Exception as e:
+                    self.logger.error(f"Error sending heartbeat: {e}")
+            elif self._stopping.is_set():
+                return
+            if not self._stopping.is_set():
+                self._requeue_stale()
+
+    def _requeue_stale(self):
+        """Requeue the jobs of dead sessions and wake the workers up for them"""
+        try:
+            requeued = self.execution_model.requeue_running_executions(self.STALE_SECONDS)
+        except Exception as e:
+            self.logger.error(f"Error requeueing interrupted executions: {e}")
+            return
+        if requeued:
+            self.logger.info(f"Requeued {requeued} interrupted execution(s)")
+            with self._wakeup:
+                self._wakeup.notify_all()
+
+    def _run_job(self, job: Dict[str, Any]):
+        """Run one claimed execution and record its outcome"""
+        execution_id = job['id']
+        progress = ProgressTracker()
+        with self._lock:
+            self._running[execution_id] = progress
+
+        analysis_data = {
+            'protocolo': job['protocol'],
+            'setor': job['department'],
+            'pasta_origem': job['source_folder_path'],
+            'arquivo_resultado': job['result_file_path']
+        }
+        try:
+            result = self.pipeline.execute(analysis_data, progress)
+        except Exception as e:
+            self.logger.error(f"Execution {execution_id} error: {e}")
+            result = {'success': False, 'cancelled': False, 'error_message': f"Error during analysis: {str(e)}"}
+        result['execution_id'] = execution_id
+
+        try:
+            self.execution_model.finish_execution(execution_id, **self.pipeline.execution_fields(result))
+            self.execution_model.record_stages(execution_id, result.get('stages', []))
+            if self.on_job_finished:
+                self.on_job_finished(execution_id, result)
+        except Exception as e:
+            self.logger.error(f"Error recording execution {execution_id}: {e}")
+        finally:
+            # Removed last, so a job counts as running until it was reported
+            with self._lock:
+                del self._running[execution_id]
@@ -0,0 +1,148 @@
+"""
+Concurrent, atomic writing of an analysis' output files
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from .progress import AnalysisCancelled, ProgressTracker
+
+
+class OutputWriter:
+    """Writes a set of output files concurrently and publishes them atomically
+
+    Each file is produced by a function writing to a temporary path in the
+    output folder; the writer fsyncs it and hashes it on the same worker.
+    commit() waits for every file, then renames them all to their final
+    names and fsyncs the folder: a crash or a failure before that leaves
+    the previous outputs untouched, and no final file is ever half written.
+
+    Usage:
+        with OutputWriter(folder, progress) as writer:
+            writer.submit('results.txt', write_txt)
+            writer.submit('results.pdf', write_pdf, required=False)
+            artifacts = writer.commit()
+    """
+
+    # Temporary names: this prefix, a per-writer token (several jobs may
+    # share an output folder) and the final name
+    PARTIAL_PREFIX = ".partial-"
+    MAX_WORKERS = 3
+    HASH_CHUNK_BYTES = 1024 * 1024
+
+    def __init__(self, output_folder: str, progress: Optional[ProgressTracker] = None,
+                 max_workers: int = MAX_WORKERS):
+        self.output_folder = output_folder
+        self.progress = progress
+        self.logger = logging.getLogger(__name__)
+        self._token = uuid.uuid4().hex[:8]
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='sheetwise-output')
+        self._futures: Dict[str, Future] = {}
+        self._required: Dict[str, bool] = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> 'OutputWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def temp_path(self, name: str) -> str:
+        """Temporary path a file is written to before commit"""
+        return os.path.join(self.output_folder, f"{self.PARTIAL_PREFIX}{self._token}-{name}")
+
+    def submit(self, name: str, produce: Callable[[str], Optional[bool]], required: bool = True) -> Future:
+        """
+        Start writing a file
+
+        Args:
+            name: Final file name in the output folder
+            produce: Function writing the file to the path it is given. It
+                may return False to skip an optional file.
+            required: Whether a failure of this file fails the commit. An
+                optional file that fails is left out.
+        """
+        with self._lock:
+            if name in self._futures:
+                raise ValueError(f"{name} was already submitted")
+            self._required[name] = required
+            future = self._executor.submit(self._write, name, produce)
+            self._futures[name] = future
+        return future
+
+    def wait(self, name: str) -> Optional[Dict[str, Any]]:
+        """Wait until a submitted file is written; its artifact, or None if skipped or failed"""
+        try:
+            return self._futures[name].result()
+        except Exception:
+            return None
+
+    def commit(self) -> List[Dict[str, Any]]:
+        """
+        Wait for every file and move them to their final names
+
+        Returns:
+            One dict per file written, in submission order, with 'name',
+            'size' (bytes) and 'sha256'
+
+        Raises:
+            AnalysisCancelled: If progress was cancelled meanwhile
+            Exception: The error of the first required file that failed
+        """
+        artifacts = []
+        for name, future in self._futures.items():
+            try:
+                artifact = future.result()
+            except AnalysisCancelled:
+                raise
+            except Exception as e:
+                if self._required[name]:
+                    raise
+                self.logger.warning(f"{name} was not written: {e}")
+                continue
+            if artifact is not None:
+                artifacts.append(artifact)
+
+        if self.progress is not None:
+            self.progress.check()
+        for artifact in artifacts:
+            os.replace(self.temp_path(artifact['name']), os.path.join(self.output_folder, artifact['name']))
+        self._fsync_folder()
+        return artifacts
+
+    def close(self):
+        """Wait for the workers and remove every temporary file left"""
+        self._executor.shutdown(wait=True)
+        for name in self._futures:
+            path = self.temp_path(name)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _write(self, name: str, produce: Callable[[str], Optional[bool]]) -> Optional[Dict[str, Any]]:
+        """Worker: produce one file, flush it to disk and hash it"""
+        path = self.temp_path(name)
+        if produce(path) is False:
+            return None
+        digest = hashlib.sha256()
+        size = 0
+        with open(path, 'r+b') as f:
+            os.fsync(f.fileno())
+            for chunk in iter(lambda: f.read(self.HASH_CHUNK_BYTES), b''):
+                digest.update(chunk)
+                size += len(chunk)
+        return {'name': name, 'size': size, 'sha256': digest.hexdigest()}
+
+    def _fsync_folder(self):
+        """Persist the renames (not supported on Windows)"""
+        if not hasattr(os, 'O_DIRECTORY'):
+            return
+        fd = os.open(self.output_folder, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
@@ -0,0 +1,286 @@
+"""
+Mergeable partial analyses for runs spread across several machines
+
+Each node computes an AnalysisPartial from the files it holds and saves it
+to a compact, versioned .npz file; a coordinator merges any number of them
+and finalizes the same statistics and data summary a single-node run
+reports.
+"""
+
+import io
+import json
+import os
+import hashlib
+from typing import Any, Dict, List, Optional
+import numpy as np
+import pandas as pd
+
+from .aggregation import AggregationPlan, SalesAggregate
+from .integrity import check_referential_integrity, has_null, unique_ids
+
+
+PARTIAL_FORMAT = 'sheetwise-partial'
+PARTIAL_VERSION = 2
+# Integer id sets denser than one id per this many bits of their range are
+# stored as bitmaps instead of id lists
+BITMAP_MIN_DENSITY = 1 / 64
+
+CLIENTE_COLUMNS = ['preco_final', 'quantidade', 'preco_count', 'linhas']
+PRODUTO_COLUMNS = ['quantidade', 'preco_final']
+
+
+class AnalysisPartial:
+    """Partial analysis of one node's share of the input files
+
+    Holds the node's sales aggregate (per-product and per-customer sums and
+    counts), the distinct customer ids of its customers and addresses files
+    and their row counts by content fingerprint. Partials merge by summing
+    the aggregates, uniting the id sets and the row counts by fingerprint,
+    so merging is order independent and a customers or addresses file held
+    by several nodes is counted once.
+    """
+
+    def __init__(self, plan: Optional[AggregationPlan] = None):
+        self.plan = plan or AggregationPlan()
+        self.aggregate = SalesAggregate(self.plan)
+        self.clientes_ids = np.array([], dtype=np.int64)
+        self.clientes_sources: Dict[str, int] = {}
+        self.enderecos_ids: Optional[np.ndarray] = None
+        self.enderecos_sources: Dict[str, int] = {}
+        # Whether a null id was left out of the id sets
+        self.clientes_nulo = False
+        self.enderecos_nulo = False
+
+    @property
+    def clientes_rows(self) -> int:
+        """Rows of the distinct customers files"""
+        return sum(self.clientes_sources.values())
+
+    @property
+    def enderecos_rows(self) -> int:
+        """Rows of the distinct addresses files"""
+        return sum(self.enderecos_sources.values())
+
+    @classmethod
+    def from_data(cls, plan: AggregationPlan, aggregate: SalesAggregate,
+                  clientes_df: Optional[pd.DataFrame],
+                  enderecos_df: Optional[pd.DataFrame]) -> 'AnalysisPartial':
+        """Partial of the files a node loaded; any of them may be missing"""
+        partial = cls(plan)
+        partial.aggregate = aggregate
+        if clientes_df is not None:
+            partial.clientes_ids = unique_ids(clientes_df['id'])
+            partial.clientes_nulo = has_null(clientes_df['id'])
+            partial.clientes_sources = {frame_fingerprint(clientes_df): len(clientes_df)}
+        if enderecos_df is not None:
+            partial.enderecos_ids = unique_ids(enderecos_df['cliente_id'])
+            partial.enderecos_nulo = has_null(enderecos_df['cliente_id'])
+            partial.enderecos_sources = {frame_fingerprint(enderecos_df): len(enderecos_df)}
+        return partial
+
+    def merge(self, other: 'AnalysisPartial') -> 'AnalysisPartial':
+        """Merge another partial computed with the same metrics"""
+        if other.plan.metrics != self.plan.metrics:
+            raise ValueError("Partials were computed with different metrics")
+        self.aggregate.merge(other.aggregate)
+        self.clientes_ids = _union(self.clientes_ids, other.clientes_ids)
+        self.clientes_sources.update(other.clientes_sources)
+        self.clientes_nulo = self.clientes_nulo or other.clientes_nulo
+        if other.enderecos_ids is not None:
+            self.enderecos_ids = (other.enderecos_ids if self.enderecos_ids is None
+                                  else _union(self.enderecos_ids, other.enderecos_ids))
+        self.enderecos_sources.update(other.enderecos_sources)
+        self.enderecos_nulo = self.enderecos_nulo or other.enderecos_nulo
+        return self
+
+    def to_results(self, top_k: int = 5, orphan_sample_size: int = 0) -> Dict[str, Any]:
+        """Final statistics and data summary, in the shape DataProcessor.process_data returns"""
+        return {
+            'success': True,
+            'error_message': '',
+            'statistics': self.aggregate.to_statistics(self.clientes_rows, self.enderecos_rows, top_k),
+            'data_summary': check_referential_integrity(
+                _with_null(self.clientes_ids, self.clientes_nulo),
+                self.aggregate.customer_ids(),
+                _with_null(self.enderecos_ids, self.enderecos_nulo),
+                sample_size=orphan_sample_size
+            ),
+            'memory_report': {}
+        }
+
+    def save(self, path: str):
+        """Write the partial to path atomically"""
+        aggregate = self.aggregate
+        meta = {
+            'format': PARTIAL_FORMAT,
+            'version': PARTIAL_VERSION,
+            'metrics': sorted(self.plan.metrics),
+            'totals': {
+                'total_vendas': int(aggregate.total_vendas),
+                'receita_total': float(aggregate.receita_total),
+                'receita_count': int(aggregate.receita_count),
+                'quantidade_total': aggregate.quantidade_total.item()
+                if hasattr(aggregate.quantidade_total, 'item') else aggregate.quantidade_total
+            },
+            'clientes_sources': self.clientes_sources,
+            'enderecos_sources': self.enderecos_sources,
+            'has_enderecos': self.enderecos_ids is not None,
+            'clientes_nulo': self.clientes_nulo,
+            'enderecos_nulo': self.enderecos_nulo,
+            'por_cliente': aggregate.por_cliente is not None,
+            'por_produto': aggregate.por_produto is not None
+        }
+        arrays = {}
+        _pack_ids(arrays, 'clientes_ids', self.clientes_ids)
+        if self.enderecos_ids is not None:
+            _pack_ids(arrays, 'enderecos_ids', self.enderecos_ids)
+        if aggregate.por_cliente is not None:
+            _pack_frame(arrays, 'por_cliente', aggregate.por_cliente, CLIENTE_COLUMNS)
+        if aggregate.por_produto is not None:
+            _pack_frame(arrays, 'por_produto', aggregate.por_produto, PRODUTO_COLUMNS)
+        arrays['meta'] = np.frombuffer(json.dumps(meta).encode('utf-8'), dtype=np.uint8)
+
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                np.savez_compressed(f, **arrays)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    @classmethod
+    def load(cls, path: str) -> 'AnalysisPartial':
+        """
+        Read a partial written by save()
+
+        Raises:
+            ValueError: If the file is not a partial or has an unsupported version
+        """
+        with open(path, 'rb') as f:
+            data = io.BytesIO(f.read())
+        with np.load(data, allow_pickle=False) as arrays:
+            if 'meta' not in arrays:
+                raise ValueError(f"Not a Sheetwise partial: {path}")
+            meta = json.loads(arrays['meta'].tobytes().decode('utf-8'))
+            if meta.get('format') != PARTIAL_FORMAT:
+                raise ValueError(f"Not a Sheetwise partial: {path}")
+            if meta.get('version') != PARTIAL_VERSION:
+                raise ValueError(f"Unsupported partial version {meta.get('version')} in {path}")
+
+            partial = cls(AggregationPlan(meta['metrics']))
+            aggregate = partial.aggregate
+            aggregate.total_vendas = meta['totals']['total_vendas']
+            aggregate.receita_total = meta['totals']['receita_total']
+            aggregate.receita_count = meta['totals']['receita_count']
+            aggregate.quantidade_total = meta['totals']['quantidade_total']
+            if meta['por_cliente']:
+                aggregate.por_cliente = _unpack_frame(arrays, 'por_cliente', CLIENTE_COLUMNS)
+            if meta['por_produto']:
+                aggregate.por_produto = _unpack_frame(arrays, 'por_produto', PRODUTO_COLUMNS)
+
+            partial.clientes_ids = _unpack_ids(arrays, 'clientes_ids')
+            partial.clientes_nulo = meta['clientes_nulo']
+            partial.clientes_sources = meta['clientes_sources']
+            if meta['has_enderecos']:
+                partial.enderecos_ids = _unpack_ids(arrays, 'enderecos_ids')
+            partial.enderecos_nulo = meta['enderecos_nulo']
+            partial.enderecos_sources = meta['enderecos_sources']
+        return partial
+
+
+def merge_partials(partials: List[AnalysisPartial]) -> AnalysisPartial:
+    """Merge partials into a new one, leaving the inputs untouched"""
+    if not partials:
+        raise ValueError("No partials to merge")
+    merged = AnalysisPartial(partials[0].plan)
+    for partial in partials:
+        merged.merge(partial)
+    return merged
+
+
+def frame_fingerprint(frame: pd.DataFrame) -> str:
+    """
+    Hash of a loaded file's columns and values
+
+    Independent of the file's path and of the machine it was read on, so
+    nodes holding a copy of the same file agree on it.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(json.dumps([str(column) for column in frame.columns]).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def _with_null(ids: Optional[np.ndarray], nulo: bool) -> Optional[np.ndarray]:
+    """An id set with its null id put back, for the integrity checks"""
+    if ids is None or not nulo:
+        return ids
+    return np.append(ids.astype(object), None)
+
+
+def _union(left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    """Distinct ids of both arrays, in the form unique_ids returns"""
+    if len(left) == 0:
+        return right
+    if len(right) == 0:
+        return left
+    return unique_ids(np.concatenate([left, right]))
+
+
+def _pack_values(arrays: Dict[str, np.ndarray], name: str, values):
+    """Store values without pickle: numbers as is, anything else as unicode plus a null mask"""
+    values = np.asarray(values)
+    if values.dtype != object and values.dtype.kind in 'biuf':
+        arrays[name] = values
+        return
+    nulls = pd.isna(values)
+    arrays[name] = np.where(nulls, '', values).astype(str)
+    arrays[f"{name}.null"] = nulls
+
+
+def _unpack_values(arrays, name: str) -> np.ndarray:
+    values = arrays[name]
+    if f"{name}.null" not in arrays:
+        return values
+    values = values.astype(object)
+    values[arrays[f"{name}.null"]] = np.nan
+    return values
+
+
+def _pack_ids(arrays: Dict[str, np.ndarray], name: str, ids: np.ndarray):
+    """Store a distinct id set, as a bitmap over its range when dense enough"""
+    ids = np.asarray(ids)
+    if len(ids) and ids.dtype.kind in 'iu':
+        low, high = int(ids.min()), int(ids.max())
+        span = high - low + 1
+        if len(ids) / span >= BITMAP_MIN_DENSITY:
+            bits = np.zeros(span, dtype=bool)
+            bits[ids - low] = True
+            arrays[f"{name}.bitmap"] = np.packbits(bits)
+            arrays[f"{name}.range"] = np.array([low, span], dtype=np.int64)
+            arrays[f"{name}.dtype"] = np.array(ids.dtype.str)
+            return
+    _pack_values(arrays, name, ids)
+
+
+def _unpack_ids(arrays, name: str) -> np.ndarray:
+    if f"{name}.bitmap" in arrays:
+        low, span = arrays[f"{name}.range"].tolist()
+        bits = np.unpackbits(arrays[f"{name}.bitmap"], count=span).astype(bool)
+        return (np.flatnonzero(bits) + low).astype(np.dtype(str(arrays[f"{name}.dtype"])))
+    return _unpack_values(arrays, name)
+
+
+def _pack_frame(arrays: Dict[str, np.ndarray], name: str, frame: pd.DataFrame, columns: List[str]):
+    """Store a grouped frame as its index and one array per column"""
+    _pack_values(arrays, f"{name}.index", frame.index.to_numpy())
+    for column in columns:
+        arrays[f"{name}.{column}"] = frame[column].to_numpy()
+
+
+def _unpack_frame(arrays, name: str, columns: List[str]) -> pd.DataFrame:
+    return pd.DataFrame(
+        {column: arrays[f"{name}.{column}"] for column in columns},
+        index=pd.Index(_unpack_values(arrays, f"{name}.index"))
+    )
@@ -0,0 +1,546 @@
+"""
+PDF report backends
+
+- wkhtmltopdf: renders the HTML report with WebKit. Each process keeps a
+  small pool of long-lived wkhtmltopdf workers fed one report per line, and
+  renders are bounded machine-wide by lock-file slots, with timeouts.
+- native: lays the text report out directly with the built-in text_pdf
+  writer. Needs no external binary and no subprocess.
+"""
+
+import os
+import re
+import sys
+import time
+import queue
+import locale
+import logging
+import tempfile
+import subprocess
+import threading
+from collections import namedtuple
+from typing import Dict, List, Optional
+
+from .progress import ProgressTracker
+from .text_pdf import COLUMNS, LINES_PER_PAGE, write_text_pdf
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+PDF_BACKENDS = ['auto', 'wkhtmltopdf', 'native']
+
+# wkhtmltopdf executable and environment, as pdfkit.configuration() has them
+WkhtmltopdfConfiguration = namedtuple('WkhtmltopdfConfiguration', ['wkhtmltopdf', 'environ'])
+
+
+class PdfRenderer:
+    """Interface of the PDF backends"""
+
+    name = ''
+    # Whether render() reads html_path (otherwise it only needs text_content)
+    needs_html = True
+
+    def is_available(self) -> bool:
+        """Whether the backend can render on this machine"""
+        return True
+
+    def cache_variant(self) -> str:
+        """Identifies the backend and its settings in PDF cache keys"""
+        return self.name
+
+    def render(self, html_path: str, pdf_path: str,
+               progress: Optional[ProgressTracker] = None,
+               text_content: Optional[str] = None,
+               title: Optional[str] = None):
+        """
+        Render the report to pdf_path
+
+        Args:
+            html_path: HTML report
+            pdf_path: PDF file to write
+            progress: Optional tracker; cancelling it raises AnalysisCancelled
+            text_content: Plain-text report, for backends that do not read HTML
+            title: Document title
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """Release what the backend keeps between reports (nothing by default)"""
+
+
+class RenderSlots:
+    """Render slots shared by every process of the machine
+
+    One lock file per slot in the temporary folder; a render holds the lock
+    of a free slot. The locks are released by the OS when their process
+    dies, so a crashed run never keeps a slot.
+    """
+
+    def __init__(self, count: int, directory: Optional[str] = None):
+        self.count = count
+        if directory is None:
+            user = os.getuid() if hasattr(os, 'getuid') else 'user'
+            directory = os.path.join(tempfile.gettempdir(), f"sheetwise-pdf-slots-{user}")
+        self.directory = directory
+        os.makedirs(self.directory, exist_ok=True)
+
+    def try_acquire(self) -> Optional[int]:
+        """Lock a free slot; its file descriptor, or None when all are taken"""
+        for index in range(self.count):
+            fd = os.open(os.path.join(self.directory, f"slot-{index}.lock"), os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                else:
+                    msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+                return fd
+            except OSError:
+                os.close(fd)
+        return None
+
+    def release(self, fd: int):
+        """Unlock a slot returned by try_acquire"""
+        try:
+            if fcntl is None:
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(fd)
+
+
+class WkhtmltopdfProtocolError(IOError):
+    """wkhtmltopdf does not answer reports fed on its standard input"""
+
+
+class WkhtmltopdfWorker:
+    """A long-lived wkhtmltopdf process converting one report per input line
+
+    Runs ``wkhtmltopdf --read-args-from-stdin``: each line written to it
+    holds the input and output paths of a report, rendered with the options
+    given at start. wkhtmltopdf reports its progress on stderr as soon as a
+    report starts and "Done" after each one; a worker that reports nothing
+    within first_message_timeout is not speaking that protocol.
+    After any failure, timeout or cancellation the worker must be closed,
+    since its output could no longer be matched to a report.
+    """
+
+    # wkhtmltopdf splits lines on spaces outside double quotes
+    _QUOTE_PATTERN = re.compile(r'(["\\])')
+
+    def __init__(self, command: List[str], env: Optional[Dict[str, str]] = None):
+        self.process = subprocess.Popen(command + ['--read-args-from-stdin'], stdin=subprocess.PIPE,
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, env=env)
+        self.jobs = 0
+        self.idle_since = time.monotonic()
+        # stderr messages, then None once the process exited
+        self._messages: "queue.Queue[Optional[str]]" = queue.Queue()
+        threading.Thread(target=self._read_messages, name="sheetwise-wkhtmltopdf-stderr", daemon=True).start()
+
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def convert(self, html_path: str, pdf_path: str, timeout: float, poll_seconds: float,
+                progress: Optional[ProgressTracker] = None,
+                first_message_timeout: Optional[float] = None):
+        """
+        Render one report
+
+        Args:
+            timeout: Seconds the report may take
+            poll_seconds: How often progress is checked for cancellation
+            first_message_timeout: Seconds wkhtmltopdf may stay silent after
+                the report was sent (default: timeout)
+
+        Raises:
+            AnalysisCancelled: If progress is cancelled meanwhile
+            TimeoutError: If the report takes longer than timeout
+            WkhtmltopdfProtocolError: If wkhtmltopdf reports nothing in time
+            IOError: If wkhtmltopdf reports a failure or exits
+        """
+        line = f"{self._quote(html_path)} {self._quote(pdf_path)}\n"
+        try:
+            self.process.stdin.write(line.encode(locale.getpreferredencoding(False)))
+            self.process.stdin.flush()
+        except OSError as e:
+            raise IOError(f"wkhtmltopdf is not accepting reports: {e}")
+
+        errors = []
+        started = time.monotonic()
+        deadline = started + timeout
+        silent_deadline = started + min(timeout, first_message_timeout or timeout)
+        heard = False
+        while True:
+            try:
+                message = self._messages.get(timeout=poll_seconds)
+            except queue.Empty:
+                if progress is not None:
+                    progress.check()
+                now = time.monotonic()
+                if not heard and now >= silent_deadline:
+                    raise WkhtmltopdfProtocolError(
+                        f"wkhtmltopdf reported nothing within {now - started:g}s of receiving a report"
+                    )
+                if now >= deadline:
+                    raise TimeoutError(f"wkhtmltopdf did not finish within {timeout:g}s")
+                continue
+            heard = True
+            if message == 'Done':
+                break
+            if message is None or message.startswith('Exit with code'):
+                details = '; '.join(errors + ([message] if message else []))
+                raise IOError(f"wkhtmltopdf failed: {details or 'process exited'}")
+            if message.startswith(('Error', 'Warning')):
+                errors.append(message)
+        self.jobs += 1
+
+    def close(self, kill: bool = False):
+        """Stop the process: at end of input, or killed"""
+        if not kill:
+            try:
+                self.process.stdin.close()
+                self.process.wait(timeout=5)
+                return
+            except (OSError, subprocess.TimeoutExpired):
+                pass
+        self.process.kill()
+        self.process.wait()
+
+    @classmethod
+    def _quote(cls, path: str) -> str:
+        return '"' + cls._QUOTE_PATTERN.sub(r'\\\1', path) + '"'
+
+    def _read_messages(self):
+        """Reader thread: queue the stderr lines, split on progress carriage returns"""
+        pending = b''
+        for block in iter(lambda: self.process.stderr.read1(4096), b''):
+            *lines, pending = re.split(rb'[\r\n]', pending + block)
+            for line in lines:
+                line = line.strip()
+                if line:
+                    self._messages.put(line.decode('utf-8', errors='replace'))
+        self._messages.put(None)
+
+
+class WkhtmltopdfRenderer(PdfRenderer):
+    """Renders HTML reports to PDF with a pool of long-lived wkhtmltopdf workers
+
+    One renderer is meant to be shared by every analysis of a process (see
+    get_pdf_renderer). It resolves the wkhtmltopdf configuration once and
+    keeps up to ``max_concurrent`` workers between reports, so WebKit starts
+    once per worker rather than once per report. At most ``max_concurrent``
+    reports render at once across all processes of the machine (the CLI's
+    folder workers included); further reports queue for a slot. A render
+    exceeding its timeout kills its worker, which is replaced on demand.
+    """
+
+    # wkhtmltopdf holds a WebKit instance each, so few run at once
+    name = 'wkhtmltopdf'
+
+    DEFAULT_MAX_CONCURRENT = 2
+    DEFAULT_TIMEOUT_SECONDS = 120.0
+    DEFAULT_QUEUE_TIMEOUT_SECONDS = 600.0
+    # How often a queued or running render is checked for cancellation
+    POLL_SECONDS = 0.2
+    # Idle workers exit after this long; workers are replaced after this
+    # many reports, so WebKit memory growth stays bounded
+    IDLE_SECONDS = 60.0
+    MAX_JOBS_PER_WORKER = 100
+    # wkhtmltopdf reports "Loading pages" at once; silence means it does
+    # not read reports from stdin, so the render fails without the full timeout
+    FIRST_MESSAGE_SECONDS = 15.0
+
+    # No 'quiet': workers report the end of each render on stderr
+    OPTIONS = {
+        'page-size': 'A4',
+        'margin-top': '0.75in',
+        'margin-right': '0.75in',
+        'margin-bottom': '0.75in',
+        'margin-left': '0.75in',
+        'encoding': "UTF-8",
+        'enable-local-file-access': None,
+        # The report template has no scripts
+        'disable-javascript': None
+    }
+
+    def __init__(self, max_concurrent: Optional[int] = None,
+                 timeout: float = DEFAULT_TIMEOUT_SECONDS,
+                 queue_timeout: float = DEFAULT_QUEUE_TIMEOUT_SECONDS,
+                 slots: Optional[RenderSlots] = None,
+                 binary: Optional[str] = None):
+        """
+        Args:
+            max_concurrent: Maximum reports rendering at once on the machine,
+                and workers kept by this process
+            timeout: Seconds a single render may take before it is killed
+            queue_timeout: Seconds a report may wait for a free slot
+            slots: Render slots to share (default: the machine-wide ones)
+            binary: wkhtmltopdf executable to run, without pdfkit
+                (default: the one pdfkit finds)
+        """
+        self.max_concurrent = max(1, max_concurrent or self.DEFAULT_MAX_CONCURRENT)
+        self.timeout = timeout
+        self.queue_timeout = queue_timeout
+        self.binary = binary
+        self.logger = logging.getLogger(__name__)
+
+        self._slots = slots
+        self._lock = threading.Lock()
+        self._configuration = None
+        self._configured = False
+        self._available: Optional[bool] = None
+        self._idle: List[WkhtmltopdfWorker] = []
+        self._closed = False
+        self._reaper: Optional[threading.Thread] = None
+
+    def cache_variant(self) -> str:
+        options = ','.join(f"{option}={value}" for option, value in sorted(self.OPTIONS.items()))
+        return f"{self.name}:{options}"
+
+    def is_available(self) -> bool:
+        """Whether wkhtmltopdf was found and, so far, answers reports"""
+        if self._available is None:
+            try:
+                self.configuration()
+                self._available = True
+            except (ImportError, OSError) as e:
+                self.logger.warning(f"wkhtmltopdf unavailable: {e}")
+                self._available = False
+        return self._available
+
+    def render(self, html_path: str, pdf_path: str,
+               progress: Optional[ProgressTracker] = None,
+               text_content: Optional[str] = None,
+               title: Optional[str] = None):
+        """
+        Render html_path to pdf_path, waiting for a free slot if needed
+
+        Raises:
+            AnalysisCancelled: If progress is cancelled while queued or rendering
+            TimeoutError: If no slot frees up in time or the render takes too long
+            IOError: If wkhtmltopdf fails or produces no file
+        """
+        if progress is not None:
+            progress.set_stage('pdf')
+        configuration = self.configuration()
+
+        slot = self._acquire_slot(progress)
+        try:
+            started = time.perf_counter()
+            worker = self._checkout(configuration)
+            try:
+                worker.convert(os.path.abspath(html_path), os.path.abspath(pdf_path),
+                               self.timeout, self.POLL_SECONDS, progress, self.FIRST_MESSAGE_SECONDS)
+            except WkhtmltopdfProtocolError as e:
+                worker.close(kill=True)
+                # 'auto' picks the native backend from now on
+                self.logger.error(f"wkhtmltopdf does not read reports from stdin, disabling it: {e}")
+                self._available = False
+                raise
+            except BaseException:
+                worker.close(kill=True)
+                raise
+            self._checkin(worker)
+            elapsed = time.perf_counter() - started
+        finally:
+            self._render_slots().release(slot)
+
+        if not os.path.exists(pdf_path) or os.path.getsize(pdf_path) == 0:
+            raise IOError("wkhtmltopdf did not produce a PDF file")
+        self.logger.info(f"PDF rendered in {elapsed:.2f}s: {pdf_path}")
+
+    def close(self):
+        """Stop the idle workers (a worker still rendering stops when checked in)"""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.close()
+
+    def configuration(self):
+        """wkhtmltopdf configuration, resolved on first use and reused afterwards"""
+        with self._lock:
+            if not self._configured:
+                self._configuration = self._resolve_configuration()
+                self._configured = True
+            return self._configuration
+
+    def _resolve_configuration(self):
+        """Locate wkhtmltopdf: the given binary, bundled with the executable, or on PATH"""
+        if self.binary is not None:
+            if not os.path.isfile(self.binary):
+                raise OSError(f"wkhtmltopdf not found at: {self.binary}")
+            return WkhtmltopdfConfiguration(self.binary, None)
+
+        import pdfkit
+
+        if not getattr(sys, 'frozen', False):
+            return pdfkit.configuration()
+
+        # Running as compiled executable
+        base_path = sys._MEIPASS
+        if sys.platform.startswith('win'):
+            # Windows executable - need to add bin directory to PATH for DLL access
+            wkhtmltopdf_bin_dir = os.path.join(base_path, 'wkhtmltopdf', 'bin')
+            wkhtmltopdf_path = os.path.join(wkhtmltopdf_bin_dir, 'wkhtmltopdf.exe')
+            if os.path.exists(wkhtmltopdf_bin_dir):
+                os.environ['PATH'] = wkhtmltopdf_bin_dir + os.pathsep + os.environ.get('PATH', '')
+                self.logger.info(f"Added to PATH: {wkhtmltopdf_bin_dir}")
+        else:
+            # Linux executable
+            wkhtmltopdf_path = os.path.join(base_path, 'wkhtmltopdf', 'bin', 'wkhtmltopdf')
+
+        if os.path.exists(wkhtmltopdf_path):
+            self.logger.info(f"Using bundled wkhtmltopdf: {wkhtmltopdf_path}")
+            return pdfkit.configuration(wkhtmltopdf=wkhtmltopdf_path)
+        self.logger.warning(f"Bundled wkhtmltopdf not found at: {wkhtmltopdf_path}")
+        return pdfkit.configuration()
+
+    def _command(self, configuration) -> List[str]:
+        """wkhtmltopdf with the report options, as pdfkit would pass them"""
+        command = [os.fsdecode(configuration.wkhtmltopdf)]
+        for option, value in self.OPTIONS.items():
+            command.append(f"--{option}")
+            if value:
+                command.append(value)
+        return command
+
+    def _render_slots(self) -> RenderSlots:
+        with self._lock:
+            if self._slots is None:
+                self._slots = RenderSlots(self.max_concurrent)
+            return self._slots
+
+    def _acquire_slot(self, progress: Optional[ProgressTracker]) -> int:
+        """Wait for a free render slot, polling for cancellation"""
+        slots = self._render_slots()
+        deadline = time.monotonic() + self.queue_timeout
+        while True:
+            slot = slots.try_acquire()
+            if slot is not None:
+                return slot
+            if progress is not None:
+                progress.check()
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"No PDF render slot became free within {self.queue_timeout:g}s")
+            time.sleep(self.POLL_SECONDS)
+
+    def _checkout(self, configuration) -> WkhtmltopdfWorker:
+        """An idle worker, or a new one when none is left"""
+        expired = []
+        worker = None
+        with self._lock:
+            now = time.monotonic()
+            while self._idle:
+                candidate = self._idle.pop()
+                if candidate.alive() and now - candidate.idle_since < self.IDLE_SECONDS:
+                    worker = candidate
+                    break
+                expired.append(candidate)
+        for candidate in expired:
+            candidate.close()
+        if worker is None:
+            worker = WkhtmltopdfWorker(self._command(configuration), configuration.environ)
+        return worker
+
+    def _checkin(self, worker: WkhtmltopdfWorker):
+        """Keep a worker for the next report, unless it has done enough or the pool is full"""
+        worker.idle_since = time.monotonic()
+        with self._lock:
+            if (not self._closed and worker.jobs < self.MAX_JOBS_PER_WORKER
+                    and len(self._idle) < self.max_concurrent):
+                self._idle.append(worker)
+                if self._reaper is None:
+                    self._reaper = threading.Thread(target=self._reap_idle, name="sheetwise-wkhtmltopdf-reaper",
+                                                    daemon=True)
+                    self._reaper.start()
+                return
+        worker.close()
+
+    def _reap_idle(self):
+        """Reaper thread: stop workers idle for IDLE_SECONDS, until none is left"""
+        while True:
+            time.sleep(self.IDLE_SECONDS / 4)
+            with self._lock:
+                now = time.monotonic()
+                expired = [worker for worker in self._idle if now - worker.idle_since >= self.IDLE_SECONDS]
+                self._idle = [worker for worker in self._idle if worker not in expired]
+                done = not self._idle
+                if done:
+                    self._reaper = None
+            for worker in expired:
+                worker.close()
+            if done:
+                return
+
+
+class TextPdfRenderer(PdfRenderer):
+    """Writes the plain-text report as a PDF without any external binary"""
+
+    name = 'native'
+    needs_html = False
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+
+    def cache_variant(self) -> str:
+        return f"{self.name}:{COLUMNS}x{LINES_PER_PAGE}"
+
+    def render(self, html_path: str, pdf_path: str,
+               progress: Optional[ProgressTracker] = None,
+               text_content: Optional[str] = None,
+               title: Optional[str] = None):
+        """
+        Render text_content to pdf_path
+
+        Raises:
+            ValueError: If no text_content is given
+        """
+        if text_content is None:
+            raise ValueError("The native PDF backend needs the text report")
+        if progress is not None:
+            progress.set_stage('pdf')
+        started = time.perf_counter()
+        write_text_pdf(text_content, pdf_path, title,
+                       on_page=progress.check if progress is not None else None)
+        self.logger.info(f"PDF written in {time.perf_counter() - started:.3f}s: {pdf_path}")
+
+
+_RENDERER_CLASSES = {
+    'wkhtmltopdf': WkhtmltopdfRenderer,
+    'native': TextPdfRenderer
+}
+_renderers: Dict[str, PdfRenderer] = {}
+_renderers_lock = threading.Lock()
+
+
+def get_pdf_renderer(backend: str = 'wkhtmltopdf') -> PdfRenderer:
+    """
+    The renderer of a backend, shared by every DataProcessor of this process
+
+    Args:
+        backend: One of PDF_BACKENDS. 'auto' is wkhtmltopdf when it is
+            installed and the native writer otherwise.
+
+    Raises:
+        ValueError: If backend is unknown
+    """
+    if backend == 'auto':
+        renderer = get_pdf_renderer('wkhtmltopdf')
+        return renderer if renderer.is_available() else get_pdf_renderer('native')
+    if backend not in _RENDERER_CLASSES:
+        raise ValueError(f"Unknown PDF backend: {backend} (expected one of {', '.join(PDF_BACKENDS)})")
+    with _renderers_lock:
+        if backend not in _renderers:
+            _renderers[backend] = _RENDERER_CLASSES[backend]()
+        return _renderers[backend]
+
+
+def close_pdf_renderers():
+    """Close the shared renderers, stopping their workers; call on shutdown"""
+    with _renderers_lock:
+        renderers = list(_renderers.values())
+        _renderers.clear()
+    for renderer in renderers:
+        renderer.close()
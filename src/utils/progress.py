@@ -0,0 +1,271 @@
+"""
+Progress reporting, cancellation and per-stage measurements for analysis runs
+"""
+
+import os
+import sys
+import threading
+import time
+import weakref
+from typing import Any, Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# How often the RSS of the process is sampled while a run is being measured
+RSS_SAMPLE_SECONDS = 0.05
+
+
+def cpu_seconds() -> float:
+    """CPU time of this process and of its child processes that exited
+
+    The long-lived wkhtmltopdf workers of pdf_renderer are only counted once
+    they exit, so a PDF rendered by a worker is not part of its stage's CPU time.
+    """
+    times = os.times()
+    return time.process_time() + times.children_user + times.children_system
+
+
+def current_rss_bytes() -> Optional[int]:
+    """
+    Resident set size of this process, or None where unavailable
+
+    Linux (/proc/self/statm) and Windows (the working set) report the current
+    size. Other POSIX systems (macOS) only report the peak so far, so there
+    a stage's peak is the process peak at its end.
+    """
+    try:
+        with open('/proc/self/statm', 'rb') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    if sys.platform == 'win32':
+        return _windows_working_set()
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Reported in kilobytes, except on macOS
+        return peak if sys.platform == 'darwin' else peak * 1024
+    return None
+
+
+def _windows_working_set() -> Optional[int]:
+    """Current working set of this process (GetProcessMemoryInfo)"""
+    import ctypes
+    from ctypes import wintypes
+
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [
+            ('cb', wintypes.DWORD),
+            ('PageFaultCount', wintypes.DWORD),
+            ('PeakWorkingSetSize', ctypes.c_size_t),
+            ('WorkingSetSize', ctypes.c_size_t),
+            ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+            ('QuotaPagedPoolUsage', ctypes.c_size_t),
+            ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+            ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+            ('PagefileUsage', ctypes.c_size_t),
+            ('PeakPagefileUsage', ctypes.c_size_t)
+        ]
+
+    try:
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        kernel32 = ctypes.WinDLL('kernel32')
+        kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+        # K32GetProcessMemoryInfo is psapi's GetProcessMemoryInfo, exported by kernel32
+        get_info = kernel32.K32GetProcessMemoryInfo
+        get_info.argtypes = [wintypes.HANDLE, ctypes.POINTER(ProcessMemoryCounters), wintypes.DWORD]
+        get_info.restype = wintypes.BOOL
+        if not get_info(kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+            return None
+        return counters.WorkingSetSize
+    except (OSError, AttributeError):
+        return None
+
+
+# Trackers of the runs being measured, fed by a single sampler thread
+_sampled_trackers: "weakref.WeakSet[ProgressTracker]" = weakref.WeakSet()
+_sampler_lock = threading.Lock()
+_sampler: Optional[threading.Thread] = None
+
+
+def _sample_rss():
+    """Sampler loop: report the RSS to every tracker until none is left"""
+    global _sampler
+    while True:
+        with _sampler_lock:
+            trackers = list(_sampled_trackers)
+            if not trackers:
+                _sampler = None
+                return
+        rss = current_rss_bytes()
+        for tracker in trackers:
+            tracker._observe_rss(rss)
+        del trackers
+        time.sleep(RSS_SAMPLE_SECONDS)
+
+
+def _start_sampling(tracker: 'ProgressTracker'):
+    """Sample the RSS for tracker until _stop_sampling"""
+    global _sampler
+    if current_rss_bytes() is None:
+        return
+    with _sampler_lock:
+        _sampled_trackers.add(tracker)
+        if _sampler is None:
+            _sampler = threading.Thread(target=_sample_rss, name="sheetwise-rss-sampler", daemon=True)
+            _sampler.start()
+
+
+def _stop_sampling(tracker: 'ProgressTracker'):
+    with _sampler_lock:
+        _sampled_trackers.discard(tracker)
+
+
+class AnalysisCancelled(Exception):
+    """Raised inside the pipeline once its run has been cancelled"""
+
+
+class ProgressTracker:
+    """Thread-safe progress state of one analysis run
+
+    The worker reports the current stage, rows processed and bytes read;
+    any thread may read a snapshot or request cancellation. Cancellation is
+    cooperative: the worker raises AnalysisCancelled at its next report.
+
+    Each stage is also measured: wall time, CPU time, the highest RSS
+    sampled while it ran, and rows and bytes reported during it (see
+    stage_timings). CPU time and RSS are process-wide, so they include jobs
+    running at the same time.
+    """
+
+    STAGES = ['reading', 'aggregating', 'integrity', 'reports', 'pdf']
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+        self.started_at = time.monotonic()
+        self.stage = 'reading'
+        self.rows = 0
+        self.bytes_read = 0
+        self.total_bytes = 0
+        self._stage_timings: List[Dict[str, Any]] = []
+        self._stage_start = self._measure()
+        self._stage_peak_rss = current_rss_bytes()
+        self._finished = False
+        _start_sampling(self)
+
+    def set_stage(self, stage: str):
+        """Enter a pipeline stage"""
+        self.check()
+        with self._lock:
+            if stage == self.stage or self._finished:
+                return
+            self._close_stage()
+            self.stage = stage
+
+    def finish(self):
+        """Close the measurement of the current stage; the run is over"""
+        with self._lock:
+            if not self._finished:
+                self._close_stage()
+                self._finished = True
+        _stop_sampling(self)
+
+    def stage_timings(self) -> List[Dict[str, Any]]:
+        """
+        Measurements of the stages closed so far, in order
+
+        Returns:
+            One dict per stage with 'stage', 'wall_seconds', 'cpu_seconds',
+            'peak_rss_bytes' (highest RSS sampled during the stage, None
+            where unavailable), 'rows' and 'bytes'
+        """
+        with self._lock:
+            return [dict(timing) for timing in self._stage_timings]
+
+    def _measure(self) -> Dict[str, Any]:
+        return {'wall': time.perf_counter(), 'cpu': cpu_seconds(), 'rows': self.rows, 'bytes': self.bytes_read}
+
+    def _observe_rss(self, rss: Optional[int]):
+        """Raise the RSS peak of the current stage to a new sample"""
+        if rss is None:
+            return
+        with self._lock:
+            if self._stage_peak_rss is None or rss > self._stage_peak_rss:
+                self._stage_peak_rss = rss
+
+    def _close_stage(self):
+        """Record the stage being left and start measuring the next one (lock held)"""
+        end = self._measure()
+        start = self._stage_start
+        rss = current_rss_bytes()
+        peak = self._stage_peak_rss
+        if rss is not None and (peak is None or rss > peak):
+            peak = rss
+        self._stage_timings.append({
+            'stage': self.stage,
+            'wall_seconds': round(end['wall'] - start['wall'], 6),
+            'cpu_seconds': round(end['cpu'] - start['cpu'], 6),
+            'peak_rss_bytes': peak,
+            'rows': int(end['rows'] - start['rows']),
+            'bytes': int(end['bytes'] - start['bytes'])
+        })
+        self._stage_start = end
+        self._stage_peak_rss = rss
+
+    def expect_bytes(self, size: int):
+        """Add the size of an input file to the bytes the run will read"""
+        with self._lock:
+            self.total_bytes += size
+
+    def advance(self, rows: int = 0, bytes_read: int = 0):
+        """Report rows processed and bytes read since the last report"""
+        self.check()
+        with self._lock:
+            self.rows += rows
+            self.bytes_read += bytes_read
+
+    def cancel(self):
+        """Ask the run to stop at its next checkpoint"""
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def check(self):
+        """Raise AnalysisCancelled if the run was cancelled"""
+        if self._cancelled.is_set():
+            raise AnalysisCancelled(f"Analysis cancelled during {self.stage}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Current progress
+
+        Returns:
+            Dict with 'stage', 'rows', 'bytes_read', 'total_bytes',
+            'fraction' (share of input bytes read, or None when unknown),
+            'elapsed' and 'eta' in seconds ('eta' is None until it can be
+            estimated)
+        """
+        with self._lock:
+            elapsed = time.monotonic() - self.started_at
+            fraction: Optional[float] = None
+            eta: Optional[float] = None
+            if self.total_bytes:
+                fraction = min(self.bytes_read / self.total_bytes, 1.0)
+                if 0 < fraction < 1:
+                    eta = elapsed * (1 - fraction) / fraction
+            return {
+                'stage': self.stage,
+                'rows': self.rows,
+                'bytes_read': self.bytes_read,
+                'total_bytes': self.total_bytes,
+                'fraction': fraction,
+                'elapsed': elapsed,
+                'eta': eta,
+                'cancelled': self.cancelled
+            }
@@ -0,0 +1,108 @@
+"""
+Declared dataset schemas: which columns the analysis reads and their compact dtypes
+"""
+
+import sys
+from typing import Dict, List, Optional
+import numpy as np
+import pandas as pd
+
+
+# Columns each dataset must provide for the analysis
+ANALYSIS_COLUMNS = {
+    'clientes': ['id'],
+    'vendas': ['cliente_id', 'produto', 'quantidade', 'preco_final'],
+    'enderecos': ['cliente_id']
+}
+
+# Compact dtypes for known columns. Prices stay float64: float32 keeps only
+# about 7 significant digits, which is not enough for revenue totals in cents.
+COLUMN_DTYPES = {
+    'id': 'int32',
+    'cliente_id': 'int32',
+    'quantidade': 'int32',
+    'produto': 'category',
+    'bairro': 'category',
+    'cidade': 'category',
+    'preco_unitario': 'float64',
+    'preco_final': 'float64'
+}
+
+
+def build_dataset_schemas(expected_columns: Dict[str, List[str]],
+                          analysis_columns: Optional[Dict[str, List[str]]] = None) -> Dict[str, Dict]:
+    """
+    Build the schema of each dataset from the expected columns map
+
+    Args:
+        expected_columns: Columns each file must have (FileValidator.EXPECTED_COLUMNS)
+        analysis_columns: Overrides of ANALYSIS_COLUMNS, e.g. the sales columns
+            an aggregation plan needs
+
+    Returns:
+        Dict mapping dataset name to {'columns', 'usecols', 'dtypes'}
+    """
+    needed = dict(ANALYSIS_COLUMNS)
+    needed.update(analysis_columns or {})
+    schemas = {}
+    for dataset, columns in expected_columns.items():
+        usecols = [col for col in columns if col in needed.get(dataset, columns)]
+        schemas[dataset] = {
+            'columns': list(columns),
+            'usecols': usecols,
+            'dtypes': {col: COLUMN_DTYPES[col] for col in usecols if col in COLUMN_DTYPES}
+        }
+    return schemas
+
+
+def parse_dtypes(schema: Dict) -> Dict[str, str]:
+    """Dtypes that are safe to request from the parser itself
+
+    Integer columns are downcast after parsing instead, because a single
+    missing value would make a parse-time int32 request fail.
+    """
+    return {col: dtype for col, dtype in schema['dtypes'].items() if dtype == 'category'}
+
+
+def apply_schema(df: pd.DataFrame, schema: Dict) -> pd.DataFrame:
+    """Project a frame to the schema columns and convert them to compact dtypes"""
+    df = df[[col for col in schema['usecols'] if col in df.columns]]
+    converted = {}
+    for col, dtype in schema['dtypes'].items():
+        if col not in df.columns or df[col].dtype == dtype:
+            continue
+        series = df[col]
+        if dtype == 'category':
+            converted[col] = series.astype('category')
+        elif dtype == 'int32' and pd.api.types.is_integer_dtype(series):
+            info = np.iinfo(np.int32)
+            if series.empty or (series.min() >= info.min and series.max() <= info.max):
+                converted[col] = series.astype('int32')
+        elif dtype == 'float64' and pd.api.types.is_numeric_dtype(series):
+            converted[col] = series.astype('float64')
+    if converted:
+        df = df.assign(**converted)
+    return df
+
+
+def estimate_default_memory(df: pd.DataFrame) -> int:
+    """
+    Estimate the memory the same rows would use with pandas' default dtypes
+
+    Numeric columns are counted as 64-bit and categorical columns as Python
+    string objects, without materialising them.
+    """
+    total = int(df.index.memory_usage())
+    for col in df.columns:
+        series = df[col]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            categories = series.cat.categories
+            object_sizes = pd.Series(categories, dtype=object).map(sys.getsizeof).to_numpy()
+            counts = np.bincount(series.cat.codes.to_numpy() + 1, minlength=len(categories) + 1)[1:]
+            # 8-byte pointer per row plus one string object per row
+            total += len(series) * 8 + int((object_sizes * counts).sum())
+        elif pd.api.types.is_numeric_dtype(series):
+            total += len(series) * 8
+        else:
+            total += int(series.memory_usage(index=False, deep=True))
+    return total
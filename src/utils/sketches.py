@@ -0,0 +1,149 @@
+"""
+Fixed-memory streaming sketches for approximate analytics
+"""
+
+import math
+from typing import Optional
+import numpy as np
+import pandas as pd
+
+
+def hash_values(values) -> np.ndarray:
+    """64-bit hashes of a column, equal for equal integer ids of any width"""
+    values = pd.Series(values).dropna().to_numpy()
+    if values.dtype.kind in 'iu':
+        values = values.astype(np.int64)
+    elif values.dtype.kind not in 'fb':
+        values = values.astype(object)
+    return pd.util.hash_array(values)
+
+
+class HyperLogLog:
+    """HyperLogLog distinct counter
+
+    Uses 2**precision one-byte registers; the relative standard error of the
+    estimate is 1.04 / sqrt(2**precision), about 0.8% at the default precision.
+    """
+
+    def __init__(self, precision: int = 14):
+        if not 11 <= precision <= 18:
+            raise ValueError("HyperLogLog precision must be between 11 and 18")
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    @property
+    def relative_error(self) -> float:
+        """Relative standard error of the estimate"""
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def add(self, values) -> 'HyperLogLog':
+        """Add a column of values"""
+        hashes = hash_values(values)
+        if len(hashes) == 0:
+            return self
+
+        p = self.precision
+        index = (hashes >> np.uint64(64 - p)).astype(np.intp)
+        remaining = hashes & np.uint64((1 << (64 - p)) - 1)
+        # remaining has at most 53 bits, so the float conversion is exact and
+        # frexp's exponent is its bit length
+        _, bit_length = np.frexp(remaining.astype(np.float64))
+        rank = ((64 - p) - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+        return self
+
+    def merge(self, other: 'HyperLogLog') -> 'HyperLogLog':
+        """Merge another sketch of the same precision (set union)"""
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLog sketches of different precision")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def copy(self) -> 'HyperLogLog':
+        clone = HyperLogLog(self.precision)
+        clone.registers = self.registers.copy()
+        return clone
+
+    def estimate(self) -> float:
+        """Estimated number of distinct values added"""
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            # Small range correction (linear counting)
+            return m * math.log(m / zeros)
+        return float(raw)
+
+
+class SpaceSaving:
+    """Weighted Space-Saving heavy-hitters summary
+
+    Tracks at most ``capacity`` keys. Every tracked key has an estimated
+    weight that over-counts its true weight by at most its ``erro``; any key
+    not tracked has a true weight of at most ``floor``. Chunks are folded in
+    pre-aggregated, so the per-row cost is a vectorized groupby.
+    A secondary measure (e.g. revenue next to quantity) is summed for each
+    key while it is tracked, so it is a lower bound.
+    """
+
+    def __init__(self, capacity: int = 1000):
+        self.capacity = capacity
+        self.floor = 0.0
+        self.counters = pd.DataFrame({
+            'peso': pd.Series(dtype='float64'),
+            'erro': pd.Series(dtype='float64'),
+            'secundario': pd.Series(dtype='float64')
+        })
+
+    def update(self, weights: pd.Series, secondary: Optional[pd.Series] = None) -> 'SpaceSaving':
+        """Fold per-key weights (and an optional secondary measure) of one chunk"""
+        chunk = pd.DataFrame({
+            'peso': weights.astype('float64'),
+            'erro': 0.0,
+            'secundario': secondary.astype('float64') if secondary is not None else 0.0
+        })
+        # Keys entering the summary may have been evicted before with up to
+        # floor weight, which is added to both their estimate and their error
+        new_keys = ~chunk.index.isin(self.counters.index)
+        chunk.loc[new_keys, ['peso', 'erro']] += self.floor
+        self.counters = self._sum(self.counters, chunk)
+        self._truncate()
+        return self
+
+    def merge(self, other: 'SpaceSaving') -> 'SpaceSaving':
+        """Merge another summary"""
+        mine = self.counters.copy()
+        theirs = other.counters.copy()
+        # A key missing from one summary may hold up to that summary's floor
+        mine.loc[~mine.index.isin(theirs.index), ['peso', 'erro']] += other.floor
+        theirs.loc[~theirs.index.isin(mine.index), ['peso', 'erro']] += self.floor
+        self.counters = self._sum(mine, theirs)
+        self.floor += other.floor
+        self._truncate()
+        return self
+
+    @staticmethod
+    def _sum(left: pd.DataFrame, right: pd.DataFrame) -> pd.DataFrame:
+        if left.empty:
+            return right
+        return pd.concat([left, right]).groupby(level=0).sum()
+
+    def _truncate(self):
+        """Keep the heaviest keys, raising floor to the heaviest dropped one"""
+        if len(self.counters) <= self.capacity:
+            return
+        ordered = self.counters.sort_values('peso', ascending=False, kind='stable')
+        self.floor = max(self.floor, float(ordered['peso'].iloc[self.capacity]))
+        self.counters = ordered.iloc[:self.capacity]
+
+    def top(self, k: int) -> pd.DataFrame:
+        """The k keys with the largest estimated weight"""
+        return self.counters.sort_values('peso', ascending=False, kind='stable').head(k)
+
+    @property
+    def max_error(self) -> float:
+        """Upper bound of the over-count of any reported estimate"""
+        if self.counters.empty:
+            return 0.0
+        return float(self.counters['erro'].max())
@@ -0,0 +1,115 @@
+"""
+Startup-time measurement: import cost of each module and time to the login window
+
+Run with ``python src/main.py --startup-profile``. The application is started
+in a child interpreter with ``-X importtime``; it closes itself as soon as the
+login window is drawn, and the child's import timings are summarized here.
+"""
+
+import os
+import sys
+import time
+from typing import Dict, List, Optional
+
+# Set in the child's environment to the launch time (time.time())
+STARTUP_PROFILE_ENV = "SHEETWISE_STARTUP_PROFILE"
+WINDOW_SHOWN_MARKER = "sheetwise-startup: login window shown after "
+# Target time from launch to the login window
+TARGET_SECONDS = 1.0
+
+
+def parse_importtime(stderr: str) -> List[Dict]:
+    """
+    Parse the ``-X importtime`` lines of an interpreter's stderr
+
+    Returns:
+        One dict per imported module, in import order, with 'module',
+        'depth' (0 for top-level imports), 'self_us' and 'cumulative_us'
+    """
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # header line
+        name = fields[2].rstrip()
+        indent = len(name) - len(name.lstrip())
+        entries.append({
+            'module': name.strip(),
+            'depth': max(indent - 1, 0) // 2,
+            'self_us': int(fields[0]),
+            'cumulative_us': int(fields[1])
+        })
+    return entries
+
+
+def format_report(entries: List[Dict], window_seconds: Optional[float],
+                  wall_seconds: float, top: int = 30) -> str:
+    """Text report: time to the login window, total import time and the costliest modules"""
+    lines = ["SHEETWISE STARTUP PROFILE", ""]
+    if window_seconds is not None:
+        verdict = "OK" if window_seconds < TARGET_SECONDS else "SLOW"
+        lines.append(f"Login window shown after: {window_seconds:.3f} s "
+                     f"(target < {TARGET_SECONDS:.1f} s: {verdict})")
+    else:
+        lines.append("Login window shown after: not reached")
+    lines.append(f"Process wall time: {wall_seconds:.3f} s")
+
+    if entries:
+        total_us = sum(entry['cumulative_us'] for entry in entries if entry['depth'] == 0)
+        lines.append(f"Total import time: {total_us / 1e6:.3f} s ({len(entries)} modules)")
+        lines.append("")
+        lines.append(f"Top {top} modules by cumulative import time:")
+        lines.append(f"{'cumulative ms':>14} {'self ms':>9}  module")
+        costliest = sorted(entries, key=lambda entry: entry['cumulative_us'], reverse=True)[:top]
+        for entry in costliest:
+            lines.append(f"{entry['cumulative_us'] / 1000:14.1f} {entry['self_us'] / 1000:9.1f}  "
+                         f"{'  ' * entry['depth']}{entry['module']}")
+    else:
+        lines.append("Import timings unavailable (frozen build or child failed)")
+    return "\n".join(lines)
+
+
+def report_window_shown(root):
+    """Called by the application once the login window exists: print the time since launch and quit"""
+    started = float(os.environ[STARTUP_PROFILE_ENV])
+    root.update_idletasks()
+    root.update()
+    print(f"{WINDOW_SHOWN_MARKER}{time.time() - started:.3f}", flush=True)
+    root.destroy()
+
+
+def run_startup_profile(main_script: str, top: int = 30, timeout: float = 120) -> int:
+    """
+    Launch the application in profiling mode and print the report
+
+    Returns:
+        Exit code: 0 if the login window appeared within TARGET_SECONDS
+    """
+    # Imported here: the application imports this module at startup
+    import subprocess
+
+    if getattr(sys, 'frozen', False):
+        # A PyInstaller build is its own interpreter: only the window time is measured
+        command = [sys.executable]
+    else:
+        command = [sys.executable, '-X', 'importtime', main_script]
+
+    started = time.time()
+    env = dict(os.environ, **{STARTUP_PROFILE_ENV: repr(started)})
+    completed = subprocess.run(command, env=env, capture_output=True, text=True, timeout=timeout)
+    wall_seconds = time.time() - started
+
+    window_seconds = None
+    for line in completed.stdout.splitlines():
+        if line.startswith(WINDOW_SHOWN_MARKER):
+            window_seconds = float(line[len(WINDOW_SHOWN_MARKER):])
+
+    print(format_report(parse_importtime(completed.stderr), window_seconds, wall_seconds, top))
+    if window_seconds is None:
+        errors = [line for line in completed.stderr.splitlines() if not line.startswith("import time:")]
+        if errors:
+            print("\nApplication output:\n" + "\n".join(errors[-20:]))
+        return 1
+    return 0 if window_seconds < TARGET_SECONDS else 1
@@ -0,0 +1,104 @@
+"""
+Minimal HTML template engine for the reports
+
+A template is parsed once into literal and ``{{PLACEHOLDER}}`` segments and
+kept in memory until its file changes. Rendering HTML-escapes the values and
+writes every segment straight to the output in a single pass, so a large
+report is never copied once per placeholder.
+"""
+
+import html
+import os
+import re
+import threading
+from typing import Dict, List, Optional, TextIO, Tuple
+
+PLACEHOLDER_PATTERN = re.compile(r'\{\{([A-Z][A-Z0-9_]*)\}\}')
+# Values longer than this are escaped and written piecewise
+ESCAPE_CHUNK_CHARS = 1024 * 1024
+
+
+class CompiledTemplate:
+    """Template parsed into alternating literal text and placeholder names"""
+
+    def __init__(self, segments: List[Tuple[bool, str]]):
+        """
+        Args:
+            segments: (is_placeholder, text) pairs in document order
+        """
+        self.segments = segments
+        self.placeholders = {text for is_placeholder, text in segments if is_placeholder}
+
+    @classmethod
+    def from_text(cls, text: str) -> 'CompiledTemplate':
+        """Parse template text"""
+        segments = []
+        position = 0
+        for match in PLACEHOLDER_PATTERN.finditer(text):
+            if match.start() > position:
+                segments.append((False, text[position:match.start()]))
+            segments.append((True, match.group(1)))
+            position = match.end()
+        if position < len(text):
+            segments.append((False, text[position:]))
+        return cls(segments)
+
+    def write(self, f: TextIO, values: Dict[str, str]):
+        """
+        Write the rendered template to a text file handle
+
+        Raises:
+            KeyError: If a placeholder of the template has no value
+        """
+        missing = self.placeholders.difference(values)
+        if missing:
+            raise KeyError(f"No value for template placeholders: {', '.join(sorted(missing))}")
+        for is_placeholder, text in self.segments:
+            if not is_placeholder:
+                f.write(text)
+                continue
+            value = values[text]
+            for start in range(0, len(value), ESCAPE_CHUNK_CHARS):
+                f.write(html.escape(value[start:start + ESCAPE_CHUNK_CHARS]))
+
+    def render(self, values: Dict[str, str]) -> str:
+        """Rendered template as a string (see write)"""
+        missing = self.placeholders.difference(values)
+        if missing:
+            raise KeyError(f"No value for template placeholders: {', '.join(sorted(missing))}")
+        return ''.join(html.escape(values[text]) if is_placeholder else text
+                       for is_placeholder, text in self.segments)
+
+
+_templates: Dict[str, Tuple[int, int, CompiledTemplate]] = {}
+_templates_lock = threading.Lock()
+
+
+def load_template(path: str) -> CompiledTemplate:
+    """
+    Compiled template of a file, parsed again only when the file changes
+
+    Raises:
+        OSError: If the file cannot be read
+    """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    with _templates_lock:
+        cached = _templates.get(path)
+        if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            return cached[2]
+
+    with open(path, 'r', encoding='utf-8') as f:
+        template = CompiledTemplate.from_text(f.read())
+    with _templates_lock:
+        _templates[path] = (stat.st_mtime_ns, stat.st_size, template)
+    return template
+
+
+def clear_template_cache(path: Optional[str] = None):
+    """Forget one compiled template, or all of them"""
+    with _templates_lock:
+        if path is None:
+            _templates.clear()
+        else:
+            _templates.pop(os.path.abspath(path), None)
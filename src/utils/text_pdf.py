@@ -0,0 +1,112 @@
+"""
+Dependency-free PDF writer for monospaced text reports
+
+Lays plain text out in the Courier standard font (no font embedding needed)
+on A4 pages, wrapping lines wider than the page, and writes a PDF 1.4 file
+directly: no HTML, no subprocess.
+"""
+
+import zlib
+from typing import Callable, List, Optional
+
+# A4 in points, with the margins of the wkhtmltopdf output (0.75in)
+PAGE_WIDTH = 595.28
+PAGE_HEIGHT = 841.89
+MARGIN = 54.0
+FONT_SIZE = 9.0
+LINE_HEIGHT = 11.0
+# Courier glyphs are all 600/1000 em wide
+CHAR_WIDTH = FONT_SIZE * 0.6
+
+COLUMNS = int((PAGE_WIDTH - 2 * MARGIN) // CHAR_WIDTH)
+LINES_PER_PAGE = int((PAGE_HEIGHT - 2 * MARGIN) // LINE_HEIGHT)
+
+
+def layout_pages(text: str, columns: int = COLUMNS,
+                 lines_per_page: int = LINES_PER_PAGE) -> List[List[str]]:
+    """Split text into pages of lines, hard-wrapping lines wider than columns"""
+    lines = []
+    for line in text.expandtabs(4).splitlines() or ['']:
+        line = line.rstrip()
+        while len(line) > columns:
+            lines.append(line[:columns])
+            line = line[columns:]
+        lines.append(line)
+    return [lines[start:start + lines_per_page] for start in range(0, len(lines), lines_per_page)]
+
+
+def _pdf_string(value: str) -> bytes:
+    """PDF literal string in WinAnsiEncoding; other characters become '?'"""
+    encoded = value.encode('cp1252', errors='replace')
+    return b'(' + encoded.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+
+def _page_content(lines: List[str]) -> bytes:
+    """Content stream drawing lines from the top margin down"""
+    # The ' operator moves down one line before showing its text
+    top = PAGE_HEIGHT - MARGIN - FONT_SIZE + LINE_HEIGHT
+    parts = [b'BT\n/F1 %.1f Tf\n%.2f TL\n%.2f %.2f Td\n' % (FONT_SIZE, LINE_HEIGHT, MARGIN, top)]
+    for line in lines:
+        parts.append(_pdf_string(line) + b" '\n")
+    parts.append(b'ET\n')
+    return b''.join(parts)
+
+
+def render_text_pdf(text: str, title: Optional[str] = None,
+                    on_page: Optional[Callable[[], None]] = None) -> bytes:
+    """
+    Render text as a PDF document
+
+    Args:
+        text: Report text; lines are kept as is and wrapped at the page width
+        title: Optional document title (shown by PDF viewers)
+        on_page: Optional callback run before each page is laid out, e.g. to
+            check for cancellation
+
+    Returns:
+        The PDF file contents
+    """
+    pages = layout_pages(text)
+    # Objects: 1 catalog, 2 page tree, 3 font, 4 info, then a page and its
+    # content stream per page
+    objects = [None, None, b'<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding /WinAnsiEncoding >>']
+    info = b'<< /Producer (Sheetwise)'
+    if title:
+        info += b' /Title ' + _pdf_string(title)
+    objects.append(info + b' >>')
+
+    page_ids = []
+    for lines in pages:
+        if on_page is not None:
+            on_page()
+        content = zlib.compress(_page_content(lines))
+        objects.append(b'<< /Length %d /Filter /FlateDecode >>\nstream\n' % len(content) + content + b'\nendstream')
+        content_id = len(objects)
+        objects.append(b'<< /Type /Page /Parent 2 0 R /Resources << /Font << /F1 3 0 R >> >> '
+                       b'/MediaBox [0 0 %.2f %.2f] /Contents %d 0 R >>' % (PAGE_WIDTH, PAGE_HEIGHT, content_id))
+        page_ids.append(len(objects))
+
+    objects[0] = b'<< /Type /Catalog /Pages 2 0 R >>'
+    objects[1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (
+        b' '.join(b'%d 0 R' % page_id for page_id in page_ids), len(page_ids))
+
+    output = bytearray(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b'%d 0 obj\n' % number + body + b'\nendobj\n'
+    xref_offset = len(output)
+    output += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    for offset in offsets:
+        output += b'%010d 00000 n \n' % offset
+    output += b'trailer\n<< /Size %d /Root 1 0 R /Info 4 0 R >>\nstartxref\n%d\n%%EOF\n' % (
+        len(objects) + 1, xref_offset)
+    return bytes(output)
+
+
+def write_text_pdf(text: str, pdf_path: str, title: Optional[str] = None,
+                   on_page: Optional[Callable[[], None]] = None):
+    """Render text as a PDF file at pdf_path (see render_text_pdf)"""
+    data = render_text_pdf(text, title, on_page)
+    with open(pdf_path, 'wb') as f:
+        f.write(data)
@@ -0,0 +1,75 @@
+"""
+Streaming XLSX reading built on openpyxl's read-only mode
+"""
+
+from typing import Iterator, List
+import pandas as pd
+from openpyxl import load_workbook
+
+
+def _header_names(row) -> List[str]:
+    """Column names for a header row, named like pandas does for empty cells"""
+    return [str(value) if value is not None else f"Unnamed: {i}" for i, value in enumerate(row)]
+
+
+def read_xlsx_header(file_path: str) -> List[str]:
+    """Read only the header row of the first worksheet"""
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        worksheet = workbook.worksheets[0]
+        for row in worksheet.iter_rows(min_row=1, max_row=1, values_only=True):
+            return _header_names(row)
+        return []
+    finally:
+        workbook.close()
+
+
+def iter_xlsx_batches(file_path: str, batch_size: int) -> Iterator[pd.DataFrame]:
+    """
+    Yield the rows of the first worksheet as DataFrames of at most batch_size rows
+
+    Cells are streamed without building the workbook object model, so memory
+    stays flat regardless of sheet size. Empty rows at the end of the sheet
+    are dropped, as pd.read_excel does.
+    """
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = _header_names(header)
+        width = len(columns)
+
+        batch = []
+        pending_empty = []
+        for row in rows:
+            if all(value is None for value in row):
+                pending_empty.append(row)
+                continue
+            if pending_empty:
+                batch.extend(pending_empty)
+                pending_empty = []
+            batch.append(row)
+            if len(batch) >= batch_size:
+                yield _to_frame(batch, columns, width)
+                batch = []
+
+        if batch:
+            yield _to_frame(batch, columns, width)
+    finally:
+        workbook.close()
+
+
+def _to_frame(batch: list, columns: List[str], width: int) -> pd.DataFrame:
+    """Build a DataFrame from raw row tuples, padding short rows"""
+    rows = [row[:width] + (None,) * (width - len(row)) for row in batch]
+    return pd.DataFrame.from_records(rows, columns=columns).infer_objects()
+
+
+def read_xlsx(file_path: str, batch_size: int = 50_000) -> pd.DataFrame:
+    """Read the first worksheet whole through the streaming reader"""
+    batches = list(iter_xlsx_batches(file_path, batch_size))
+    if not batches:
+        return pd.DataFrame(columns=read_xlsx_header(file_path))
+    return pd.concat(batches, ignore_index=True)
@@ -53,14 +53,17 @@ class ToolTip:
 class MainView:
     """Interface principal do aplicativo"""
     
-    def __init__(self, usuario_data, initial_theme="cosmo", root_window=None, on_logout=None, on_analyze=None, on_delete_execution=None, on_refresh_executions=None):
+    def __init__(self, usuario_data, initial_theme="cosmo", root_window=None, on_logout=None, on_analyze=None, on_delete_execution=None, on_refresh_executions=None, on_cancel_analysis=None, on_show_execution_details=None, on_exit=None):
         self.usuario_data = usuario_data
         self.initial_theme = initial_theme
         self.root_window = root_window  # Existing window from login
         self.on_logout = on_logout
         self.on_analyze = on_analyze
+        self.on_cancel_analysis = on_cancel_analysis
         self.on_delete_execution = on_delete_execution
         self.on_refresh_executions = on_refresh_executions
+        self.on_show_execution_details = on_show_execution_details
+        self.on_exit = on_exit
         self.root = None
         self.files_status = {
             'clientes': False,
@@ -68,6 +71,7 @@ class MainView:
             'enderecos': False  # opcional
         }
         self.selected_folder = ""
+        self.is_busy = False
         self.setup_window()
     
     def setup_window(self):
@@ -407,6 +411,23 @@ class MainView:
                                         command=self.handle_analyze)
         self.analyze_button.pack()
         
+        # Progress of a running analysis, shown only while busy
+        self.progress_frame = ttk.Frame(analysis_frame)
+        
+        self.progress_bar = ttk.Progressbar(self.progress_frame, mode="determinate", maximum=100)
+        self.progress_bar.pack(fill=tk.X, pady=(10, 5))
+        
+        progress_info = ttk.Frame(self.progress_frame)
+        progress_info.pack(fill=tk.X)
+        
+        self.progress_label = ttk.Label(progress_info, text="", style="Status.TLabel")
+        self.progress_label.pack(side=tk.LEFT)
+        
+        self.cancel_button = ttk.Button(progress_info,
+                                        text=_('main_view.progress.cancel_button'),
+                                        command=self.cancel_analysis)
+        self.cancel_button.pack(side=tk.RIGHT)
+        
         
         # Configure button style
         self._setup_analyze_button_style()
@@ -443,6 +464,7 @@ class MainView:
         
         self.executions_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.executions_tree.bind('<Double-1>', lambda event: self.open_execution_details())
         
         # Buttons for CRUD
         crud_frame = ttk.Frame(exec_frame)
@@ -450,6 +472,7 @@ class MainView:
         
         ttk.Button(crud_frame, text=_('main.refresh'), command=self.refresh_executions).pack(side=tk.LEFT)
         ttk.Button(crud_frame, text=_('main.executions.delete'), command=self.delete_execution).pack(side=tk.LEFT, padx=(5, 0))
+        ttk.Button(crud_frame, text=_('main_view.details.button'), command=self.open_execution_details).pack(side=tk.LEFT, padx=(5, 0))
     
     def select_folder(self):
         """Select folder with files"""
@@ -468,20 +491,20 @@ class MainView:
         for key in self.files_status:
             self.files_status[key] = False
         
-        # Check files
-        files_in_folder = os.listdir(self.selected_folder)
-        
-        for file_name in files_in_folder:
-            name_lower = file_name.lower()
-            if name_lower.startswith('clientes.') and (name_lower.endswith('.csv') or name_lower.endswith('.xlsx')):
-                self.files_status['clientes'] = True
-                self.files_labels['clientes'].config(text=_('main_view.files_section.found'), style="Success.TLabel")
-            elif name_lower.startswith('vendas.') and (name_lower.endswith('.csv') or name_lower.endswith('.xlsx')):
-                self.files_status['vendas'] = True
-                self.files_labels['vendas'].config(text=_('main_view.files_section.found'), style="Success.TLabel") 
-            elif name_lower.startswith('enderecos.') and (name_lower.endswith('.csv') or name_lower.endswith('.xlsx')):
-                self.files_status['enderecos'] = True
-                self.files_labels['enderecos'].config(text=_('main_view.files_section.found'), style="Success.TLabel")
+        # Check files with the same rules the analysis uses (imported here:
+        # file_processor loads pandas, which the login window does not need)
+        from utils.file_processor import FileValidator
+        files_found = FileValidator().find_files(self.selected_folder)
+        partitions = FileValidator.sales_partitions(files_found)
+        
+        for file_type in ['clientes', 'vendas', 'enderecos']:
+            if files_found[file_type]:
+                self.files_status[file_type] = True
+                if file_type == 'vendas' and len(partitions) > 1:
+                    text = _('main_view.files_section.found_partitions', count=len(partitions))
+                else:
+                    text = _('main_view.files_section.found')
+                self.files_labels[file_type].config(text=text, style="Success.TLabel")
         
         # Update labels for files not found
         if not self.files_status['clientes']:
@@ -696,16 +719,151 @@ class MainView:
         """Manipula fechamento da janela"""
         result = messagebox.askyesno(_('main_view.messages.exit_title'), _('main_view.messages.exit_message'))
         if result:
+            if self.on_exit:
+                self.on_exit()
             self.destroy()
     
+    def set_busy(self, busy):
+        """Show or hide job progress; logout is blocked while jobs are pending"""
+        self.is_busy = busy
+        if busy:
+            self.progress_bar.configure(mode="indeterminate", value=0)
+            self.progress_bar.start()
+            self.progress_label.configure(text="")
+            self.progress_frame.pack(fill=tk.X, pady=(10, 0))
+        else:
+            self.progress_bar.stop()
+            self.progress_frame.pack_forget()
+        self.logout_button.configure(state="disabled" if busy else "normal")
+    
+    def update_progress(self, snapshot, execution_id=None, pending=0):
+        """
+        Render the progress of the displayed job
+        
+        Args:
+            snapshot: ProgressTracker snapshot of the job, or None while all
+                pending jobs are still queued
+            execution_id: Id of the job the snapshot belongs to
+            pending: Number of jobs queued or running
+        """
+        self.cancel_button.configure(state="normal" if snapshot and not snapshot['cancelled'] else "disabled")
+        if snapshot is None:
+            self.progress_label.configure(text=_('main_view.progress.waiting', pending=pending))
+            return
+        
+        if snapshot['fraction'] is not None:
+            if str(self.progress_bar.cget('mode')) != "determinate":
+                self.progress_bar.stop()
+                self.progress_bar.configure(mode="determinate")
+            self.progress_bar.configure(value=snapshot['fraction'] * 100)
+        
+        parts = [_('main_view.progress.job', id=execution_id), _(f"main_view.progress.stages.{snapshot['stage']}")]
+        if snapshot['rows']:
+            parts.append(_('main_view.progress.rows', rows=f"{snapshot['rows']:,}"))
+        if snapshot['total_bytes']:
+            parts.append(f"{snapshot['bytes_read'] / 1048576:,.1f} / {snapshot['total_bytes'] / 1048576:,.1f} MB")
+        if snapshot['eta'] is not None:
+            minutes, seconds = divmod(int(snapshot['eta']), 60)
+            parts.append(_('main_view.progress.eta', eta=f"{minutes}:{seconds:02d}"))
+        if snapshot['cancelled']:
+            parts.append(_('main_view.progress.cancelling'))
+        if pending > 1:
+            parts.append(_('main_view.progress.pending', pending=pending))
+        self.progress_label.configure(text=" | ".join(parts))
+    
+    def cancel_analysis(self):
+        """Handle cancel button click"""
+        if self.is_busy and self.on_cancel_analysis:
+            self.cancel_button.configure(state="disabled")
+            self.on_cancel_analysis()
+    
     def show_success(self, message):
         """Mostra mensagem de sucesso"""
         messagebox.showinfo(_('common.success'), message)
     
+    def show_info(self, message):
+        """Show information message"""
+        messagebox.showinfo(_('common.info'), message)
+    
     def show_error(self, message):
         """Mostra mensagem de erro"""
         messagebox.showerror(_('common.error'), message)
     
+    def open_execution_details(self):
+        """Ask the controller for the details of the selected execution"""
+        selected = self.executions_tree.selection()
+        if not selected:
+            messagebox.showwarning(_('common.warning'), _('main_view.details.select_execution'))
+            return
+        execucao_id = self.executions_tree.item(selected[0])['values'][0]
+        if self.on_show_execution_details:
+            self.on_show_execution_details(execucao_id)
+    
+    def show_execution_details(self, execution, stages):
+        """Show an execution and the time, CPU, memory, rows and bytes of each of its stages"""
+        details_window = tk.Toplevel(self.root)
+        details_window.title(_('main_view.details.title', id=execution['id']))
+        details_window.geometry("760x420")
+        details_window.transient(self.root)
+        
+        main_frame = ttk.Frame(details_window, padding=15)
+        main_frame.pack(fill=tk.BOTH, expand=True)
+        
+        # Execution information
+        info_frame = ttk.Frame(main_frame)
+        info_frame.pack(fill=tk.X, pady=(0, 10))
+        fields = [
+            ('protocol', execution['protocol']),
+            ('status', execution['status'].title()),
+            ('started', execution.get('started_at') or '-'),
+            ('finished', execution.get('finished_at') or '-'),
+            ('notes', execution.get('notes') or '-')
+        ]
+        for row, (key, value) in enumerate(fields):
+            ttk.Label(info_frame, text=_(f'main_view.details.{key}'), font=("Arial", 9, "bold")).grid(
+                row=row, column=0, sticky=tk.W, padx=(0, 10))
+            ttk.Label(info_frame, text=str(value), wraplength=560).grid(row=row, column=1, sticky=tk.W)
+        
+        if not stages:
+            ttk.Label(main_frame, text=_('main_view.details.no_stages'), style="Status.TLabel").pack(anchor=tk.W)
+        else:
+            columns = ('stage', 'wall', 'cpu', 'rss', 'rows', 'bytes')
+            stages_tree = ttk.Treeview(main_frame, columns=columns, show='headings', height=len(stages) + 1)
+            for column in columns:
+                stages_tree.heading(column, text=_(f'main_view.details.columns.{column}'))
+                stages_tree.column(column, width=150 if column == 'stage' else 100,
+                                   anchor=tk.W if column == 'stage' else tk.E)
+            
+            for stage in stages:
+                stages_tree.insert('', tk.END, values=self._stage_row(
+                    _(f"main_view.progress.stages.{stage['stage']}"), stage['wall_seconds'],
+                    stage['cpu_seconds'], stage['peak_rss_bytes'], stage['rows'], stage['bytes']
+                ))
+            peak_values = [stage['peak_rss_bytes'] for stage in stages if stage['peak_rss_bytes'] is not None]
+            stages_tree.insert('', tk.END, values=self._stage_row(
+                _('main_view.details.total'),
+                sum(stage['wall_seconds'] for stage in stages),
+                sum(stage['cpu_seconds'] for stage in stages),
+                max(peak_values) if peak_values else None,
+                sum(stage['rows'] for stage in stages),
+                sum(stage['bytes'] for stage in stages)
+            ))
+            stages_tree.pack(fill=tk.BOTH, expand=True)
+        
+        ttk.Button(main_frame, text=_('common.close'), command=details_window.destroy).pack(side=tk.RIGHT, pady=(10, 0))
+    
+    @staticmethod
+    def _stage_row(name, wall_seconds, cpu_seconds, peak_rss_bytes, rows, bytes_read):
+        """Formatted values of one row of the stages table"""
+        return (
+            name,
+            f"{wall_seconds:,.3f}",
+            f"{cpu_seconds:,.3f}",
+            f"{peak_rss_bytes / (1024 * 1024):,.1f}" if peak_rss_bytes is not None else "-",
+            f"{rows:,}",
+            f"{bytes_read / (1024 * 1024):,.2f}"
+        )
+    
     def show_settings(self):
         """Show settings dialog"""
         settings_window = tk.Toplevel(self.root)
@@ -0,0 +1,134 @@
+"""
+wkhtmltopdf worker protocol, checked against a stub executable
+
+The stub speaks like ``wkhtmltopdf --read-args-from-stdin``: one report per
+input line, progress on stderr, then "Done" or "Exit with code 1 ...". Its
+behaviour depends on the name of the HTML file it is given.
+"""
+
+import os
+import sys
+import textwrap
+
+import pytest
+
+from src.utils.pdf_renderer import (RenderSlots, WkhtmltopdfProtocolError, WkhtmltopdfRenderer,
+                                    WkhtmltopdfWorker)
+
+pytestmark = pytest.mark.skipif(sys.platform.startswith('win'), reason="the stub is a POSIX script")
+
+STUB = '''
+import shlex
+import sys
+import time
+
+with open(sys.argv[0] + '.log', 'a') as log:
+    log.write(' '.join(sys.argv[1:]) + '\\n')
+if '--read-args-from-stdin' not in sys.argv:
+    sys.exit(2)
+
+for line in sys.stdin:
+    html_path, pdf_path = shlex.split(line)
+    name = html_path.rsplit('/', 1)[-1]
+    if name.startswith('silent'):
+        continue
+    if name.startswith('crash'):
+        sys.exit(1)
+    sys.stderr.write('Loading pages (1/6)\\n[>      ] 0%\\r[=====>] 100%\\r')
+    sys.stderr.flush()
+    if name.startswith('slow'):
+        time.sleep(30)
+    if name.startswith('bad'):
+        sys.stderr.write('Error: Failed to load about:blank, with network status code 301\\n')
+        sys.stderr.write('Exit with code 1 due to network error: ProtocolUnknownError\\n')
+    else:
+        with open(pdf_path, 'wb') as pdf:
+            pdf.write(b'%PDF-1.4 stub')
+        sys.stderr.write('Done\\n')
+    sys.stderr.flush()
+'''
+
+
+@pytest.fixture
+def stub(tmp_path):
+    """Path of the stub wkhtmltopdf"""
+    path = tmp_path / 'bin' / 'wkhtmltopdf'
+    path.parent.mkdir()
+    path.write_text(f"#!{sys.executable}\n" + textwrap.dedent(STUB))
+    path.chmod(0o755)
+    return str(path)
+
+
+@pytest.fixture
+def renderer(stub, tmp_path):
+    renderer = WkhtmltopdfRenderer(timeout=10, slots=RenderSlots(2, str(tmp_path / 'slots')), binary=stub)
+    renderer.FIRST_MESSAGE_SECONDS = 1.0
+    yield renderer
+    renderer.close()
+
+
+def _html(tmp_path, name):
+    path = tmp_path / 'in' / name
+    path.parent.mkdir(exist_ok=True)
+    path.write_text('<html><body>report</body></html>')
+    return str(path)
+
+
+def _starts(stub):
+    with open(stub + '.log') as log:
+        return log.read().splitlines()
+
+
+def test_reports_share_one_worker(renderer, stub, tmp_path):
+    for index in range(3):
+        pdf_path = str(tmp_path / f"report {index} \"quoted\".pdf")
+        renderer.render(_html(tmp_path, f"report {index}.html"), pdf_path)
+        with open(pdf_path, 'rb') as pdf:
+            assert pdf.read().startswith(b'%PDF')
+
+    starts = _starts(stub)
+    assert len(starts) == 1
+    assert '--read-args-from-stdin' in starts[0]
+    assert '--page-size A4' in starts[0]
+
+
+def test_exit_with_code_raises(renderer, tmp_path):
+    with pytest.raises(IOError, match='Exit with code 1'):
+        renderer.render(_html(tmp_path, 'bad.html'), str(tmp_path / 'bad.pdf'))
+    # The failed worker is not reused
+    renderer.render(_html(tmp_path, 'good.html'), str(tmp_path / 'good.pdf'))
+    assert renderer.is_available()
+
+
+def test_process_exit_raises(renderer, tmp_path):
+    with pytest.raises(IOError, match='process exited'):
+        renderer.render(_html(tmp_path, 'crash.html'), str(tmp_path / 'crash.pdf'))
+
+
+def test_silence_fails_fast_and_disables_backend(renderer, tmp_path):
+    with pytest.raises(WkhtmltopdfProtocolError):
+        renderer.render(_html(tmp_path, 'silent.html'), str(tmp_path / 'silent.pdf'))
+    assert not renderer.is_available()
+
+
+def test_timeout_raises(stub, tmp_path):
+    worker = WkhtmltopdfWorker([stub])
+    try:
+        with pytest.raises(TimeoutError):
+            worker.convert(_html(tmp_path, 'slow.html'), str(tmp_path / 'slow.pdf'), timeout=0.5,
+                           poll_seconds=0.1, first_message_timeout=5)
+    finally:
+        worker.close(kill=True)
+
+
+def test_close_stops_idle_workers(renderer, tmp_path):
+    renderer.render(_html(tmp_path, 'report.html'), str(tmp_path / 'report.pdf'))
+    worker = renderer._idle[0]
+    renderer.close()
+    assert not worker.alive()
+    assert os.path.exists(tmp_path / 'report.pdf')
+
+
+def test_missing_binary_is_unavailable(tmp_path):
+    renderer = WkhtmltopdfRenderer(binary=str(tmp_path / 'missing'))
+    assert not renderer.is_available()